@@ -1,17 +1,29 @@
 import csv
-import json
+import tempfile
 
-from django.contrib import admin
-from django.http import HttpResponse
+from django.contrib import admin, messages
+from django.http import FileResponse, StreamingHttpResponse
 
 from astrosat.models import DatabaseLogTag, DatabaseLogRecord
-from astrosat.serializers import DatabaseLogRecordSerializer
-from astrosat.utils import flatten_dictionary
+from astrosat.utils import (
+    LOG_RECORD_EXPORT_CHUNK_SIZE,
+    iterate_log_record_csv_rows,
+    write_log_records_parquet,
+)
 
 from .admin_base import DeleteOnlyModelAdminBase
 from .admin_utils import DateRangeListFilter, IncludeExcludeListFilter, get_clickable_m2m_list_display
 
 
+class EchoBuffer:
+    """
+    A pseudo-buffer that returns whatever is written to it (rather than storing it);
+    this lets a csv.writer generate content for a StreamingHttpResponse.
+    """
+    def write(self, value):
+        return value
+
+
 class TagListFilter(IncludeExcludeListFilter):
 
     include_empty_choice = True
@@ -32,11 +44,23 @@ class DatabaseLogTagAdmin(admin.ModelAdmin):
 
 @admin.register(DatabaseLogRecord)
 class DatabaseLogRecordAdmin(DeleteOnlyModelAdminBase, admin.ModelAdmin):
-    actions = ["export_as_csv"]
+    actions = ["export_as_csv", "export_as_parquet"]
     date_hierarchy = "created"
-    list_display = ("created", "level", "message", "get_tags_for_list_display")
+    list_display = (
+        "created",
+        "level",
+        "message",
+        "occurrences",
+        "get_tags_for_list_display",
+    )
     list_filter = ("level", ("created", DateRangeListFilter), TagListFilter)
 
+    # number of records to fetch from the db at a time when exporting
+    export_chunk_size = LOG_RECORD_EXPORT_CHUNK_SIZE
+    # extra (flattened JSON message) columns to export; if None they are discovered
+    # (can be a list of column names or a dict of column names to python types)
+    export_message_columns = None
+
     def get_queryset(self, request):
         # pre-fetching m2m fields that are used in list_displays
         # to avoid the "n+1" problem
@@ -50,39 +74,61 @@ class DatabaseLogRecordAdmin(DeleteOnlyModelAdminBase, admin.ModelAdmin):
 
     def export_as_csv(self, request, queryset):
 
-        fields_to_export = ["id", "level", "created", "tags", "message"]
-        headers = [f"record.{field}" for field in fields_to_export]
-        extra_headers = set()
-        data = []
-
-        for record in DatabaseLogRecordSerializer(queryset, many=True).data:
-            for header, field in zip(headers, fields_to_export):
-                record[header] = record.pop(field)
-            try:
-                json_message = json.loads(record["record.message"])
-                flattened_json_message = flatten_dictionary(
-                    json_message, separator=" | "
-                )
-                extra_headers.update(flattened_json_message.keys())
-                record.update(flattened_json_message)
-            except json.JSONDecodeError:
-                pass
-            data.append(record)
-
-        headers = headers + sorted(extra_headers)
-
-        csv_response = HttpResponse(content_type="text/csv")
+        # the CSV is streamed to the client one row at a time, so that exporting
+        # lots of records doesn't require holding them all in memory at once;
+        # the cost is that the extra columns derived from JSON messages have
+        # to be known upfront - either via "export_message_columns" or else
+        # via a (lightweight) initial pass over the records' messages
+
+        rows = iterate_log_record_csv_rows(
+            queryset,
+            chunk_size=self.export_chunk_size,
+            message_columns=self.export_message_columns,
+        )
+
+        writer = csv.writer(EchoBuffer())
+        csv_response = StreamingHttpResponse(
+            (writer.writerow(row) for row in rows), content_type="text/csv"
+        )
         csv_response["Content-Disposition"
                     ] = f"attachment; filename=log_records.csv"
-        writer = csv.writer(csv_response)
-        writer.writerow(headers)
-        writer.writerows(
-            # add the row to the CSV; if a column doesn't exist just add None
-            map(
-                lambda row: [row.get(column, None) for column in headers], data
-            )
-        )
 
         return csv_response
 
     export_as_csv.short_description = "Export selected Log Records as CSV"
+
+    def export_as_parquet(self, request, queryset):
+
+        # a parquet file cannot be streamed row-by-row like a CSV (its metadata
+        # is only written at the end), so it is written to a temporary file
+        # one row group at a time and then that file is returned
+
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            msg = "Exporting Log Records as Parquet requires pyarrow to be installed."
+            self.message_user(request, msg, level=messages.ERROR)
+            return
+
+        message_types = self.export_message_columns
+        if message_types is not None and not isinstance(message_types, dict):
+            # columns specified w/out types are just stored as strings
+            message_types = {column: str for column in message_types}
+
+        parquet_file = tempfile.TemporaryFile()
+        write_log_records_parquet(
+            queryset,
+            parquet_file,
+            chunk_size=self.export_chunk_size,
+            message_types=message_types,
+        )
+        parquet_file.seek(0)
+
+        return FileResponse(
+            parquet_file,
+            as_attachment=True,
+            filename="log_records.parquet",
+            content_type="application/vnd.apache.parquet",
+        )
+
+    export_as_parquet.short_description = "Export selected Log Records as Parquet"
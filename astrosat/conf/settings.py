@@ -1,4 +1,6 @@
 import environ
+import os
+import tempfile
 
 from django.conf import settings
 
@@ -30,6 +32,71 @@ ASTROSAT_ENABLE_DEBUG_TOOLBAR = getattr(
     ),
 )
 
+# JSON codec used for formatting/ingesting log records, etc.
+# ("auto" uses orjson if it is installed and the standard library otherwise)
+ASTROSAT_JSON_CODEC = getattr(settings, "ASTROSAT_JSON_CODEC", "auto")
+
+# profiling (see astrosat.middleware.ProfilingMiddleware)...
+
+# profile every Nth request (0 means only profile requests w/ a "profile" query parameter)
+ASTROSAT_PROFILING_SAMPLE_RATE = getattr(
+    settings, "ASTROSAT_PROFILING_SAMPLE_RATE", 0
+)
+
+# fn deciding whether a request w/ a "profile" query parameter may be profiled
+ASTROSAT_PROFILING_CALLBACK = getattr(
+    settings, "ASTROSAT_PROFILING_CALLBACK", "astrosat.utils.can_profile"
+)
+
+ASTROSAT_PROFILING_DIR = getattr(
+    settings,
+    "ASTROSAT_PROFILING_DIR",
+    os.path.join(tempfile.gettempdir(), "astrosat-profiles"),
+)
+
+# the most recent profiles to keep in ASTROSAT_PROFILING_DIR
+ASTROSAT_PROFILING_MAX_FILES = getattr(
+    settings, "ASTROSAT_PROFILING_MAX_FILES", 100
+)
+
+# "pstats" or "callgrind" (which requires pyprof2calltree)
+ASTROSAT_PROFILING_FORMAT = getattr(
+    settings, "ASTROSAT_PROFILING_FORMAT", "pstats"
+)
+
+# query tracking (see astrosat.utils.QueryTracker & astrosat.middleware.QueryTrackingMiddleware)...
+
+# the number of similar queries (same SQL, different params) that suggest an N+1 pattern
+ASTROSAT_QUERY_N_PLUS_ONE_THRESHOLD = getattr(
+    settings, "ASTROSAT_QUERY_N_PLUS_ONE_THRESHOLD", 5
+)
+
+# the number of queries above which QueryTrackingMiddleware logs a warning
+ASTROSAT_QUERY_COUNT_THRESHOLD = getattr(
+    settings, "ASTROSAT_QUERY_COUNT_THRESHOLD", 50
+)
+
+# metrics (see astrosat.utils.metrics_registry & astrosat.views.metrics_view)...
+
+ASTROSAT_ENABLE_METRICS = getattr(settings, "ASTROSAT_ENABLE_METRICS", False)
+
+# if set, requests w/ an "Authorization: Bearer <token>" header can view metrics
+# (otherwise only superusers can, or anybody in DEBUG mode)
+ASTROSAT_METRICS_TOKEN = getattr(settings, "ASTROSAT_METRICS_TOKEN", None)
+
+# singletons (see astrosat.mixins.SingletonMixin)...
+
+# how long (in seconds) SingletonMixin.load caches instances for; saving or
+# deleting an instance clears the cache, but only in the current process
+# (unless ASTROSAT_SINGLETON_CACHE is set); 0 disables caching
+ASTROSAT_SINGLETON_CACHE_TIMEOUT = getattr(
+    settings, "ASTROSAT_SINGLETON_CACHE_TIMEOUT", 60
+)
+
+# if set, the alias of a (shared) cache in CACHES to store singletons in
+# instead of a process-local cache, so that clearing them affects all processes
+ASTROSAT_SINGLETON_CACHE = getattr(settings, "ASTROSAT_SINGLETON_CACHE", None)
+
 # required third party settings...
 # (most of these are checked in checks.py)
 
@@ -0,0 +1,101 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from astrosat.models import DatabaseLogRecord
+from astrosat.utils import (
+    LOG_RECORD_EXPORT_CHUNK_SIZE,
+    iterate_log_record_csv_rows,
+    write_log_records_parquet,
+)
+
+EXPORT_FORMATS = ["csv", "parquet"]
+
+
+class Command(BaseCommand):
+    """
+    Exports DatabaseLogRecords to a CSV or Parquet file.
+    Records are read (and written) in chunks, so memory use stays bounded.
+    """
+
+    help = "Exports DatabaseLogRecords to a CSV or Parquet file."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--output",
+            dest="output_path",
+            required=True,
+            help="location of output file",
+        )
+
+        parser.add_argument(
+            "--format",
+            dest="format",
+            choices=EXPORT_FORMATS,
+            required=False,
+            default=None,
+            help=
+            "format of output file (if unprovided will use the extension of the output file).",
+        )
+
+        parser.add_argument(
+            "--tags",
+            dest="tags",
+            nargs="+",
+            required=False,
+            default=None,
+            help="only export records w/ (any of) these tags.",
+        )
+
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=LOG_RECORD_EXPORT_CHUNK_SIZE,
+            help=
+            f"number of records to process at a time (default is {LOG_RECORD_EXPORT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+
+        output_path = os.path.abspath(options["output_path"])
+        export_format = options["format"]
+        tags = options["tags"]
+        chunk_size = options["chunk_size"]
+
+        if export_format is None:
+            export_format = os.path.splitext(output_path)[1].lstrip(".").lower()
+            if export_format not in EXPORT_FORMATS:
+                raise CommandError(
+                    f"Unable to determine the format of '{output_path}'; please specify --format."
+                )
+
+        queryset = DatabaseLogRecord.objects.all()
+        if tags:
+            queryset = queryset.filter(tags__name__in=tags).distinct()
+
+        try:
+            if export_format == "csv":
+                n_records = -1  # (the 1st row is the headers)
+                with open(output_path, "w", newline="") as fp:
+                    writer = csv.writer(fp)
+                    for row in iterate_log_record_csv_rows(
+                        queryset, chunk_size=chunk_size
+                    ):
+                        writer.writerow(row)
+                        n_records += 1
+            else:
+                n_records = write_log_records_parquet(
+                    queryset, output_path, chunk_size=chunk_size
+                )
+        except ImportError as e:
+            raise CommandError(
+                f"Exporting to {export_format} requires an additional package: {e}"
+            )
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(
+                f"Exported {n_records} record(s) to '{output_path}'."
+            )
@@ -1,32 +1,328 @@
+import csv
+import glob
+import json
 import os
-
-import pandas as pd
-import geopandas as gpd
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from django.core.management.base import BaseCommand, CommandError
 
+from astrosat.utils import (
+    get_geojson_property_names,
+    get_geojson_property_types,
+    grouper,
+    iterate_geojson_features,
+)
+
+OUTPUT_FORMATS = ["csv", "parquet"]
+
+GEOMETRY_FORMATS = ["wkt", "wkb"]
+
+GEOJSON_EXTENSIONS = [".geojson", ".json"]
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def get_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def get_input_paths(input_patterns):
+    """
+    returns the (unique) paths of the GeoJSON files matched by a list of
+    paths, globs, and directories
+    """
+    input_paths = {}
+    for input_pattern in input_patterns:
+        if os.path.isdir(input_pattern):
+            matched_paths = sorted(
+                os.path.join(input_pattern, path)
+                for path in os.listdir(input_pattern)
+                if os.path.splitext(path)[1].lower() in GEOJSON_EXTENSIONS
+            )
+        elif glob.has_magic(input_pattern):
+            matched_paths = sorted(glob.glob(input_pattern))
+        else:
+            matched_paths = [input_pattern]
+        input_paths.update(
+            dict.fromkeys(os.path.abspath(path) for path in matched_paths)
+        )
+    return list(input_paths)
+
+
+def convert_geometry(geometry, geometry_format, output_format):
+    """
+    converts a GeoJSON geometry to WKT or WKB (WKB is hex-encoded in CSVs)
+    """
+    from shapely.geometry import shape
+
+    if geometry is None:
+        return None
+    geometry = shape(geometry)
+    if geometry_format == "wkt":
+        return geometry.wkt
+    return geometry.wkb_hex if output_format == "csv" else geometry.wkb
+
+
+def get_geoparquet_metadata(geometry_column):
+    # (GeoJSON is always WGS84, which is the GeoParquet default CRS)
+    return {
+        "version": "1.0.0",
+        "primary_column": geometry_column,
+        "columns": {
+            geometry_column: {
+                "encoding": "WKB", "geometry_types": []
+            }
+        },
+    }
+
+
+def read_geojson(
+    input_path,
+    output_path,
+    output_format="csv",
+    include_index=False,
+    columns=None,
+    geometry_format=None,
+    **kwargs,
+):
+    """
+    converts a GeoJSON file by loading all of it w/ geopandas; returns the
+    number of features converted.  If columns is provided only those properties
+    are read (this requires geopandas>=1.0, or its "pyogrio" engine).
+    """
+    import pandas as pd
+    import geopandas as gpd
+
+    read_kwargs = {"ignore_geometry": geometry_format is None}
+    if columns:
+        read_kwargs["columns"] = columns
+    geo_data_frame = gpd.read_file(input_path, **read_kwargs)
+    if columns:
+        # (the reader returns columns in file order & omits missing properties)
+        geo_data_frame = geo_data_frame.reindex(
+            columns=columns +
+            (["geometry"] if geometry_format is not None else [])
+        )
+
+    if geometry_format == "wkb" and output_format == "parquet":
+        # (geopandas writes WKB geometries as GeoParquet)
+        geo_data_frame.to_parquet(output_path, index=include_index)
+        return len(geo_data_frame)
+
+    data_frame = pd.DataFrame(geo_data_frame)
+    if geometry_format == "wkt":
+        data_frame["geometry"] = geo_data_frame.geometry.to_wkt()
+    elif geometry_format == "wkb":
+        data_frame["geometry"] = geo_data_frame.geometry.to_wkb(hex=True)
+
+    if output_format == "csv":
+        data_frame.to_csv(output_path, index=include_index)
+    else:
+        data_frame.to_parquet(output_path, index=include_index)
+    return len(data_frame)
+
+
+def stream_geojson(
+    input_path,
+    output_path,
+    output_format="csv",
+    include_index=False,
+    columns=None,
+    geometry_format=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    converts a GeoJSON file by parsing (& writing) one feature at a time;
+    returns the number of features converted
+    """
+    if output_format == "csv":
+        if not columns:
+            # the CSV header has to be written 1st, so (w/out a projection)
+            # the columns are the union of all features' properties; working
+            # these out takes an extra (cheap) pass through the file
+            with open(input_path, "rb") as fp:
+                columns = get_geojson_property_names(fp)
+        column_types = None
+    else:
+        # parquet columns are typed; the types (& maybe names) of columns
+        # are worked out by an extra pass through the file
+        with open(input_path, "rb") as fp:
+            column_types = get_geojson_property_types(fp, columns)
+        if columns:
+            column_types = {
+                column: column_types.get(column, set())
+                for column in columns
+            }
+        columns = list(column_types)
+
+    n_features = 0
+    with open(input_path, "rb") as fp:
+        features = iterate_geojson_features(
+            fp,
+            property_names=set(columns),
+            include_geometry=geometry_format is not None,
+        )
+        if output_format == "csv":
+            with open(output_path, "w", newline="") as output_fp:
+                writer = csv.writer(output_fp)
+                headers = columns + (["geometry"] if geometry_format else [])
+                writer.writerow([""] + headers if include_index else headers)
+                for n_features, feature in enumerate(features, start=1):
+                    properties = feature.get("properties") or {}
+                    row = [
+                        get_csv_value(properties.get(column))
+                        for column in columns
+                    ]
+                    if geometry_format:
+                        row.append(
+                            convert_geometry(
+                                feature.get("geometry"), geometry_format,
+                                output_format
+                            ) or ""
+                        )
+                    writer.writerow(
+                        [n_features - 1] + row if include_index else row
+                    )
+        else:
+            n_features = write_features_parquet(
+                features,
+                output_path,
+                column_types,
+                include_index=include_index,
+                geometry_format=geometry_format,
+                chunk_size=chunk_size,
+            )
+
+    return n_features
+
+
+def write_features_parquet(
+    features,
+    output_path,
+    column_types,
+    include_index=False,
+    geometry_format=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    writes GeoJSON features to a Parquet file, w/ each chunk of features as
+    a separate row group; WKB geometries are written as GeoParquet
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from astrosat.utils.utils_logging import get_arrow_type
+
+    fields = [("__index_level_0__", pa.int64())] if include_index else []
+    fields += [(column, get_arrow_type(python_types))
+               for column, python_types in column_types.items()]
+    if geometry_format == "wkt":
+        fields.append(("geometry", pa.string()))
+    elif geometry_format == "wkb":
+        fields.append(("geometry", pa.binary()))
+    schema = pa.schema(fields)
+    if geometry_format == "wkb":
+        schema = schema.with_metadata({
+            "geo": json.dumps(get_geoparquet_metadata("geometry"))
+        })
+
+    n_features = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for chunk in grouper(features, chunk_size):
+            chunk = [feature for feature in chunk if feature is not None]
+            data = {column: [] for column in schema.names}
+            for feature in chunk:
+                properties = feature.get("properties") or {}
+                if include_index:
+                    data["__index_level_0__"].append(n_features)
+                for column, python_types in column_types.items():
+                    value = properties.get(column)
+                    if schema.field(column).type == pa.string() and not (
+                        value is None or isinstance(value, str)
+                    ):
+                        # non-string values (like dicts) are stored as JSON
+                        value = json.dumps(value)
+                    data[column].append(value)
+                if geometry_format:
+                    data["geometry"].append(
+                        convert_geometry(
+                            feature.get("geometry"), geometry_format, "parquet"
+                        )
+                    )
+                n_features += 1
+            # each chunk is written as its own row group...
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+
+    return n_features
+
+
+def convert_geojson(input_path, output_path, stream=False, **kwargs):
+    """
+    converts a single GeoJSON file; returns the number of features converted
+    and how long that took (this runs in a separate process when converting
+    several files at once, so must not use the database)
+    """
+    start = time.perf_counter()
+    if stream:
+        n_features = stream_geojson(input_path, output_path, **kwargs)
+    else:
+        n_features = read_geojson(input_path, output_path, **kwargs)
+    return n_features, time.perf_counter() - start
+
 
 class Command(BaseCommand):
     """
-    Converts a GeoJSON file to a CSV file.
+    Converts GeoJSON file(s) to CSV (or Parquet) file(s).
+    By default this loads each file w/ geopandas; "--stream" parses features
+    (& writes rows) one at a time instead, so that memory use stays bounded
+    regardless of the size of the file.  Several files (or globs or
+    directories of files) can be converted at once on a pool of processes.
     """
 
-    help = "Converts a GeoJSON file to a CSV file."
+    help = "Converts GeoJSON file(s) to CSV (or Parquet) file(s)."
 
     def add_arguments(self, parser):
 
         parser.add_argument(
             "--input",
-            dest="input_path",
+            dest="input_paths",
+            nargs="+",
             required=True,
-            help="location of input GeoJSON file",
+            help=
+            "location(s) of input GeoJSON file(s); these can be globs or directories",
         )
 
         parser.add_argument(
             "--output",
             dest="output_path",
             required=True,
-            help="location of output CSV file",
+            help=
+            "location of output file; if there are multiple input files this is a directory",
+        )
+
+        parser.add_argument(
+            "--format",
+            dest="format",
+            choices=OUTPUT_FORMATS,
+            required=False,
+            default=None,
+            help=
+            "format of output file(s) (if unprovided will use the extension of the output file, or else csv).",
+        )
+
+        parser.add_argument(
+            "--geometry",
+            dest="geometry_format",
+            choices=GEOMETRY_FORMATS,
+            required=False,
+            default=None,
+            help=
+            "keep geometries in this format; WKB is hex-encoded in CSV & written as GeoParquet in Parquet (default is to drop geometries).",
         )
 
         parser.add_argument(
@@ -36,17 +332,156 @@ class Command(BaseCommand):
             help=
             "whether or not to include the index in the output (default is False).",
         )
+
+        parser.add_argument(
+            "--columns",
+            dest="columns",
+            nargs="+",
+            required=False,
+            default=None,
+            help=
+            "only output these properties (default is to output all properties).",
+        )
+
+        parser.add_argument(
+            "--stream",
+            dest="stream",
+            action="store_true",
+            help=
+            "parse features incrementally rather than loading the whole file into memory; requires ijson (default is False).",
+        )
+
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=
+            f"number of features per Parquet row group when streaming (default is {DEFAULT_CHUNK_SIZE}).",
+        )
+
+        parser.add_argument(
+            "--workers",
+            dest="workers",
+            type=int,
+            default=None,
+            help=
+            "number of processes to convert multiple files with (default is the number of CPUs).",
+        )
         self.parser = parser  # save the parser to use w/ error messages below
 
+    def get_output_paths(self, input_paths, output_path, output_format):
+        if len(input_paths) == 1 and not os.path.isdir(output_path):
+            return [output_path]
+        output_paths = [
+            os.path.join(
+                output_path,
+                os.path.splitext(os.path.basename(input_path))[0] +
+                f".{output_format}"
+            ) for input_path in input_paths
+        ]
+        # (files w/ the same name in different directories would overwrite each other)
+        input_paths_by_output_path = {}
+        for input_path, path in zip(input_paths, output_paths):
+            input_paths_by_output_path.setdefault(path, []).append(input_path)
+        duplicates = [
+            f"{', '.join(paths)} -> {path}"
+            for path, paths in input_paths_by_output_path.items()
+            if len(paths) > 1
+        ]
+        if duplicates:
+            raise CommandError(
+                "Multiple input files would be converted to the same output file:\n" +
+                "\n".join(duplicates)
+            )
+        os.makedirs(output_path, exist_ok=True)
+        return output_paths
+
     def handle(self, *args, **options):
 
-        input_path = os.path.abspath(options["input_path"])
+        self.verbosity = options["verbosity"]
+        input_paths = get_input_paths(options["input_paths"])
+        if not input_paths:
+            raise CommandError(
+                "No GeoJSON files found.\n\n" + self.parser.format_help()
+            )
         output_path = os.path.abspath(options["output_path"])
-        include_index = options["index"]
 
+        output_format = options["format"]
+        if output_format is None:
+            output_format = os.path.splitext(output_path)[1].lstrip(".").lower()
+            if output_format not in OUTPUT_FORMATS:
+                output_format = "csv"
+
+        output_paths = self.get_output_paths(
+            input_paths, output_path, output_format
+        )
+        conversion_kwargs = {
+            "stream": options["stream"],
+            "output_format": output_format,
+            "include_index": options["index"],
+            "columns": options["columns"],
+            "geometry_format": options["geometry_format"],
+            "chunk_size": options["chunk_size"],
+        }
+
+        n_workers = min(
+            options["workers"] or os.cpu_count() or 1, len(input_paths)
+        )
+        errors = []
+        start = time.perf_counter()
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    executor.submit(
+                        convert_geojson, input_path, output_path,
+                        **conversion_kwargs
+                    ): (input_path, output_path)
+                    for input_path, output_path in
+                    zip(input_paths, output_paths)
+                }
+                for future in as_completed(futures):
+                    errors += self.report_conversion(future.result, *futures[future])
+        else:
+            for input_path, output_path in zip(input_paths, output_paths):
+                errors += self.report_conversion(
+                    lambda: convert_geojson(
+                        input_path, output_path, **conversion_kwargs
+                    ),
+                    input_path,
+                    output_path,
+                )
+
+        if errors:
+            if len(input_paths) == 1:
+                (error, ) = errors
+                raise CommandError(error + "\n\n" + self.parser.format_help())
+            raise CommandError(
+                f"Failed to convert {len(errors)} (of {len(input_paths)}) file(s)."
+            )
+
+        if self.verbosity >= 1 and len(input_paths) > 1:
+            self.stdout.write(
+                f"Converted {len(input_paths)} file(s) in {time.perf_counter() - start:.2f}s."
+            )
+
+    def report_conversion(self, get_result, input_path, output_path):
+        """
+        writes the result (or error) of converting a single file; returns
+        a list of any errors
+        """
         try:
-            geo_data_frame = gpd.read_file(input_path)
-            data_frame = pd.DataFrame(geo_data_frame.drop(columns="geometry"))
-            data_frame.to_csv(output_path, index=include_index)
+            n_features, elapsed = get_result()
+        except ImportError as e:
+            error = f"Converting '{input_path}' requires an additional package: {e}"
         except Exception as e:
-            raise CommandError(str(e) + "\n\n" + self.parser.format_help())
+            error = f"Error converting '{input_path}': {e}"
+        else:
+            if self.verbosity >= 1:
+                self.stdout.write(
+                    f"Converted {n_features} feature(s) from '{input_path}' to '{output_path}' in {elapsed:.2f}s."
+                )
+            return []
+
+        self.stderr.write(error)
+        return [error]
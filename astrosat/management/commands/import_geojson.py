@@ -0,0 +1,345 @@
+import csv
+import io
+import json
+import os
+import time
+
+from django.apps import apps
+from django.contrib.gis.db.models import GeometryField
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from astrosat.utils import (
+    adapt_geojson_to_django,
+    bulk_update_or_create,
+    grouper,
+    iterate_geojson_features,
+)
+
+IMPORT_METHODS = ["create", "update_or_create", "copy"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+COPY_NULL = "\\N"
+
+
+def get_copy_array(values):
+    """
+    returns a list as a PostgreSQL array literal (as used by ArrayField)
+    """
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        elif isinstance(value, (list, tuple)):
+            elements.append(get_copy_array(value))
+        else:
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            elements.append(
+                '"%s"' % str(value).replace("\\", "\\\\").replace('"', '\\"')
+            )
+    return "{%s}" % ",".join(elements)
+
+
+def get_copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, (list, tuple)):
+        return get_copy_array(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(value).hex()
+    return value
+
+
+def get_copy_row(obj, fields, connection):
+    """
+    returns the values of an (unsaved) object's fields as a row for `COPY`;
+    geometries are written as (hex-encoded) EWKB
+    """
+    row = []
+    for field in fields:
+        # (pre_save applies things like `auto_now`)
+        value = field.pre_save(obj, add=True)
+        if isinstance(field, GeometryField):
+            row.append(value.hexewkb.decode() if value else COPY_NULL)
+        else:
+            row.append(
+                get_copy_value(field.get_db_prep_save(value, connection))
+            )
+    return row
+
+
+def get_copy_fields(model):
+    """
+    returns the fields of a model to `COPY`; the db generates the value of an
+    auto-incrementing pk (whether it is implicit or explicitly declared)
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.auto_field
+    ]
+
+
+def get_model_data(fields, field_map, geometry_field_name=None, srid=None):
+    """
+    returns the model data for the fields of an adapted GeoJSON feature,
+    w/ properties renamed according to field_map & the geometry (if any)
+    transformed to srid
+    """
+    data = {
+        field_map[property_name]: value
+        for property_name, value in fields.items()
+        if property_name in field_map
+    }
+    if geometry_field_name:
+        geometry = fields.get(geometry_field_name)
+        if geometry is not None and srid and geometry.srid != srid:
+            geometry.transform(srid)
+        data[geometry_field_name] = geometry
+    return data
+
+
+class Command(BaseCommand):
+    """
+    Imports the features of a GeoJSON file into a (GeoDjango) model.
+    Features are streamed (so the file is never loaded into memory all at
+    once) and saved in batches, either w/ `bulk_create`, w/
+    `bulk_update_or_create`, or (on PostgreSQL) w/ `COPY`.
+    """
+
+    help = "Imports a GeoJSON file into a model."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--input",
+            dest="input_path",
+            required=True,
+            help="location of input GeoJSON file",
+        )
+
+        parser.add_argument(
+            "--model",
+            dest="model",
+            required=True,
+            help="model to import into (as 'app_label.ModelName')",
+        )
+
+        parser.add_argument(
+            "--map",
+            dest="field_map",
+            nargs="+",
+            required=False,
+            default=[],
+            help=
+            "map properties to fields w/ different names (as 'property=field'); other properties are imported into fields w/ the same name, if they exist.",
+        )
+
+        parser.add_argument(
+            "--geometry-field",
+            dest="geometry_field",
+            required=False,
+            default=None,
+            help=
+            "field to import geometries into (if unprovided will use the model's 1st geometry field, if any).",
+        )
+
+        parser.add_argument(
+            "--srid",
+            dest="srid",
+            type=int,
+            required=False,
+            default=None,
+            help=
+            "SRID to transform geometries to (if unprovided will use the SRID of the geometry field).",
+        )
+
+        parser.add_argument(
+            "--method",
+            dest="method",
+            choices=IMPORT_METHODS,
+            default=IMPORT_METHODS[0],
+            help=
+            f"how to save features; 'copy' requires PostgreSQL (default is '{IMPORT_METHODS[0]}').",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=
+            f"number of features to save at a time (default is {DEFAULT_BATCH_SIZE}).",
+        )
+
+        parser.add_argument(
+            "--database",
+            dest="database",
+            default="default",
+            help="database to import into (default is 'default').",
+        )
+
+    def get_model(self, model_label):
+        try:
+            return apps.get_model(model_label)
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model: '{model_label}'.")
+
+    def get_field_map(self, model, field_map):
+        """
+        returns a dictionary of property names to the (non-geometry) fields
+        they are imported into
+        """
+        field_names = {
+            field.name: field.attname
+            for field in model._meta.concrete_fields
+            if not field.primary_key and not isinstance(field, GeometryField)
+        }
+        mapped_field_names = dict(field_names)
+        for mapping in field_map:
+            try:
+                property_name, field_name = mapping.split("=", 1)
+            except ValueError:
+                raise CommandError(
+                    f"Invalid mapping: '{mapping}' (should be 'property=field')."
+                )
+            if field_name not in field_names:
+                raise CommandError(
+                    f"{model._meta.label} has no field named '{field_name}'."
+                )
+            mapped_field_names[property_name] = field_names[field_name]
+        return mapped_field_names
+
+    def get_geometry_field(self, model, geometry_field_name):
+        if geometry_field_name is None:
+            return next(
+                (
+                    field for field in model._meta.concrete_fields
+                    if isinstance(field, GeometryField)
+                ),
+                None,
+            )
+        try:
+            geometry_field = model._meta.get_field(geometry_field_name)
+        except FieldDoesNotExist:
+            geometry_field = None
+        if not isinstance(geometry_field, GeometryField):
+            raise CommandError(
+                f"{model._meta.label} has no geometry field named '{geometry_field_name}'."
+            )
+        return geometry_field
+
+    def handle(self, *args, **options):
+
+        input_path = os.path.abspath(options["input_path"])
+        model = self.get_model(options["model"])
+        field_map = self.get_field_map(model, options["field_map"])
+        geometry_field = self.get_geometry_field(
+            model, options["geometry_field"]
+        )
+        srid = options["srid"] or (geometry_field and geometry_field.srid)
+        method = options["method"]
+        batch_size = options["batch_size"]
+        self.using = options["database"]
+        self.verbosity = options["verbosity"]
+
+        if method == "copy" and connections[self.using].vendor != "postgresql":
+            raise CommandError("The 'copy' method requires PostgreSQL.")
+
+        try:
+            import ijson  # noqa: F401
+        except ImportError as e:
+            raise CommandError(
+                f"Importing GeoJSON requires an additional package: {e}"
+            )
+
+        n_features = 0
+        start = time.perf_counter()
+        with open(input_path, "rb") as fp, transaction.atomic(using=self.using):
+            features = iterate_geojson_features(
+                fp,
+                property_names=set(field_map.keys()),
+                include_geometry=geometry_field is not None,
+            )
+            geometry_field_name = geometry_field.name if geometry_field else None
+            for batch in grouper(
+                adapt_geojson_to_django(
+                    features, geometry_field_name=geometry_field_name
+                ),
+                batch_size,
+            ):
+                model_data = [
+                    get_model_data(
+                        fields,
+                        field_map,
+                        geometry_field_name=geometry_field_name,
+                        srid=srid,
+                    ) for fields in batch if fields is not None
+                ]
+
+                self.save_batch(model, model_data, method)
+                n_features += len(model_data)
+
+                if self.verbosity >= 2:
+                    self.stdout.write(
+                        "\rImported %d feature(s) (%d feature(s)/s)." % (
+                            n_features,
+                            n_features / (time.perf_counter() - start),
+                        ),
+                        ending="",
+                    )
+
+        if n_features and self.verbosity >= 2:
+            self.stdout.write()  # Add a newline after progress indicator.
+
+        if self.verbosity >= 1:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                "Imported %d feature(s) into %s in %.2fs (%d feature(s)/s)." % (
+                    n_features,
+                    model._meta.label,
+                    elapsed,
+                    n_features / elapsed if elapsed else 0,
+                )
+            )
+
+    def save_batch(self, model, model_data, method):
+        if method == "update_or_create":
+            # (this only fetches the existing objects that match the batch)
+            bulk_update_or_create(model, model_data, using=self.using)
+        elif method == "copy":
+            self.copy_batch(model, model_data)
+        else:
+            model._default_manager.db_manager(self.using).bulk_create([
+                model(**data) for data in model_data
+            ])
+
+    def copy_batch(self, model, model_data):
+        """
+        saves a batch of objects w/ PostgreSQL's `COPY` (which is much faster
+        than `INSERT`)
+        """
+        connection = connections[self.using]
+        fields = get_copy_fields(model)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for data in model_data:
+            # (building the objects applies any field defaults)
+            writer.writerow(get_copy_row(model(**data), fields, connection))
+        buffer.seek(0)
+
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '%s')" % (
+                    quote_name(model._meta.db_table),
+                    ", ".join(quote_name(field.column) for field in fields),
+                    COPY_NULL,
+                ),
+                buffer,
+            )
@@ -1,5 +1,12 @@
+import hashlib
 import os
+import shutil
+import tarfile
+import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 from django.apps import apps
 from django.core.management.base import CommandError
@@ -9,65 +16,340 @@ from django.db.models.signals import pre_save
 
 MEDIA_FIELDS = [FileField, ImageField]
 
+MEDIA_COMPARISONS = ["size", "hash"]
+
+DEFAULT_MEDIA_WORKERS = 8
+
 
 def is_media_field(field):
     return any(isinstance(field, field_class) for field_class in MEDIA_FIELDS)
 
 
-def get_models_with_media_fields():
+def get_media_fields_by_model():
+    """
+    returns a dictionary of every model w/ media fields and those fields
+    """
+    media_fields_by_model = {}
     for ModelClass in apps.get_models(
         include_auto_created=True, include_swapped=True
     ):
-        if any(is_media_field(field) for field in ModelClass._meta.fields):
-            yield ModelClass
+        media_fields = [
+            field for field in ModelClass._meta.fields if is_media_field(field)
+        ]
+        if media_fields:
+            media_fields_by_model[ModelClass] = media_fields
+    return media_fields_by_model
+
+
+def get_models_with_media_fields():
+    yield from get_media_fields_by_model().keys()
+
+
+def get_file_hash(fp, chunk_size=1024 * 1024):
+    file_hash = hashlib.md5()
+    for chunk in iter(lambda: fp.read(chunk_size), b""):
+        file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+#################
+# media sources #
+#################
+
+
+class DirectoryMediaSource:
+    """
+    Reads fixture media files from a directory.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+    def size(self, name):
+        return os.path.getsize(self.get_path(name))
+
+    @contextmanager
+    def open(self, name):
+        with open(self.get_path(name), "rb") as fp:
+            yield fp
+
+    def prepare(self, names):
+        pass
+
+    def close(self):
+        pass
+
+
+class ArchiveMediaSource:
+    """
+    The base class for media sources that read files straight out of an archive
+    (w/out extracting it).  For backwards-compatibility, if the archive contains
+    a top-level directory named after the archive, names are relative to that.
+    (Archives created from inside a directory, whose names start w/ "./", work too.)
+    """
+
+    extensions = []
+
+    def __init__(self, path):
+        self.path = path
+        archive_name = os.path.basename(path)
+        for extension in self.extensions:
+            if archive_name.endswith(extension):
+                archive_name = archive_name[:-len(extension)]
+                break
+        names = self.get_names()
+        self.root = next((
+            root for root in
+            [f"{archive_name}/", f"./{archive_name}/", "./"]
+            if any(name.startswith(root) for name in names)
+        ), "")
+
+    def get_member_name(self, name):
+        return self.root + name.replace(os.path.sep, "/")
+
+    def prepare(self, names):
+        """
+        called w/ the names of all the files that are about to be opened
+        """
+        pass
+
+
+class ZipMediaSource(ArchiveMediaSource):
+    """
+    Reads fixture media files from a zipfile.
+    (ZipFile synchronizes access to the underlying file, so files can be read concurrently.)
+    """
+
+    extensions = [".zip"]
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, "r")
+        super().__init__(path)
+
+    def get_names(self):
+        return self.archive.namelist()
+
+    def size(self, name):
+        return self.archive.getinfo(self.get_member_name(name)).file_size
+
+    @contextmanager
+    def open(self, name):
+        with self.archive.open(self.get_member_name(name), "r") as fp:
+            yield fp
+
+    def close(self):
+        self.archive.close()
+
+
+class TarMediaSource(ArchiveMediaSource):
+    """
+    Reads fixture media files from a (possibly compressed) tarfile.
+    Reading members out of order means seeking backwards, which decompresses
+    a compressed tarfile from the start each time; so `prepare` copies all the
+    files that will be opened to a temporary directory in a single (sequential)
+    pass through the archive.  TarFile is not threadsafe, so any other files are
+    copied to a (spooled) temporary file while holding a lock.
+    """
+
+    extensions = [".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".tar"]
+
+    max_spooled_size = 8 * 1024 * 1024
+
+    def __init__(self, path):
+        self.archive = tarfile.open(path, "r:*")
+        self.lock = threading.Lock()
+        self.extracted_dir = None
+        self.extracted_names = {}
+        super().__init__(path)
+
+    def get_names(self):
+        return self.archive.getnames()
+
+    def size(self, name):
+        with self.lock:
+            return self.archive.getmember(self.get_member_name(name)).size
+
+    def prepare(self, names):
+        member_names = {self.get_member_name(name) for name in names}
+        with self.lock:
+            if self.extracted_dir is None:
+                self.extracted_dir = tempfile.TemporaryDirectory()
+            for member in self.archive:
+                if member.name not in member_names or not member.isfile():
+                    continue
+                extracted_name = os.path.join(
+                    self.extracted_dir.name, str(len(self.extracted_names))
+                )
+                with self.archive.extractfile(member) as member_fp:
+                    with open(extracted_name, "wb") as fp:
+                        shutil.copyfileobj(member_fp, fp)
+                self.extracted_names[member.name] = extracted_name
+
+    @contextmanager
+    def open(self, name):
+        member_name = self.get_member_name(name)
+        extracted_name = self.extracted_names.get(member_name)
+        if extracted_name is not None:
+            with open(extracted_name, "rb") as fp:
+                yield fp
+            return
+
+        with tempfile.SpooledTemporaryFile(self.max_spooled_size) as fp:
+            with self.lock:
+                member_fp = self.archive.extractfile(member_name)
+                if member_fp is None:
+                    raise FileNotFoundError(f"'{name}' is not a regular file")
+                shutil.copyfileobj(member_fp, fp)
+            fp.seek(0)
+            yield fp
+
+    def close(self):
+        self.archive.close()
+        if self.extracted_dir is not None:
+            self.extracted_dir.cleanup()
+
+
+def get_media_source(path):
+    if os.path.isdir(path):
+        return DirectoryMediaSource(path)
+    elif zipfile.is_zipfile(path):
+        return ZipMediaSource(path)
+    elif os.path.isfile(path) and tarfile.is_tarfile(path):
+        return TarMediaSource(path)
+    raise CommandError(
+        f"{path} must either be a zipfile, a tarfile or a directory"
+    )
+
+
+###########
+# command #
+###########
 
 
 class Command(DjangoLoadDataCommand):
     """
     Just like the built-in loaddata command, except optionally uses the `pre_save` signal
     to move any media files to the appropriate media storage location.  Media files are either
-    located in a local directory or zipfile (specified by --media-path) or else in "<app>/fixtures/media".
+    located in a local directory, zipfile or tarfile (specified by --media-path) or else in
+    "<app>/fixtures/media".  Archives are read directly (rather than being extracted).
+    Media files are collected while the fixtures are loaded and then stored afterwards by a pool
+    of threads (which is much faster w/ remote storage such as S3).
     """
+    def get_model_media_source(self, model):
+        """
+        returns the source of fixture media files for a model & the prefix of their names in that source
+        """
+        app_config = apps.get_app_config(model._meta.app_label)
+        if not self.media_source:
+            if app_config.name not in self.app_media_sources:
+                self.app_media_sources[app_config.name] = DirectoryMediaSource(
+                    os.path.join(app_config.path, "fixtures/media")
+                )
+            return (self.app_media_sources[app_config.name], "")
+        return (self.media_source, app_config.name)
+
     def load_media(self, sender, *args, **kwargs):
 
+        # this receives every pre_save signal during loaddata, so it must be quick
+        # to ignore models w/out media fields (which are worked out only once)
+        media_fields = self.media_fields_by_model.get(sender)
+        if not media_fields:
+            return
+
         instance = kwargs["instance"]
 
         # work out where fixture media files for this model ought to live...
-        app_config = apps.get_app_config(sender._meta.app_label)
-        if not self.media_path:
-            app_fixture_media_path = os.path.join(
-                app_config.path, "fixtures/media"
-            )
-        else:
-            app_fixture_media_path = os.path.join(
-                self.media_path, app_config.name
+        if sender not in self.model_media_sources:
+            self.model_media_sources[sender] = self.get_model_media_source(
+                sender
             )
+        media_source, app_fixture_media_prefix = self.model_media_sources[
+            sender]
 
-        for field in sender._meta.fields:
-
-            if not is_media_field(field):
-                continue
+        for field in media_fields:
 
             media_file = getattr(instance, field.name)
             if media_file:
-                # get the path for this fixture media file...
+                # get the name of this fixture media file in its source...
                 media_file_full_name = media_file.name
-                media_file_fixture_path = os.path.join(
-                    app_fixture_media_path, media_file_full_name
+                media_file_fixture_name = os.path.join(
+                    app_fixture_media_prefix, media_file_full_name
+                )
+                # ...and store it later (if the same file is referenced more than once, the last reference wins)
+                self.media_operations[(field.storage, media_file_full_name)] = (
+                    f"{instance}.{field.name}",
+                    media_source,
+                    media_file_fixture_name,
                 )
+
+    def is_media_unchanged(self, storage, name, media_source, fixture_name):
+        """
+        checks if the stored copy of a media file matches the fixture copy (according to --media-compare)
+        """
+        if not storage.exists(name):
+            return False
+        if self.media_compare == "size":
+            return storage.size(name) == media_source.size(fixture_name)
+        with storage.open(name, "rb") as stored_fp:
+            stored_hash = get_file_hash(stored_fp)
+        with media_source.open(fixture_name) as fixture_fp:
+            return stored_hash == get_file_hash(fixture_fp)
+
+    def store_media(self, storage, name, media_source, fixture_name):
+        """
+        writes a fixture media file to storage; returns True if it was stored (or False if it was skipped)
+        """
+        if self.media_compare and self.is_media_unchanged(
+            storage, name, media_source, fixture_name
+        ):
+            return False
+        with media_source.open(fixture_name) as fp:
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, fp)
+        return True
+
+    def store_all_media(self):
+        """
+        executes all of the collected media operations using a pool of threads
+        """
+        # let media sources get ready to read all of the files...
+        names_by_media_source = {}
+        for _, media_source, fixture_name in self.media_operations.values():
+            names_by_media_source.setdefault(media_source,
+                                             []).append(fixture_name)
+        for media_source, fixture_names in names_by_media_source.items():
+            media_source.prepare(fixture_names)
+
+        n_stored = n_skipped = 0
+        with ThreadPoolExecutor(max_workers=self.media_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.store_media, storage, name, media_source, fixture_name
+                ): description
+                for (storage, name), (description, media_source, fixture_name)
+                in self.media_operations.items()
+            }
+            for future in as_completed(futures):
                 try:
-                    # try to read the file...
-                    with open(media_file_fixture_path, "rb") as fp:
-                        if field.storage.exists(media_file_full_name):
-                            field.storage.delete(media_file_full_name)
-                        # ...and write it to storage...
-                        field.storage.save(media_file_full_name, fp)
+                    if future.result():
+                        n_stored += 1
+                    else:
+                        n_skipped += 1
                 except Exception as e:
                     # if anything went wrong, print the error,
-                    # but keep processing the fixture...
-                    msg = f"Error storing '{instance}.{field.name}': {e}"
+                    # but keep processing the remaining media...
+                    msg = f"Error storing '{futures[future]}': {e}"
                     self.stderr.write(self.style.WARNING(msg))
 
+        if self.verbosity >= 1:
+            self.stdout.write(
+                f"Stored {n_stored} media file(s); skipped {n_skipped} unchanged media file(s)."
+            )
+        self.media_operations.clear()
+
     def add_arguments(self, parser):
         super().add_arguments(parser)
 
@@ -84,48 +366,73 @@ class Command(DjangoLoadDataCommand):
             help="location of dir w/ media files",
         )
 
+        parser.add_argument(
+            "--media-workers",
+            dest="media_workers",
+            type=int,
+            default=DEFAULT_MEDIA_WORKERS,
+            help=
+            f"number of threads used to store media files (default is {DEFAULT_MEDIA_WORKERS}).",
+        )
+
+        parser.add_argument(
+            "--media-compare",
+            dest="media_compare",
+            choices=MEDIA_COMPARISONS,
+            default=None,
+            help=
+            "skip media files whose stored copy already matches the fixture copy by 'size' or 'hash'.",
+        )
+
     def handle(self, *fixture_labels, **options):
 
         load_media = options["load_media"]
         media_path = options["media_path"]
+        self.media_workers = options["media_workers"]
+        self.media_compare = options["media_compare"]
+        self.media_operations = {}
 
         if media_path and not load_media:
             raise CommandError(
                 "The '--media-path' argument cannot be used without the '--media' flag."
             )
+        if self.media_compare and not load_media:
+            raise CommandError(
+                "The '--media-compare' argument cannot be used without the '--media' flag."
+            )
 
         # figure out where media files are stored...
-        if load_media:
-            if media_path:
-                media_abspath = os.path.abspath(media_path)
-                media_dir, media_file = os.path.split(media_abspath)
-                if zipfile.is_zipfile(media_abspath):
-                    with zipfile.ZipFile(media_abspath, "r") as zip:
-                        zip.extractall(media_dir)
-                    self.media_path = os.path.join(
-                        media_dir, os.path.splitext(media_file)[0]
-                    )
-                elif os.path.isdir(media_abspath):
-                    self.media_path = media_abspath
-                else:
-                    raise CommandError(
-                        f"{media_path} must either be a zipfile or a directory"
-                    )
+        self.media_source = None
+        self.app_media_sources = {}
+        self.model_media_sources = {}
+        if load_media and media_path:
+            self.media_source = get_media_source(os.path.abspath(media_path))
 
-            else:
-                self.media_path = None
+        try:
+            if load_media:
+                # intercept media fields...
+                # (Django doesn't say which models are in a fixture until their objects are
+                # being saved, so a single receiver handles every model w/ a fast lookup)
+                self.media_fields_by_model = get_media_fields_by_model()
+                pre_save.connect(self.load_media)
+                try:
+                    # load data...
+                    command_result = super().handle(
+                        *fixture_labels, **options
+                    )
+                finally:
+                    # stop intercepting media fields...
+                    pre_save.disconnect(self.load_media)
 
-        # intercept media fields...
-        if load_media:
-            for ModelClass in get_models_with_media_fields():
-                pre_save.connect(self.load_media, sender=ModelClass)
+                # store media...
+                self.store_all_media()
 
-        # load data...
-        command_result = super().handle(*fixture_labels, **options)
+            else:
+                # load data...
+                command_result = super().handle(*fixture_labels, **options)
 
-        # stop intercepting media fields...
-        if load_media:
-            for ModelClass in get_models_with_media_fields():
-                pre_save.disconnect(self.load_media, sender=ModelClass)
+        finally:
+            if self.media_source:
+                self.media_source.close()
 
         return command_result
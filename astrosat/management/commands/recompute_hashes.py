@@ -0,0 +1,107 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from astrosat.mixins import HashableMixin, HashableQuerySet
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the hashes of every instance of a HashableMixin model.
+    Instances are processed in chunks (so memory use stays bounded) and only
+    those whose hashes have changed are updated.  This is useful after
+    hash sources have been changed w/ `QuerySet.update`, or after changing
+    a model's `hash_algorithm`.
+    """
+
+    help = "Recomputes the hashes of a Hashable model."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "--model",
+            dest="model",
+            required=True,
+            help="model to recompute hashes of (as 'app_label.ModelName')",
+        )
+
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=
+            f"number of objects to process at a time (default is {DEFAULT_CHUNK_SIZE}).",
+        )
+
+        parser.add_argument(
+            "--workers",
+            dest="workers",
+            type=int,
+            default=None,
+            help=
+            "number of threads to compute hashes with (default is to compute them in the main thread).",
+        )
+
+        parser.add_argument(
+            "--database",
+            dest="database",
+            default="default",
+            help="database to use (default is 'default').",
+        )
+
+    def handle(self, *args, **options):
+
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model: '{options['model']}'.")
+        if not issubclass(model, HashableMixin):
+            raise CommandError(f"{model._meta.label} is not Hashable.")
+
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+
+        # (the model's own manager might not be a HashableManager)
+        queryset = HashableQuerySet(model=model, using=options["database"])
+
+        n_objects = n_updated = 0
+        last_pk = None
+        while True:
+            # pages are fetched by pk, rather than by offset, so that each
+            # chunk is just as quick to fetch as the last
+            chunk_queryset = queryset.order_by("pk")
+            if last_pk is not None:
+                chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk_queryset[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            old_hashes = [obj.hash for obj in chunk]
+            queryset.compute_hashes(chunk, workers=workers)
+            changed_objs = [
+                obj for obj, old_hash in zip(chunk, old_hashes)
+                if obj.hash != old_hash
+            ]
+            if changed_objs:
+                # (the hashes have already been computed)
+                model._base_manager.db_manager(queryset.db).bulk_update(
+                    changed_objs, ["_hash"]
+                )
+
+            n_objects += len(chunk)
+            n_updated += len(changed_objs)
+            if options["verbosity"] >= 2:
+                self.stdout.write(
+                    "\rProcessed %d object(s)." % n_objects, ending=""
+                )
+
+        if n_objects and options["verbosity"] >= 2:
+            self.stdout.write()  # Add a newline after progress indicator.
+
+        if options["verbosity"] >= 1:
+            self.stdout.write(
+                f"Recomputed the hashes of {n_objects} {model._meta.label} object(s); {n_updated} changed."
+            )
@@ -1,15 +1,27 @@
-import collections
 import gzip
+import json
+import operator
 import os
+import sys
+import warnings
+from collections import Counter, OrderedDict, defaultdict
+from functools import reduce
 
+from django.apps import apps
 from django.core import serializers
 from django.core.management.base import CommandError
 from django.core.management.commands.loaddata import (
     Command as DjangoLoadDataCommand,
     SingleZipReader,
+    humanize,
 )
 from django.core.management.utils import parse_apps_and_model_labels
+from django.core.serializers.base import DeserializationError
 from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.deletion import Collector
+
+from astrosat.utils import grouper
 
 try:
     import bz2
@@ -23,17 +35,102 @@ try:
 except ImportError:
     has_lzma = False
 
+try:
+    import yaml
+    has_yaml = True
+except ImportError:
+    has_yaml = False
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def build_partial_instance(model, fields):
+    """
+    returns an (unsaved) instance of model w/ just the non-relational fields of
+    a fixture record; this is enough to compute most natural keys
+    """
+    data = {}
+    for field in model._meta.concrete_fields:
+        if not field.is_relation and field.name in fields:
+            data[field.attname] = field.to_python(fields[field.name])
+    return model(**data)
+
+
+def get_natural_key_field_names(manager):
+    """
+    returns the names of the (non-relational) fields that a manager's
+    `get_by_natural_key` looks up, if it declares them as `natural_key_fields`;
+    otherwise natural keys have to be resolved one object at a time
+    """
+    field_names = getattr(manager, "natural_key_fields", None)
+    if not field_names:
+        return None
+    opts = manager.model._meta
+    if any(opts.get_field(field_name).is_relation for field_name in field_names):
+        return None
+    return tuple(field_names)
+
+
+def sort_models_for_deletion(models):
+    """
+    returns models ordered so that each model comes before any other model it
+    refers to; deleting in this order means rows being unloaded never cascade
+    to (or are protected by) rows that haven't been unloaded yet
+    """
+    models = list(models)
+    dependencies_first = []
+    visited = set()
+
+    def _visit(model):
+        if model in visited:
+            return
+        visited.add(model)
+        for field in model._meta.get_fields():
+            if (
+                field.is_relation and field.concrete and
+                field.related_model in models and field.related_model != model
+            ):
+                _visit(field.related_model)
+        dependencies_first.append(model)
+
+    for model in models:
+        _visit(model)
+
+    return list(reversed(dependencies_first))
+
 
 class Command(DjangoLoadDataCommand):
     """
     Unloads objects defined in a fixture file.  This is based off of the
     built-in loaddata management command b/c that already includes all of
     the logic for including/exluding specific apps, dealing w/ different
-    compression formats, and - crucially - deserializing using natural_keys
+    compression formats, and finding fixtures.  Rather than deserializing
+    (and deleting) one object at a time, objects are grouped by model, their
+    natural keys are resolved to pks (in bulk, if the model's manager declares
+    `natural_key_fields`), and each model's objects are deleted w/ a few
+    `filter(pk__in=...).delete()` queries.
     """
 
     help = "Deletes instances defined in the named fixture(s) from the database."
 
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=
+            f"Number of objects to resolve or delete per query [default: {DEFAULT_BATCH_SIZE}].",
+        )
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            help=
+            "Report the number of objects of each model that would be unloaded (including cascades) w/out deleting anything.",
+        )
+
     def loaddata(self, fixture_labels):
         raise NotImplementedError()
 
@@ -49,6 +146,8 @@ class Command(DjangoLoadDataCommand):
             options["exclude"]
         )
         self.format = options["format"]
+        self.batch_size = options["batch_size"]
+        self.dry_run = options["dry_run"]
 
         with transaction.atomic(using=self.using):
             # here is the different bit...
@@ -58,7 +157,6 @@ class Command(DjangoLoadDataCommand):
             connections[self.using].close()
 
     def unloaddata(self, fixture_labels):
-        connection = connections[self.using]
 
         self.fixture_count = 0
         self.unloaded_object_count = 0
@@ -84,12 +182,31 @@ class Command(DjangoLoadDataCommand):
             return
 
         # here is the different bit...
-        # just execute the single unload_label fn, instead of all the
-        # trial-and-error that happens when actually loading a fixture
-        self.class_deletion_record = collections.defaultdict(int)
+        # read the records from all fixtures, grouped by model; nothing is
+        # deleted until every object has been resolved, so that objects which
+        # would be cascaded by an earlier deletion are still accounted for
+        self.records_by_model = OrderedDict()
         for fixture_label in fixture_labels:
             self.unload_label(fixture_label)
 
+        pks_by_model = self.get_pks_by_model()
+
+        if self.dry_run:
+            counts = self.collect_objects(pks_by_model)
+            if self.verbosity >= 1:
+                for model_label, count in sorted(counts.items()):
+                    self.stdout.write("  %s: %d" % (model_label, count))
+                self.stdout.write(
+                    "Would unload %d object(s) (of %d) from %d fixture(s)" % (
+                        sum(counts.values()),
+                        self.fixture_object_count,
+                        self.fixture_count,
+                    )
+                )
+            return
+
+        self.unloaded_object_count = self.delete_objects(pks_by_model)
+
         if self.verbosity >= 1:
             self.stdout.write(
                 "Unloaded %d object(s) (of %d) from %d fixture(s)" % (
@@ -100,8 +217,9 @@ class Command(DjangoLoadDataCommand):
             )
 
     def unload_label(self, fixture_label):
-
-        show_progress = self.verbosity >= 3
+        """
+        reads the records in all of the fixtures matching fixture_label
+        """
         for fixture_file, fixture_dir, fixture_name in self.find_fixtures(
             fixture_label
         ):
@@ -113,65 +231,22 @@ class Command(DjangoLoadDataCommand):
             try:
                 self.fixture_count += 1
                 objects_in_fixture = 0
-                unloaded_objects_in_fixture = 0
                 if self.verbosity >= 2:
                     self.stdout.write(
-                        "Installing %s fixture '%s' from %s." %
+                        "Unloading %s fixture '%s' from %s." %
                         (ser_fmt, fixture_name, humanize(fixture_dir))
                     )
 
-                objects = serializers.deserialize(
-                    ser_fmt,
-                    fixture,
-                    using=self.using,
-                    ignorenonexistent=self.ignore,
-                    handle_forward_references=True,
-                )
-
-                for obj in objects:
+                for record in self.read_records(fixture, ser_fmt):
                     objects_in_fixture += 1
+                    model = self.get_record_model(record)
                     if (
-                        obj.object._meta.app_config in self.excluded_apps or
-                        type(obj.object) in self.excluded_models
+                        model._meta.app_config in self.excluded_apps or
+                        model in self.excluded_models
                     ):
                         continue
+                    self.records_by_model.setdefault(model, []).append(record)
 
-                    # here is the different bit...
-                    obj_class_label = obj.object._meta.label
-                    try:
-                        n_deleted, deleted_classes = obj.object.delete(
-                            using=self.using
-                        )
-                        unloaded_objects_in_fixture += n_deleted
-                        for key, val in deleted_classes.items():
-                            if key == obj_class_label:
-                                self.class_deletion_record[key] += (val - 1)
-                            else:
-                                self.class_deletion_record[key] += val
-                    except Exception as e:
-                        # various exceptions might ocurr; if it is b/c obj already doesn't exist
-                        # then that's okay, just make a note of it and move on
-                        if obj.object.pk is None:
-                            if obj_class_label in self.class_deletion_record and self.class_deletion_record[
-                                obj_class_label] > 0:
-                                self.class_deletion_record[obj_class_label] -= 1
-                                continue  # obj has been deleted in a prior loop
-                            elif self.ignore:
-                                continue  # obj wasn't in the db in the 1st place
-                        raise
-
-                    if show_progress:
-                        self.stdout.write(
-                            "\rProcessed %i object(s)." %
-                            unloaded_objects_in_fixture,
-                            ending="",
-                        )
-
-                if objects and show_progress:
-                    self.stdout.write(
-                    )  # Add a newline after progress indicator.
-
-                self.unloaded_object_count += unloaded_objects_in_fixture
                 self.fixture_object_count += objects_in_fixture
 
             except Exception as e:
@@ -190,3 +265,207 @@ class Command(DjangoLoadDataCommand):
                     "invalid.)" % fixture_name,
                     RuntimeWarning,
                 )
+
+    def read_records(self, fixture, ser_fmt):
+        """
+        returns the raw records (dicts of "model", "pk" & "fields") in a fixture;
+        formats which can't be read directly are deserialized instead, which
+        resolves natural keys one object at a time
+        """
+        if ser_fmt == "json":
+            return json.load(fixture)
+        if ser_fmt == "jsonl":
+            return [json.loads(line) for line in fixture if line.strip()]
+        if ser_fmt == "yaml" and has_yaml:
+            return yaml.load(fixture, Loader=yaml.SafeLoader) or []
+
+        # (objects whose natural keys couldn't be resolved have no pk)
+        return [{
+            "model": obj.object._meta.label_lower,
+            "pk": obj.object.pk,
+            "missing": obj.object.pk is None,
+        } for obj in serializers.deserialize(
+            ser_fmt,
+            fixture,
+            using=self.using,
+            ignorenonexistent=self.ignore,
+            handle_forward_references=True,
+        )]
+
+    def get_record_model(self, record):
+        try:
+            return apps.get_model(record["model"])
+        except (LookupError, TypeError, KeyError):
+            raise DeserializationError(
+                "Invalid model identifier: '%s'" % record.get("model")
+            )
+
+    def get_pks_by_model(self):
+        """
+        returns a dictionary of the pks of the objects to unload for each model;
+        raises an AssertionError if any natural keys can't be resolved (unless
+        "--ignorenonexistent" was passed); explicit pks that don't exist are
+        assumed to have already been unloaded
+        """
+        pks_by_model = OrderedDict()
+        for model, records in self.records_by_model.items():
+            pks, n_missing = self.resolve_pks(model, records)
+            if n_missing and not self.ignore:
+                raise AssertionError(
+                    "%d %s object(s) in the fixture(s) do not exist." %
+                    (n_missing, model._meta.label)
+                )
+            if pks:
+                pks_by_model[model] = pks
+        return pks_by_model
+
+    def resolve_pks(self, model, records):
+        """
+        returns the pks of the objects in records that exist (& the number of
+        natural keys that don't); explicit pks are checked - and natural keys
+        are looked up, if the model's manager declares `natural_key_fields` -
+        in batches rather than one object at a time
+        """
+        pk_field = model._meta.pk
+        manager = model._default_manager.db_manager(self.using)
+        natural_key_field_names = get_natural_key_field_names(manager)
+
+        pks = set()
+        n_missing = 0
+        explicit_pks = []
+        natural_keys = []
+        unresolved_records = []
+
+        for record in records:
+            if record.get("missing"):
+                n_missing += 1
+            elif record.get("pk") is not None:
+                explicit_pks.append(pk_field.to_python(record["pk"]))
+            elif hasattr(model, "natural_key") and hasattr(
+                manager, "get_by_natural_key"
+            ):
+                try:
+                    instance = build_partial_instance(
+                        model, record.get("fields", {})
+                    )
+                    natural_keys.append(tuple(instance.natural_key()))
+                except Exception:
+                    unresolved_records.append(record)
+            else:
+                # (no pk & no natural key; this can't be in the db)
+                n_missing += 1
+
+        # explicit pks which aren't in the db have already been unloaded
+        for batch in grouper(set(explicit_pks), self.batch_size):
+            batch = [pk for pk in batch if pk is not None]
+            pks.update(
+                model._base_manager.db_manager(self.using).filter(
+                    pk__in=batch
+                ).values_list("pk", flat=True)
+            )
+
+        natural_keys = set(natural_keys)
+        if natural_key_field_names is None:
+            for natural_key in natural_keys:
+                try:
+                    pks.add(manager.get_by_natural_key(*natural_key).pk)
+                except model.DoesNotExist:
+                    n_missing += 1
+            natural_keys = set()
+
+        resolved_natural_keys = {}
+        for batch in grouper(natural_keys, self.batch_size):
+            batch = [natural_key for natural_key in batch if natural_key]
+            if len(natural_key_field_names) == 1:
+                (field_name, ) = natural_key_field_names
+                queryset = manager.filter(**{
+                    f"{field_name}__in": [natural_key[0] for natural_key in batch]
+                })
+            else:
+                queryset = manager.filter(
+                    reduce(
+                        operator.or_,
+                        (
+                            Q(**dict(zip(natural_key_field_names, natural_key)))
+                            for natural_key in batch
+                        ),
+                    )
+                )
+            for *natural_key, pk in queryset.values_list(
+                *natural_key_field_names, "pk"
+            ):
+                resolved_natural_keys[tuple(natural_key)] = pk
+        pks.update(resolved_natural_keys.values())
+        n_missing += len(natural_keys) - len(resolved_natural_keys)
+
+        if unresolved_records:
+            # natural keys that can't be computed from a record's fields are
+            # resolved by deserializing (which calls `get_by_natural_key`)
+            for obj in serializers.deserialize(
+                "python",
+                unresolved_records,
+                using=self.using,
+                ignorenonexistent=True,
+                handle_forward_references=True,
+            ):
+                if obj.object.pk is not None:
+                    pks.add(obj.object.pk)
+                else:
+                    n_missing += 1
+
+        return pks, n_missing
+
+    def collect_objects(self, pks_by_model):
+        """
+        returns the number of objects of each model that would be deleted by
+        `delete_objects` (including cascades), w/out deleting anything
+        """
+        # this uses a single Collector for every batch; objects can be reached
+        # from several places (e.g. a child in the fixture that also cascades
+        # from its parent), so the distinct pks of each model are counted,
+        # including those of querysets that Django would delete w/out fetching
+        # them first ("fast deletes")
+        collector = Collector(using=self.using)
+        for model in sort_models_for_deletion(pks_by_model.keys()):
+            for batch in grouper(pks_by_model[model], self.batch_size):
+                batch = [pk for pk in batch if pk is not None]
+                collector.collect(
+                    model._base_manager.db_manager(self.using).filter(
+                        pk__in=batch
+                    )
+                )
+
+        pks_by_label = defaultdict(set)
+        for model, instances in collector.data.items():
+            pks_by_label[model._meta.label].update(obj.pk for obj in instances)
+        for queryset in collector.fast_deletes:
+            pks_by_label[queryset.model._meta.label].update(
+                queryset.values_list("pk", flat=True)
+            )
+        return Counter({
+            label: len(pks)
+            for label, pks in pks_by_label.items() if pks
+        })
+
+    def delete_objects(self, pks_by_model):
+        """
+        deletes the objects in pks_by_model (& anything that cascades from them);
+        returns the total number of objects deleted
+        """
+        show_progress = self.verbosity >= 3
+        n_deleted = 0
+        for model in sort_models_for_deletion(pks_by_model.keys()):
+            for batch in grouper(pks_by_model[model], self.batch_size):
+                batch = [pk for pk in batch if pk is not None]
+                n_batch_deleted, _ = model._base_manager.db_manager(
+                    self.using
+                ).filter(pk__in=batch).delete()
+                n_deleted += n_batch_deleted
+                if show_progress:
+                    self.stdout.write(
+                        "\rProcessed %i object(s)." % n_deleted,
+                        ending="",
+                    )
+        if n_deleted and show_progress:
+            self.stdout.write()  # Add a newline after progress indicator.
+        return n_deleted
@@ -1,7 +1,22 @@
-import json
+import cProfile
+import glob
+import itertools
+import logging
+import os
+import pstats
+import re
+import threading
+import time
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+from astrosat.conf import app_settings
+from astrosat.utils import QueryTracker, json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
 
 
 class JSONDebugToolbarMiddleware:
@@ -27,9 +42,180 @@ class JSONDebugToolbarMiddleware:
             self.QUERY_PARAMETER in request.GET and
             self.JSON_CONTENT_TYPE == response["Content-Type"]
         ):
-            content = json.dumps(json.loads(response.content))
+            content = json_dumps(json_loads(response.content))
             response = HttpResponse(
                 f"<html><body><pre>{content}</pre></body></html>"
             )
 
         return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests w/ cProfile, w/out having to change any code.
+    A request is profiled if it is the Nth request handled by this process
+    (where N is ASTROSAT_PROFILING_SAMPLE_RATE) or if it has a 'profile' query
+    parameter (e.g. http://localhost/foo?profile) and ASTROSAT_PROFILING_CALLBACK
+    allows it.  Each profile is written to ASTROSAT_PROFILING_DIR as a ".prof"
+    file (or as callgrind output, if ASTROSAT_PROFILING_FORMAT is "callgrind"),
+    keeping only the most recent ASTROSAT_PROFILING_MAX_FILES.  Cumulative stats
+    are also aggregated per URL name and written to "<url_name>.aggregate.prof".
+    """
+
+    QUERY_PARAMETER = "profile"
+    AGGREGATE_SUFFIX = ".aggregate.prof"
+    FORMAT_EXTENSIONS = {
+        "pstats": ".prof",
+        "callgrind": ".callgrind",
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        self.sample_rate = app_settings.ASTROSAT_PROFILING_SAMPLE_RATE
+        self.profile_dir = app_settings.ASTROSAT_PROFILING_DIR
+        self.max_files = app_settings.ASTROSAT_PROFILING_MAX_FILES
+        self.format = app_settings.ASTROSAT_PROFILING_FORMAT
+        self.callback = import_string(app_settings.ASTROSAT_PROFILING_CALLBACK)
+
+        if self.format not in self.FORMAT_EXTENSIONS:
+            raise ImproperlyConfigured(
+                f"Invalid ASTROSAT_PROFILING_FORMAT: '{self.format}'."
+            )
+        if self.format == "callgrind":
+            try:
+                import pyprof2calltree  # noqa: F401
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "Writing callgrind profiles requires pyprof2calltree to be installed."
+                )
+
+        # (itertools.count is threadsafe in CPython)
+        self.request_counter = itertools.count(1)
+        self.aggregated_stats = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            # (failing to save a profile shouldn't replace the response or the view's exception)
+            try:
+                self.save_profile(request, profiler)
+            except Exception:
+                logger.exception("Error saving the profile of %s", request.path)
+
+        return response
+
+    def should_profile(self, request):
+        if self.sample_rate and next(self.request_counter) % self.sample_rate == 0:
+            return True
+        return self.QUERY_PARAMETER in request.GET and self.callback(request)
+
+    def get_url_name(self, request):
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.view_name if resolver_match else None
+        # make sure the name is safe to use as a filename...
+        return re.sub(r"[^\w.-]+", "_", url_name or "unresolved")
+
+    def save_profile(self, request, profiler):
+
+        url_name = self.get_url_name(request)
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+        # write this request's profile...
+        extension = self.FORMAT_EXTENSIONS[self.format]
+        profile_path = os.path.join(
+            self.profile_dir,
+            f"{url_name}.{time.time_ns()}.{threading.get_ident()}{extension}"
+        )
+        if self.format == "callgrind":
+            from pyprof2calltree import convert
+            convert(pstats.Stats(profiler), profile_path)
+        else:
+            profiler.dump_stats(profile_path)
+
+        with self.lock:
+            # aggregate this request's stats w/ previous ones for the same url...
+            stats = self.aggregated_stats.get(url_name)
+            if stats is None:
+                stats = self.aggregated_stats[url_name] = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+            stats.dump_stats(
+                os.path.join(self.profile_dir, url_name + self.AGGREGATE_SUFFIX)
+            )
+            self.rotate_profiles()
+
+        return profile_path
+
+    def rotate_profiles(self):
+        """
+        deletes all but the most recent `max_files` (non-aggregate) profiles
+        """
+        profile_paths = [
+            path for extension in self.FORMAT_EXTENSIONS.values()
+            for path in glob.glob(os.path.join(self.profile_dir, f"*{extension}"))
+            if not path.endswith(self.AGGREGATE_SUFFIX)
+        ]
+        if len(profile_paths) > self.max_files:
+            profile_paths.sort(key=os.path.getmtime)
+            for path in profile_paths[:len(profile_paths) - self.max_files]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class QueryTrackingMiddleware:
+    """
+    Tracks the SQL queries run by each request w/ astrosat.utils.QueryTracker.
+    Logs a warning if a request runs more than ASTROSAT_QUERY_COUNT_THRESHOLD
+    queries or if it looks like it has an N+1 problem.  If ASTROSAT_PROFILING_CALLBACK
+    allows it, the query count & total db time are added to the response headers.
+    """
+
+    QUERY_COUNT_HEADER = "X-Query-Count"
+    QUERY_TIME_HEADER = "X-Query-Time"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        self.query_count_threshold = app_settings.ASTROSAT_QUERY_COUNT_THRESHOLD
+        self.callback = import_string(app_settings.ASTROSAT_PROFILING_CALLBACK)
+
+    def __call__(self, request):
+
+        # (query params can contain personal data, so they aren't logged)
+        with QueryTracker(
+            path=None, name=request.path, include_params=False
+        ) as tracker:
+            response = self.get_response(request)
+
+        results = tracker.results
+        if results["n_plus_one_queries"] or (
+            self.query_count_threshold and
+            results["n_queries"] > self.query_count_threshold
+        ):
+            logger.warning(
+                "%s ran %d queries in %.3fs (%d suspected N+1 patterns, %d duplicate queries)",
+                request.path,
+                results["n_queries"],
+                results["total_time"],
+                len(results["n_plus_one_queries"]),
+                len(results["duplicate_queries"]),
+                extra={"query_results": results},
+            )
+
+        if self.callback(request):
+            response[self.QUERY_COUNT_HEADER] = results["n_queries"]
+            response[self.QUERY_TIME_HEADER] = f"{results['total_time']:.6f}"
+
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('astrosat', '0010_alter_databaselogtag_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaselogrecord',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1, help_text='The number of identical records that have been collapsed into this one.'),
+        ),
+    ]
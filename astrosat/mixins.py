@@ -1,55 +1,269 @@
+import copy
 import hashlib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_xxhash():
+    import xxhash
+    return xxhash.xxh3_128()
+
+
+# every algorithm produces 128-bit digests, so that they fit in a UUIDField
+HASH_ALGORITHMS = {
+    "md5": hashlib.md5,
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+    "xxhash": get_xxhash,
+}
+
+
+def iterate_hash_source_chunks(hash_source, chunk_size=HASH_CHUNK_SIZE):
+    """
+    yields the bytes of a hash source, which can be bytes, a file-like
+    object (read in chunks), or an iterable of bytes chunks
+    """
+    if isinstance(hash_source, (bytes, bytearray, memoryview)):
+        yield hash_source
+    elif hasattr(hash_source, "read"):
+        yield from iter(lambda: hash_source.read(chunk_size), b"")
+    else:
+        yield from hash_source
+
+
+class HashableQuerySet(models.QuerySet):
+    def compute_hashes(self, objs, workers=None):
+        """
+        Sets the hashes of some objects; if `workers` is provided, the hashes
+        are computed on a pool of that many threads (which helps w/ large
+        hash sources, since hashlib releases the GIL).  Any db connections
+        that a `hash_source` opens in a pool thread are closed afterwards.
+        """
+        def _compute_hash(obj):
+            return obj.compute_hash(obj.hash_source)
+
+        def _compute_hash_in_thread(obj):
+            try:
+                return _compute_hash(obj)
+            finally:
+                # (db connections are per-thread, so they'd otherwise be leaked)
+                connections.close_all()
+
+        if workers and workers > 1 and len(objs) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = list(executor.map(_compute_hash_in_thread, objs))
+        else:
+            hashes = [_compute_hash(obj) for obj in objs]
+        for obj, hash_value in zip(objs, hashes):
+            obj._hash = hash_value
+
+    def bulk_create(self, objs, *args, hash_workers=None, **kwargs):
+        # (HashableMixin.save isn't called by bulk_create)
+        objs = list(objs)
+        self.compute_hashes(objs, workers=hash_workers)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, hash_workers=None, **kwargs):
+        # (HashableMixin.save isn't called by bulk_update)
+        objs = list(objs)
+        self.compute_hashes(objs, workers=hash_workers)
+        fields = list(fields)
+        if "_hash" not in fields:
+            fields.append("_hash")
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def get_changed_hash_sources(self, hash_sources, field_name="pk"):
+        """
+        Takes a dictionary of (`field_name` values of) objects and their new hash
+        sources and returns the keys of the ones whose hashes differ from the
+        stored hashes (including objects that don't exist yet), using a single
+        query rather than loading any instances.
+        """
+        stored_hashes = dict(
+            self.filter(**{
+                f"{field_name}__in": list(hash_sources.keys())
+            }).values_list(field_name, "_hash")
+        )
+        return [
+            key for key, hash_source in hash_sources.items()
+            if stored_hashes.get(key) != self.model.compute_hash_uuid(hash_source)
+        ]
+
+
+HashableManager = models.Manager.from_queryset(HashableQuerySet)
 
 
 class HashableMixin(models.Model):
+    """
+    Stores a hash of `hash_source`, so that changes to it can be detected.
+    `hash_algorithm` can be any of HASH_ALGORITHMS ("xxhash" requires the
+    xxhash package); changing it will make existing hashes appear changed.
+    """
     class Meta:
         abstract = True
 
+    objects = HashableManager()
+
+    hash_algorithm = "md5"
+
     _hash = models.UUIDField(blank=True, null=True)
 
     @property
     def hash(self):
         if self._hash:
-            return self._hash.hex
+            return uuid.UUID(str(self._hash)).hex
 
     @property
     def hash_source(self):
         """
-        Returns a hashable object to create the hash from.
+        Returns a hashable object to create the hash from.  This can be bytes,
+        a file-like object, or an iterable of bytes chunks (so that large
+        sources don't have to be loaded into memory).
         """
         msg = "The 'hash_source' property must be implemted for a Hashable model."
         raise NotImplementedError(msg)
 
     @classmethod
     def compute_hash(cls, hash_source):
-        return hashlib.md5(hash_source).hexdigest()
+        """
+        Returns the hash of hash_source as a hex string.
+        """
+        hash_object = HASH_ALGORITHMS[cls.hash_algorithm]()
+        for chunk in iterate_hash_source_chunks(hash_source):
+            hash_object.update(chunk)
+        return hash_object.hexdigest()
+
+    @classmethod
+    def compute_hash_uuid(cls, hash_source):
+        """
+        Returns the hash of hash_source as a UUID (as it is stored).
+        """
+        return uuid.UUID(hex=cls.compute_hash(hash_source))
 
     def has_hash_source_changed(self, new_hash_source):
-        return self.hash != HashableMixin.compute_hash(new_hash_source)
+        return self.hash != self.compute_hash(new_hash_source)
 
     def save(self, *args, **kwargs):
-        self._hash = HashableMixin.compute_hash(self.hash_source)
+        self._hash = self.compute_hash(self.hash_source)
         return super().save(*args, **kwargs)
 
 
+SINGLETON_CACHE_KEY_PREFIX = "astrosat.singleton"
+
+# the process-local cache of singletons: {model label: (expiry time, instance)}
+SINGLETON_CACHE = {}
+
+
+def clear_singleton_caches():
+    """
+    Clears the (process-local) cache of every SingletonMixin model.
+    """
+    SINGLETON_CACHE.clear()
+
+
 class SingletonMixin(models.Model):
+    """
+    A model w/ only one instance (whose pk is 1).  Singletons are often read
+    on every request, so `load` caches them (see ASTROSAT_SINGLETON_CACHE_TIMEOUT
+    & ASTROSAT_SINGLETON_CACHE); the cache is cleared by astrosat.signals when
+    a singleton is saved or deleted.
+    """
     class Meta:
         abstract = True
 
     def clean(self):
-        if not self.id and self.__class__.objects.count() > 0:
+        if not self.pk and self.__class__.objects.exists():
             raise ValidationError("Only one instance of a Singleton is allowed")
 
     def save(self, *args, **kwargs):
-        if self.id or self.__class__.objects.count() == 0:
+        if self.pk is not None:
             # updating the existing instance
-            # or creating the one-and-only instance
-            super().save(*args, **kwargs)
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        manager = self.__class__._base_manager.db_manager(using)
+        if manager.exists():
+            # there is already an instance (which might not have pk=1, if it
+            # was created before singletons were always saved w/ pk=1)
+            return
+
+        # creating the one-and-only instance; the pk constraint stops a 2nd
+        # instance from being created concurrently
+        self.pk = 1
+        kwargs["force_insert"] = True
+        try:
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            self.pk = None
+            if not manager.filter(pk=1).exists():
+                # the error wasn't caused by an existing instance
+                raise
+
+    @classmethod
+    def get_cache_key(cls):
+        return f"{SINGLETON_CACHE_KEY_PREFIX}.{cls._meta.label_lower}"
+
+    @classmethod
+    def get_shared_cache(cls):
+        from django.core.cache import caches
+        from astrosat.conf import app_settings
+
+        if app_settings.ASTROSAT_SINGLETON_CACHE:
+            return caches[app_settings.ASTROSAT_SINGLETON_CACHE]
 
     @classmethod
-    def load(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
+    def get_cached(cls):
+        """
+        Returns (a copy of) the cached instance, or None if it isn't cached.
+        """
+        shared_cache = cls.get_shared_cache()
+        if shared_cache is not None:
+            return shared_cache.get(cls.get_cache_key())
+
+        expiry, obj = SINGLETON_CACHE.get(cls.get_cache_key(), (0, None))
+        if obj is not None and expiry > time.monotonic():
+            # (a copy, so that changes to one instance don't affect others)
+            return copy.copy(obj)
+
+    @classmethod
+    def set_cached(cls, obj):
+        from astrosat.conf import app_settings
+
+        timeout = app_settings.ASTROSAT_SINGLETON_CACHE_TIMEOUT
+        if not timeout:
+            return
+
+        shared_cache = cls.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(cls.get_cache_key(), obj, timeout)
+        else:
+            SINGLETON_CACHE[cls.get_cache_key()] = (
+                time.monotonic() + timeout, copy.copy(obj)
+            )
+
+    @classmethod
+    def clear_cache(cls):
+        SINGLETON_CACHE.pop(cls.get_cache_key(), None)
+        shared_cache = cls.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(cls.get_cache_key())
+
+    @classmethod
+    def load(cls, defaults=None):
+        """
+        Returns the instance, creating it (w/ any defaults) if needed.
+        """
+        obj = cls.get_cached()
+        if obj is None:
+            obj, _ = cls.objects.get_or_create(pk=1, defaults=defaults)
+            cls.set_cached(obj)
         return obj
@@ -62,6 +62,12 @@ class DatabaseLogRecord(models.Model):
     message = models.TextField()
     trace = models.TextField(blank=True, null=True)
     tags = models.ManyToManyField(DatabaseLogTag, related_name="records")
+    occurrences = models.PositiveIntegerField(
+        default=1,
+        help_text=_(
+            "The number of identical records that have been collapsed into this one."
+        ),
+    )
 
     def __str__(self):
         return self.message
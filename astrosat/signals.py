@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from astrosat.mixins import SingletonMixin
+
+
+def clear_singleton_cache(sender, **kwargs):
+    """
+    Stops SingletonMixin.load from returning a stale (cached) instance.
+    """
+    sender.clear_cache()
+
+
+def connect_singleton_signals():
+    """
+    Connects clear_singleton_cache to (only) the concrete SingletonMixin models;
+    a receiver w/out a sender would stop Django from "fast deleting" any model.
+    """
+    for model in apps.get_models():
+        if issubclass(model, SingletonMixin):
+            for signal in [post_save, post_delete]:
+                signal.connect(
+                    clear_singleton_cache,
+                    sender=model,
+                    dispatch_uid=f"clear_singleton_cache.{model._meta.label}",
+                )
+
+
+# (this module is imported by AstrosatConfig.ready, once every model is loaded)
+connect_singleton_signals()
@@ -1,8 +1,13 @@
 import pytest
 import factory
 import io
+import json
 import os
+import socketserver
+import threading
+import time
 from collections import namedtuple
+from contextlib import contextmanager
 from faker import Faker
 from functools import partial
 from itertools import combinations
@@ -13,7 +18,7 @@ from django.core.files.storage import get_storage_class
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 
-from astrosat.utils import DataClient
+from astrosat.utils import DataClient, QueryTracker
 from .factories import UserFactory
 
 fake = Faker()
@@ -162,3 +167,85 @@ def mock_storage(monkeypatch):
     monkeypatch.setattr(storage_class, "_save", _mock_save)
     monkeypatch.setattr(storage_class, "delete", _mock_delete)
     monkeypatch.setattr(storage_class, "exists", _mock_exists)
+
+
+class LogstashStandInServer(socketserver.ThreadingTCPServer):
+    """
+    A local TCP server that stands in for Logstash's TCP input plugin;
+    it just records every newline-delimited JSON document it receives.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                with self.server.lock:
+                    self.server.documents.append(json.loads(line))
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.documents = []
+        self.lock = threading.Lock()
+        super().__init__((host, port), self.RequestHandler)
+        self.host, self.port = self.server_address
+
+    def wait_for_documents(self, n_documents, timeout=5):
+        """
+        Waits (up to timeout seconds) until at least n_documents have been received.
+        """
+        end_time = time.monotonic() + timeout
+        while time.monotonic() < end_time:
+            with self.lock:
+                if len(self.documents) >= n_documents:
+                    break
+            time.sleep(0.01)
+        with self.lock:
+            return list(self.documents)
+
+
+@pytest.fixture
+def mock_logstash_server():
+    """
+    Runs a LogstashStandInServer in a background thread for the duration of a test.
+    """
+    server = LogstashStandInServer()
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Returns a context manager that asserts the code it wraps runs at most
+    `max_queries` queries and (unless `allow_n_plus_one` is set) has no
+    suspected N+1 patterns:
+
+    >>> def test_something(query_budget):
+    ...     with query_budget(3):
+    ...         do_something()
+    """
+    @contextmanager
+    def _query_budget(max_queries, allow_n_plus_one=False, **kwargs):
+        with QueryTracker(path=None, **kwargs) as tracker:
+            yield tracker
+
+        queries = "\n".join(query["sql"] for query in tracker.queries)
+        assert tracker.n_queries <= max_queries, (
+            f"Expected at most {max_queries} queries but {tracker.n_queries} were run:\n{queries}"
+        )
+
+        n_plus_one_queries = "\n".join(
+            f"{query['count']} x {query['sql']}"
+            for query in tracker.results["n_plus_one_queries"]
+        )
+        assert allow_n_plus_one or not n_plus_one_queries, (
+            f"Suspected N+1 queries:\n{n_plus_one_queries}"
+        )
+
+    return _query_budget
@@ -1,7 +1,12 @@
 from django.urls import include, path
 
 from .routers import SlashlessSimpleRouter
-from .views import DatabaseLogRecordViewSet, create_log_records, ProxyS3View
+from .views import (
+    DatabaseLogRecordViewSet,
+    create_log_records,
+    metrics_view,
+    ProxyS3View,
+)
 
 ##############
 # API routes #
@@ -19,4 +24,6 @@ api_urlpatterns = [
 # normal routes #
 #################
 
-urlpatterns = []
+urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
+]
@@ -1,19 +1,44 @@
 # order is important; dynamic_settings must be loaded first,
 # in case any of the other modules rely on app_settings
 from .utils_dynamic_settings import DynamicSetting, DynamicAppSettings
+from .utils_metrics import metrics_registry, MetricsRegistry
 
 from .utils_data_client import DataClient
 from .utils_db import CONDITIONAL_CASCADE, bulk_update_or_create
-from .utils_gis import adapt_geojson_to_django
+from .utils_gis import (
+    adapt_geojson_to_django,
+    build_geos_geometry,
+    iterate_geojson_features,
+    iterate_geojson_properties,
+    get_geojson_property_names,
+    get_geojson_property_types,
+)
 from .utils_iterators import grouper, partition
+from .utils_json import get_json_codec, json_loads, json_dumps, json_dumpb
 from .utils_logging import (
     RestrictLogsByNameFilter,
     DatabaseLogHandler,
     format_elasticsearch_timestamp,
     ElasticsearchDocumentLogFormatter,
     AstrosatAppTCPLogstashLogHandler,
+    LOG_RECORD_EXPORT_CHUNK_SIZE,
+    LOG_RECORD_EXPORT_FIELDS,
+    get_log_record_message_columns,
+    get_log_record_message_types,
+    iterate_log_record_chunks,
+    iterate_log_record_rows,
+    iterate_log_record_csv_rows,
+    write_log_records_parquet,
+)
+from .utils_profile import (
+    show_toolbar,
+    can_profile,
+    profile,
+    track_memory,
+    record_profile_results,
+    SamplingProfiler,
+    QueryTracker,
 )
-from .utils_profile import show_toolbar, profile, track_memory
 from .utils_serializers import ExcludableJSONSerializer
 from .utils_utils import flatten_dictionary
 from .utils_validators import (
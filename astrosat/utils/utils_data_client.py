@@ -9,6 +9,19 @@ from django.core.exceptions import ImproperlyConfigured
 
 from astrosat.conf import app_settings
 
+from .utils_metrics import metrics_registry
+
+DATA_CLIENT_REQUEST_SECONDS_METRIC = metrics_registry.histogram(
+    "astrosat_data_client_request_seconds",
+    "The time taken by DataClient to request an object from S3.",
+    ["operation"],
+)
+DATA_CLIENT_BYTES_METRIC = metrics_registry.counter(
+    "astrosat_data_client_bytes_total",
+    "The number of bytes of objects DataClient has retrieved from S3.",
+    ["operation"],
+)
+
 BucketObjectTuple = namedtuple("BucketObjectTuple", ["stream", "metadata"])
 
 
@@ -94,8 +107,14 @@ class DataClient:
         """
         if key is not None:
             try:
-                obj = self.client.get_object(Bucket=self.bucket, Key=key)
+                with DATA_CLIENT_REQUEST_SECONDS_METRIC.time(
+                    operation="get_object"
+                ):
+                    obj = self.client.get_object(Bucket=self.bucket, Key=key)
                 if obj:
+                    DATA_CLIENT_BYTES_METRIC.inc(
+                        obj.get("ContentLength", 0), operation="get_object"
+                    )
                     return obj.get("Body")
             except ClientError as e:
                 # if the key is wrong, don't return anthing...
@@ -154,9 +173,12 @@ class DataClient:
         Returns a file-like object from the bucket
         """
 
-        obj = self.get_first_matching_object(pattern, metadata_only=False)
-        if obj:
-            return BytesIO(obj.stream.read())
+        with DATA_CLIENT_REQUEST_SECONDS_METRIC.time(operation="get_data"):
+            obj = self.get_first_matching_object(pattern, metadata_only=False)
+            data = obj.stream.read() if obj else None
+        if data is not None:
+            DATA_CLIENT_BYTES_METRIC.inc(len(data), operation="get_data")
+            return BytesIO(data)
 
     def get_object_url(self, pattern):
         """
@@ -1,5 +1,15 @@
+from django.db import connections
 from django.db.models import CASCADE
 
+from .utils_iterators import grouper
+from .utils_metrics import metrics_registry
+
+BULK_UPSERT_ROWS_METRIC = metrics_registry.counter(
+    "astrosat_bulk_upsert_rows_total",
+    "The number of rows created or updated by bulk_update_or_create.",
+    ["model", "operation"],
+)
+
 
 def CONDITIONAL_CASCADE(collector, field, sub_objs, using, **kwargs):
     """
@@ -30,9 +40,12 @@ def CONDITIONAL_CASCADE(collector, field, sub_objs, using, **kwargs):
     collector.add_field_update(field, default_value, sub_objs_to_set)
 
 
-def bulk_update_or_create(model_class, model_data, comparator_fn=None):
+def bulk_update_or_create(
+    model_class, model_data, comparator_fn=None, using=None
+):
     """
-    Performs update_or_create in bulk (w/ only 3 db hits)
+    Performs update_or_create in bulk (w/ only 3 db hits, plus 1 for every
+    extra batch of existing objects that needs to be looked up)
     Parameters
     ----------
     model_class : django.db.models.Model
@@ -41,14 +54,16 @@ def bulk_update_or_create(model_class, model_data, comparator_fn=None):
         data to update/create.  Example: [{'field1': 'value', 'field2': 'value'}, ...]
     comparator_fn: function
         a function that compares a model instance w/ model data to determine if it needs to be updated
+    using: str
+        the database to use (if unprovided the default router is used)
     Returns
     -------
     tuple
         the number of objects created & updated
     """
 
-    # get all instances of the model...
-    existing_objects = list(model_class.objects.all())
+    manager = model_class.objects.db_manager(using)
+    model_data = list(model_data)
 
     # get all the fields that uniquely identify a model object...
     # TODO: deal w/ unique_together fields
@@ -56,6 +71,30 @@ def bulk_update_or_create(model_class, model_data, comparator_fn=None):
         field.name for field in model_class._meta.get_fields()
         if field.concrete and not field.primary_key and field.unique
     ]
+
+    # get the instances of the model that might match model_data...
+    # (rather than the whole table, which is slow for large tables); this is
+    # done in batches so that no query exceeds the db's parameter limit, and
+    # the objects are indexed by their unique values (so finding a match is fast)
+    batch_size = connections[manager.db].ops.bulk_batch_size(
+        unique_field_names, model_data
+    ) or 1
+    existing_objects = {}
+    for batch in grouper(model_data, batch_size):
+        batch = [data_record for data_record in batch if data_record is not None]
+        existing_objects.update({
+            tuple(getattr(obj, field_name) for field_name in unique_field_names):
+            obj
+            for obj in manager.filter(
+                **{
+                    # raises a KeyError if data doesn't include unique_fields
+                    f"{field_name}__in": [
+                        data_record[field_name] for data_record in batch
+                    ]
+                    for field_name in unique_field_names
+                }
+            )
+        })
     all_data_record_field_names = set()
 
     objects_to_create = []
@@ -67,25 +106,16 @@ def bulk_update_or_create(model_class, model_data, comparator_fn=None):
         # extract the fields that can uniquely identify an object,
         # and check if there is an existing object w/ those values,
         # if so (and if the comparator_fn fails) update that object w/ the field values and store it to be UPDATED,
-        # then remove it from the list of existing objects (so the next time around the check is faster),
+        # then remove it from the existing objects (so it is only matched once),
         # if not store it to be CREATED
 
         all_data_record_field_names.update(data_record.keys())
-        unique_data_record_fields = {
+        unique_data_record_values = tuple(
             # raises a KeyError if data doesn't include unique_fields
-            field_name: data_record[field_name]
-            for field_name in unique_field_names
-        }
-
-        matching_object = next(
-            (
-                obj for obj in existing_objects if all([
-                    getattr(obj, k) == v for k,
-                    v in unique_data_record_fields.items()
-                ])
-            ),
-            None,
+            data_record[field_name] for field_name in unique_field_names
         )
+
+        matching_object = existing_objects.pop(unique_data_record_values, None)
         if matching_object:
             if comparator_fn is None or not comparator_fn(
                 matching_object, data_record
@@ -93,15 +123,20 @@ def bulk_update_or_create(model_class, model_data, comparator_fn=None):
                 for k, v in data_record.items():
                     setattr(matching_object, k, v() if callable(v) else v)
                 objects_to_update.append(matching_object)
-            existing_objects.remove(matching_object)
         else:
             objects_to_create.append(model_class(**data_record))
 
     all_data_record_field_names.remove(*unique_field_names)
 
-    model_class.objects.bulk_create(objects_to_create)
-    model_class.objects.bulk_update(
-        objects_to_update, all_data_record_field_names
+    manager.bulk_create(objects_to_create)
+    manager.bulk_update(objects_to_update, all_data_record_field_names)
+
+    model_label = model_class._meta.label
+    BULK_UPSERT_ROWS_METRIC.inc(
+        len(objects_to_create), model=model_label, operation="created"
+    )
+    BULK_UPSERT_ROWS_METRIC.inc(
+        len(objects_to_update), model=model_label, operation="updated"
     )
 
     # returns a tuple of created objects & updated objects
@@ -5,6 +5,14 @@ from django.conf import LazySettings
 from django.core.exceptions import AppRegistryNotReady, ImproperlyConfigured
 from django.utils.functional import LazyObject, empty
 
+from .utils_metrics import metrics_registry
+
+DYNAMIC_SETTING_READS_METRIC = metrics_registry.counter(
+    "astrosat_dynamic_setting_reads_total",
+    "The number of times a DynamicSetting has been read (from the cache or the db).",
+    ["source", "cache"],
+)
+
 
 class DynamicSetting(object):
     """
@@ -30,14 +38,18 @@ class DynamicSetting(object):
         app_name, model_name, attr_name = self.source.split(".")
         try:
             model = apps.get_model(app_label=app_name, model_name=model_name)
-            # model is a SingletonMixin, so pk will always equal 1
-            instance, created = model.objects.get_or_create(pk=1)
-            attr = getattr(instance, attr_name)
-            if created and attr != self.default_value:
-                attr = self.default_value
-                setattr(instance, attr_name, attr)
-                instance.save()
-            return attr
+            # model is a SingletonMixin, so it can be loaded from its cache
+            # (or else created w/ the default value)
+            instance = model.get_cached()
+            DYNAMIC_SETTING_READS_METRIC.inc(
+                source=self.source,
+                cache="miss" if instance is None else "hit",
+            )
+            if instance is None:
+                instance = model.load(
+                    defaults={attr_name: self.default_value}
+                )
+            return getattr(instance, attr_name)
         except AppRegistryNotReady:
             return self.default_value
 
@@ -1,16 +1,223 @@
 import json
+import struct
+from itertools import chain
 
-from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+
+# (GeoJSON coordinates are always WGS84)
+GEOJSON_SRID = 4326
+
+WKB_GEOMETRY_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+
+MULTI_GEOMETRY_PART_TYPES = {
+    "MultiPoint": "Point",
+    "MultiLineString": "LineString",
+    "MultiPolygon": "Polygon",
+}
+
+
+def get_n_dimensions(coordinates):
+    """
+    returns the number of dimensions of (nested) GeoJSON coordinates; raises a
+    ValueError if their positions have different numbers of dimensions
+    """
+    if not isinstance(coordinates[0], (list, tuple)):
+        return len(coordinates)
+    if not isinstance(coordinates[0][0], (list, tuple)):
+        n_dimensions = set(map(len, coordinates))
+    else:
+        n_dimensions = set(map(get_n_dimensions, coordinates))
+    if len(n_dimensions) != 1:
+        raise ValueError("Mixed numbers of dimensions.")
+    return n_dimensions.pop()
+
+
+def get_geometry_n_dimensions(geometry):
+    if geometry["type"] == "GeometryCollection":
+        n_dimensions = set(map(get_geometry_n_dimensions, geometry["geometries"]))
+        if len(n_dimensions) != 1:
+            raise ValueError("Mixed numbers of dimensions.")
+        return n_dimensions.pop()
+    return get_n_dimensions(geometry["coordinates"])
+
+
+def pack_coordinates(coordinates, n_dimensions):
+    return struct.pack(
+        f"<I{len(coordinates) * n_dimensions}d",
+        len(coordinates),
+        *chain.from_iterable(coordinates),
+    )
+
+
+def pack_geometry(geometry, n_dimensions):
+    geometry_type = geometry["type"]
+    wkb_type = WKB_GEOMETRY_TYPES[geometry_type]
+    if n_dimensions == 3:
+        wkb_type += 1000
+    header = struct.pack("<BI", 1, wkb_type)
+
+    if geometry_type == "GeometryCollection":
+        parts = geometry["geometries"]
+        return header + struct.pack("<I", len(parts)) + b"".join(
+            pack_geometry(part, n_dimensions) for part in parts
+        )
+
+    coordinates = geometry["coordinates"]
+    if geometry_type == "Point":
+        return header + struct.pack(f"<{n_dimensions}d", *coordinates)
+    elif geometry_type == "LineString":
+        return header + pack_coordinates(coordinates, n_dimensions)
+    elif geometry_type == "Polygon":
+        return header + struct.pack("<I", len(coordinates)) + b"".join(
+            pack_coordinates(ring, n_dimensions) for ring in coordinates
+        )
+    part_type = MULTI_GEOMETRY_PART_TYPES[geometry_type]
+    return header + struct.pack("<I", len(coordinates)) + b"".join(
+        pack_geometry(
+            {"type": part_type, "coordinates": part_coordinates}, n_dimensions
+        ) for part_coordinates in coordinates
+    )
+
+
+def get_geojson_wkb(geometry):
+    """
+    Encodes a GeoJSON geometry (as a python dictionary) as (little-endian, ISO)
+    WKB directly from its coordinates.  Raises an exception for geometries that
+    can't be encoded this way (like empty ones, or ones whose positions have
+    different numbers of dimensions).
+    """
+    n_dimensions = get_geometry_n_dimensions(geometry)
+    if n_dimensions not in (2, 3):
+        raise ValueError(f"Invalid number of dimensions: {n_dimensions}.")
+    return pack_geometry(geometry, n_dimensions)
+
+
+def build_geos_geometry(geometry):
+    """
+    Builds a GEOSGeometry from a GeoJSON geometry (as a python dictionary).
+    Rather than serializing the geometry back to JSON for GDAL to parse, this
+    encodes its coordinates as WKB which GEOS parses in a single call.  Anything
+    that can't be encoded (empty geometries, those w/ a "crs", etc.) falls back
+    to being parsed as JSON.
+    """
+    if geometry is None:
+        return None
+    if "crs" not in geometry:
+        try:
+            return GEOSGeometry(
+                memoryview(get_geojson_wkb(geometry)), srid=GEOJSON_SRID
+            )
+        except (
+            GEOSException, IndexError, KeyError, TypeError, ValueError,
+            struct.error
+        ):
+            pass
+    return GEOSGeometry(json.dumps(geometry))
 
 
 def adapt_geojson_to_django(geojson, geometry_field_name="geometry"):
     """
     You cannot deserialize raw GeoJSON to GeoDjango.
     So this fn takes raw GeoJSON and turns it into something that _can_ be serialized.
+    `geojson` can be a FeatureCollection or an iterable of features (such as
+    the ones streamed by `iterate_geojson_features`).
     """
-    for feature in geojson["features"]:
+    features = geojson["features"] if isinstance(geojson, dict) else geojson
+    for feature in features:
         fields = feature["properties"]
         fields.update({
-            geometry_field_name: GEOSGeometry(json.dumps(feature["geometry"]))
+            geometry_field_name: build_geos_geometry(feature["geometry"])
         })
         yield fields
+
+
+GEOJSON_FEATURE_PREFIX = "features.item"
+GEOJSON_PROPERTIES_PREFIX = "features.item.properties"
+
+
+def iterate_geojson_features(fp, property_names=None, include_geometry=True):
+    """
+    Yields the features of a GeoJSON FeatureCollection one at a time, so that
+    large files don't have to be loaded into memory.  If `property_names` is
+    provided, only those properties are built; if `include_geometry` is False,
+    geometries aren't built either.  Requires ijson.
+    """
+    import ijson
+    from ijson.common import ObjectBuilder
+
+    if property_names is None and include_geometry:
+        # (building whole features is fastest)
+        yield from ijson.items(fp, GEOJSON_FEATURE_PREFIX, use_float=True)
+        return
+
+    feature = value_name = value_builder = None
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if prefix in (GEOJSON_FEATURE_PREFIX, GEOJSON_PROPERTIES_PREFIX
+                     ) and event in ("map_key", "end_map"):
+            # the value being built (if any) has finished...
+            if value_builder is not None:
+                if prefix == GEOJSON_FEATURE_PREFIX:
+                    feature[value_name] = value_builder.value
+                else:
+                    feature["properties"][value_name] = value_builder.value
+                value_builder = None
+            # ...and maybe another value should be built
+            if prefix == GEOJSON_FEATURE_PREFIX:
+                if event == "map_key" and value == "geometry" and include_geometry:
+                    value_name, value_builder = value, ObjectBuilder()
+                elif event == "end_map":
+                    yield feature
+            elif event == "map_key" and (
+                property_names is None or value in property_names
+            ):
+                value_name, value_builder = value, ObjectBuilder()
+        elif prefix == GEOJSON_FEATURE_PREFIX and event == "start_map":
+            feature = {"type": "Feature", "properties": {}, "geometry": None}
+        elif value_builder is not None:
+            value_builder.event(event, value)
+
+
+def iterate_geojson_properties(fp, property_names=None):
+    """
+    Yields the properties of each feature of a GeoJSON FeatureCollection one at a
+    time, w/out building any geometries.  Requires ijson.
+    """
+    for feature in iterate_geojson_features(
+        fp, property_names=property_names, include_geometry=False
+    ):
+        yield feature["properties"]
+
+
+def get_geojson_property_names(fp):
+    """
+    Returns the names of all properties used by any feature of a GeoJSON
+    FeatureCollection (in the order they 1st appear).  Requires ijson.
+    """
+    import ijson
+
+    property_names = {}
+    for prefix, event, value in ijson.parse(fp):
+        if prefix == GEOJSON_PROPERTIES_PREFIX and event == "map_key":
+            property_names[value] = None
+    return list(property_names)
+
+
+def get_geojson_property_types(fp, property_names=None):
+    """
+    Returns a dictionary of the names of the properties used by any feature of a
+    GeoJSON FeatureCollection (in the order they 1st appear) and the set of
+    python types of their values.  Requires ijson.
+    """
+    property_types = {}
+    for properties in iterate_geojson_properties(fp, property_names):
+        for property_name, value in properties.items():
+            property_types.setdefault(property_name, set()).add(type(value))
+    return property_types
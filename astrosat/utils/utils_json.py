@@ -0,0 +1,117 @@
+import functools
+import importlib
+import json
+
+try:
+    import orjson
+    has_orjson = True
+except ImportError:
+    has_orjson = False
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+class StdlibJSONCodec:
+    """
+    Encodes/decodes JSON using the standard library.
+    """
+
+    name = "json"
+
+    def loads(self, value):
+        return json.loads(value)
+
+    def dumps(self, value, default=None):
+        return json.dumps(value, default=default)
+
+    def dumpb(self, value, default=None):
+        return self.dumps(value, default=default).encode("utf-8")
+
+
+class OrjsonJSONCodec:
+    """
+    Encodes/decodes JSON using orjson, which is much faster than the standard library.
+    Note that its output is compact (it doesn't add whitespace after separators).
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if not has_orjson:
+            raise ImproperlyConfigured(
+                "The 'orjson' JSON codec requires orjson to be installed."
+            )
+
+    def loads(self, value):
+        return orjson.loads(value)
+
+    def dumps(self, value, default=None):
+        return self.dumpb(value, default=default).decode("utf-8")
+
+    def dumpb(self, value, default=None):
+        return orjson.dumps(value, default=default)
+
+
+JSON_CODECS = {
+    StdlibJSONCodec.name: StdlibJSONCodec,
+    OrjsonJSONCodec.name: OrjsonJSONCodec,
+}
+
+
+def get_json_codec(name=None):
+    """
+    Returns the JSON codec used by astrosat.  This is determined by the
+    ASTROSAT_JSON_CODEC setting which can be "auto" (use orjson if it is
+    installed, otherwise use the standard library), "orjson", "json", or
+    the dotted path of a custom codec class (which provides `loads`, `dumps`
+    & `dumpb` methods).
+    """
+    if name is None:
+        # (the setting is read every time, so that changes to it take effect)
+        from astrosat.conf import app_settings
+        name = app_settings.ASTROSAT_JSON_CODEC
+
+    return get_json_codec_by_name(name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_json_codec_by_name(name):
+    """
+    Returns the (cached) instance of a JSON codec.
+    """
+    if name == "auto":
+        name = OrjsonJSONCodec.name if has_orjson else StdlibJSONCodec.name
+
+    if name in JSON_CODECS:
+        codec_class = JSON_CODECS[name]
+    else:
+        try:
+            module_name, class_name = name.rsplit(".", 1)
+            codec_class = getattr(
+                importlib.import_module(module_name), class_name
+            )
+        except (ValueError, ImportError, AttributeError):
+            raise ImproperlyConfigured(f"Invalid JSON codec: '{name}'.")
+
+    return codec_class()
+
+
+def json_loads(value):
+    """
+    Decodes a JSON string (or bytes) using the configured codec.
+    """
+    return get_json_codec().loads(value)
+
+
+def json_dumps(value, default=None):
+    """
+    Encodes a value as a JSON string using the configured codec.
+    """
+    return get_json_codec().dumps(value, default=default)
+
+
+def json_dumpb(value, default=None):
+    """
+    Encodes a value as (utf-8) JSON bytes using the configured codec.
+    """
+    return get_json_codec().dumpb(value, default=default)
@@ -1,70 +1,252 @@
 import logging
+import queue
+import random
 import re
+import threading
+import time
 import uuid
 import json
+import weakref
+from collections import defaultdict
 from logstash.handler_tcp import TCPLogstashHandler
 from logstash.formatter import LogstashFormatterBase
 
+from django.db.models import F, prefetch_related_objects
+
 from astrosat.conf import app_settings as astrosat_settings
 
+from .utils_iterators import grouper
+from .utils_json import get_json_codec, json_dumps, json_loads
+from .utils_metrics import metrics_registry
+from .utils_utils import flatten_dictionary
+
 
 class RestrictLogsByNameFilter(logging.Filter):
     """
     Lets me selectively choose which modules are allowed to generate log records.
     Wrote this code b/c geopandas went a bit crazy with output.
-    To use just subclass and set names_to_restrict and level_to_allow
+    To use just subclass and set names_to_restrict and level_to_allow,
+    or set restrictions to a list of (names_to_restrict, level_to_allow) pairs
+    to restrict different modules to different levels (the first matching pattern wins).
+    These can also be passed as kwargs (as when configuring the filter via dictConfig).
+
+    The set of logger names is small, so the level allowed for each name is cached;
+    that way restricted (or unrestricted) records only cost a dictionary lookup.
     """
 
     names_to_restrict = None
     level_to_allow = logging.NOTSET
+    restrictions = None
+
+    # the cache is cleared if it ever grows larger than this
+    max_cache_size = 1024
 
-    def __init__(self, *args, **kwargs):
-        if not (self.names_to_restrict and self.level_to_allow):
-            raise NotImplementedError(
-                f"{self} requires 'names_to_restrict' and 'level_to_allow' to be set"
-            )
-        self.names_to_restrict = re.compile(self.names_to_restrict)
+    def __init__(
+        self,
+        *args,
+        names_to_restrict=None,
+        level_to_allow=None,
+        restrictions=None,
+        **kwargs
+    ):
         super().__init__(*args, **kwargs)
+        self.configure(
+            names_to_restrict=names_to_restrict,
+            level_to_allow=level_to_allow,
+            restrictions=restrictions,
+        )
+
+    def configure(
+        self, names_to_restrict=None, level_to_allow=None, restrictions=None
+    ):
+        """
+        (Re)compiles the restrictions and clears the cache.
+        """
+        if names_to_restrict is not None:
+            self.names_to_restrict = names_to_restrict
+        if level_to_allow is not None:
+            self.level_to_allow = level_to_allow
+        if restrictions is not None:
+            self.restrictions = restrictions
+
+        restrictions = self.restrictions
+        if not restrictions:
+            if not (self.names_to_restrict and self.level_to_allow):
+                raise NotImplementedError(
+                    f"{self} requires 'names_to_restrict' and 'level_to_allow' (or 'restrictions') to be set"
+                )
+            restrictions = [(self.names_to_restrict, self.level_to_allow)]
+
+        self.compiled_restrictions = [(
+            re.compile(names),
+            level if isinstance(level, int) else logging.getLevelName(level),
+        ) for names, level in restrictions]
+        self.cache = {}
+
+    def get_level_to_allow(self, name):
+        for names, level in self.compiled_restrictions:
+            if names.match(name):
+                return level
+        return logging.NOTSET
 
     def filter(self, record):
-        if self.names_to_restrict.match(record.name):
-            return record.levelno >= self.level_to_allow
-        return True
+        try:
+            level = self.cache[record.name]
+        except KeyError:
+            level = self.get_level_to_allow(record.name)
+            if len(self.cache) >= self.max_cache_size:
+                self.cache.clear()
+            self.cache[record.name] = level
+        return record.levelno >= level
+
+
+DB_LOG_RECORDS_METRIC = metrics_registry.counter(
+    "astrosat_db_log_records_total",
+    "The number of log records handled by DatabaseLogHandler.",
+    ["outcome"],
+)
+DB_LOG_WRITE_SECONDS_METRIC = metrics_registry.histogram(
+    "astrosat_db_log_write_seconds",
+    "The time taken by DatabaseLogHandler to write a log record to the db.",
+)
 
 
 class DatabaseLogHandler(logging.Handler):
     """
     sends a logging record to the db
+
+    To protect the db from bursts of records, the handler can optionally:
+    - sample records by tag: "sampling_rates" is a dict of tag names to the fraction
+      of records w/ that tag to keep (if a record has several sampled tags the highest
+      rate is used; records w/out any sampled tags use "default_sampling_rate")
+    - deduplicate records: if "deduplication_window" (in seconds) is set, identical
+      records (w/ the same logger name, level, message template & tags) emitted w/in
+      that window of the first one are collapsed into a single db row whose
+      "occurrences" is incremented
     """
 
     default_formatter = logging.Formatter()
 
+    # the number of distinct records remembered for deduplication
+    max_deduplication_keys = 1024
+
+    def __init__(
+        self,
+        level=logging.NOTSET,
+        sampling_rates=None,
+        default_sampling_rate=1.0,
+        deduplication_window=None,
+    ):
+        super().__init__(level=level)
+        self.sampling_rates = sampling_rates or {}
+        self.default_sampling_rate = default_sampling_rate
+        self.deduplication_window = deduplication_window
+        self.deduplication_records = {}
+
+    def is_sampled(self, record):
+        """
+        Returns True if the record should be kept, according to the sampling rates.
+        """
+        tag_rates = [
+            self.sampling_rates[tag_name]
+            for tag_name in getattr(record, "tags", []) or []
+            if tag_name in self.sampling_rates
+        ]
+        rate = max(tag_rates) if tag_rates else self.default_sampling_rate
+        return rate >= 1 or random.random() < rate
+
+    def get_deduplication_key(self, record):
+        return (
+            record.name,
+            record.levelno,
+            str(record.msg),
+            tuple(sorted(getattr(record, "tags", []) or [])),
+        )
+
+    def deduplicate(self, record):
+        """
+        If an identical record was saved w/in the deduplication window, increments
+        its occurrences and returns True; otherwise returns False.
+        """
+        from astrosat.models import DatabaseLogRecord
+
+        key = self.get_deduplication_key(record)
+        db_record_pk, first_created = self.deduplication_records.get(
+            key, (None, None)
+        )
+        if (
+            db_record_pk is not None and
+            record.created - first_created < self.deduplication_window
+        ):
+            # (the row might have been deleted in the meantime)
+            return DatabaseLogRecord.objects.filter(pk=db_record_pk).update(
+                occurrences=F("occurrences") + 1
+            ) > 0
+        return False
+
+    def remember(self, record, db_record):
+        """
+        Remembers a saved record so that subsequent identical records can be deduplicated.
+        """
+        if len(self.deduplication_records) >= self.max_deduplication_keys:
+            # forget any records whose window has expired...
+            self.deduplication_records = {
+                key: value
+                for key, value in self.deduplication_records.items()
+                if record.created - value[1] < self.deduplication_window
+            }
+            if len(self.deduplication_records) >= self.max_deduplication_keys:
+                # ...and if that wasn't enough, forget everything
+                self.deduplication_records = {}
+        self.deduplication_records[self.get_deduplication_key(record)] = (
+            db_record.pk, record.created
+        )
+
     def emit(self, record):
+        if not self.is_sampled(record):
+            DB_LOG_RECORDS_METRIC.inc(outcome="sampled_out")
+            return
+
         if astrosat_settings.ASTROSAT_ENABLE_DB_LOGGING:
+            with DB_LOG_WRITE_SECONDS_METRIC.time():
+                outcome = self.write(record)
+            DB_LOG_RECORDS_METRIC.inc(outcome=outcome)
+
+    def write(self, record):
+        """
+        Writes a record to the db; returns whether it was "created" or "deduplicated".
+        """
+        from astrosat.models import DatabaseLogRecord, DatabaseLogTag
 
-            from astrosat.models import DatabaseLogRecord, DatabaseLogTag
+        if self.deduplication_window and self.deduplicate(record):
+            return "deduplicated"
 
-            trace = None
-            if record.exc_info:
-                trace = self.default_formatter.formatException(record.exc_info)
+        trace = None
+        if record.exc_info:
+            trace = self.default_formatter.formatException(record.exc_info)
 
-            tags = map(
-                lambda x: x[0],
-                [
-                    DatabaseLogTag.objects.get_or_create(name=tag_name)
-                    for tag_name in getattr(record, "tags", []) or []
-                ],
-            )
+        tags = map(
+            lambda x: x[0],
+            [
+                DatabaseLogTag.objects.get_or_create(name=tag_name)
+                for tag_name in getattr(record, "tags", []) or []
+            ],
+        )
 
-            id = getattr(record, 'uuid', uuid.uuid4())
-            db_record = DatabaseLogRecord.objects.create(
-                logger_name=record.name,
-                level=record.levelno,
-                message=record.getMessage(),
-                uuid=id,
-                trace=trace,
-            )
-            db_record.tags.add(*tags)
+        id = getattr(record, 'uuid', uuid.uuid4())
+        db_record = DatabaseLogRecord.objects.create(
+            logger_name=record.name,
+            level=record.levelno,
+            message=record.getMessage(),
+            uuid=id,
+            trace=trace,
+        )
+        db_record.tags.add(*tags)
+
+        if self.deduplication_window:
+            self.remember(record, db_record)
+
+        return "created"
 
 
 def format_elasticsearch_timestamp(time):
@@ -79,12 +261,16 @@ class ElasticsearchDocumentLogFormatter(LogstashFormatterBase):
     Based on LogstashFormatterBase/Version1 from python-logstash
     https://github.com/vklochan/python-logstash/blob/master/logstash/formatter.py
     """
-    def __init__(self, constant_fields=dict()):
+    def __init__(self, constant_fields=dict(), json_codec=None):
         self.constant_fields = constant_fields
+        # if no codec is provided, the one configured by ASTROSAT_JSON_CODEC is used
+        self.json_codec = json_codec
 
     def format(self, record):
 
-        record_fields = json.loads(record.getMessage())
+        json_codec = self.json_codec or get_json_codec()
+
+        record_fields = json_codec.loads(record.getMessage())
 
         meta_fields = {
             "@timestamp": format_elasticsearch_timestamp(record.created),
@@ -96,7 +282,34 @@ class ElasticsearchDocumentLogFormatter(LogstashFormatterBase):
             **record_fields, **self.constant_fields, **meta_fields
         }
 
-        return self.serialize(logstash_message)
+        # (like LogstashFormatterBase.serialize, unserializable values are strings)
+        return json_codec.dumpb(logstash_message, default=str)
+
+
+# (a reference to every AstrosatAppTCPLogstashLogHandler, for the metrics below)
+LOGSTASH_HANDLERS = weakref.WeakSet()
+
+
+def get_logstash_stat(stat_name):
+    return sum(handler.stats[stat_name] for handler in list(LOGSTASH_HANDLERS))
+
+
+LOGSTASH_QUEUE_DEPTH_METRIC = metrics_registry.gauge(
+    "astrosat_logstash_queue_depth",
+    "The number of documents waiting to be sent to Logstash.",
+    callback=lambda: get_logstash_stat("queued"),
+)
+LOGSTASH_DOCUMENTS_METRIC = metrics_registry.counter(
+    "astrosat_logstash_documents_total",
+    "The number of documents sent (or not) to Logstash.",
+    ["outcome"],
+    callback=lambda: [({"outcome": outcome}, get_logstash_stat(outcome))
+                      for outcome in ["sent", "dropped", "overflowed"]],
+)
+LOGSTASH_SEND_BATCH_SECONDS_METRIC = metrics_registry.histogram(
+    "astrosat_logstash_send_batch_seconds",
+    "The time taken to send (or fail to send) a batch of documents to Logstash.",
+)
 
 
 class AstrosatAppTCPLogstashLogHandler(TCPLogstashHandler):
@@ -104,9 +317,29 @@ class AstrosatAppTCPLogstashLogHandler(TCPLogstashHandler):
     Sends JSON log records to Logstash over TCP as line-seperated JSON documents
     compatible with the Logstash TCP input plugin.
     Adds extra metadata fields to each record about the app instance.
+
+    Unless "blocking" is True, records are formatted in the logging thread but
+    sent by a background thread; they are put on a bounded queue (of "queue_size")
+    and sent in batches (of up to "batch_size") so that a slow or unreachable
+    Logstash never stalls the logging thread.  If the queue is full, records are
+    discarded (and counted as "overflowed").  If a batch cannot be sent, the sender
+    reconnects w/ an exponential backoff; after "max_retries" failed attempts the
+    batch is discarded (and counted as "dropped").  These counts are available via
+    `stats`.
     """
     def __init__(
-        self, host, port, app, instance, environment, stream="default"
+        self,
+        host,
+        port,
+        app,
+        instance,
+        environment,
+        stream="default",
+        blocking=False,
+        queue_size=10000,
+        batch_size=100,
+        flush_interval=1.0,
+        max_retries=5,
     ):
         super(TCPLogstashHandler, self).__init__(host, port)
 
@@ -118,3 +351,370 @@ class AstrosatAppTCPLogstashLogHandler(TCPLogstashHandler):
                 "stream": stream,
             }
         )
+
+        self.blocking = blocking
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+
+        self.n_sent = 0
+        self.n_dropped = 0
+        self.n_overflowed = 0
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.sender_thread = None
+        self.sender_stopping = threading.Event()
+        self.closed = False
+        if not self.blocking:
+            self.start_sender()
+
+        LOGSTASH_HANDLERS.add(self)
+
+    @property
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.n_sent,
+            "dropped": self.n_dropped,
+            "overflowed": self.n_overflowed,
+        }
+
+    def start_sender(self):
+        self.sender_stopping.clear()
+        self.sender_thread = threading.Thread(
+            target=self.send_batches,
+            name=f"{self.__class__.__name__}-sender",
+            daemon=True,
+        )
+        self.sender_thread.start()
+
+    def emit(self, record):
+        if self.closed:
+            # (don't reconnect - or restart the sender - once closed)
+            return
+
+        if self.blocking:
+            return super().emit(record)
+
+        if self.sender_thread is None or not self.sender_thread.is_alive():
+            # the thread won't be running if this process was forked
+            # after the handler was created (as w/ some wsgi servers)
+            self.start_sender()
+
+        try:
+            document = self.makePickle(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            self.queue.put_nowait(document)
+        except queue.Full:
+            # (emit is called w/ the handler lock held, so this is thread-safe)
+            self.n_overflowed += 1
+
+    def get_batch(self):
+        """
+        Waits (up to flush_interval) for a document to be queued and then
+        returns it along w/ any other queued documents (up to batch_size).
+        """
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def send_batch(self, batch):
+        """
+        Sends a batch of newline-delimited documents, reconnecting w/ an
+        exponential backoff as needed.  Returns True if the batch was sent.
+        """
+        data = b"".join(batch)
+        retry_period = self.retryStart
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                if self.sender_stopping.wait(retry_period):
+                    break  # don't keep retrying if the handler is closing
+                retry_period = min(
+                    retry_period * self.retryFactor, self.retryMax
+                )
+            try:
+                if self.sock is None:
+                    self.sock = self.makeSocket()
+                self.sock.sendall(data)
+                return True
+            except OSError:
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+        return False
+
+    def send_batches(self):
+        while not (self.sender_stopping.is_set() and self.queue.empty()):
+            batch = self.get_batch()
+            if batch:
+                with LOGSTASH_SEND_BATCH_SECONDS_METRIC.time():
+                    is_sent = self.send_batch(batch)
+                if is_sent:
+                    self.n_sent += len(batch)
+                else:
+                    self.n_dropped += len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+        if self.closed and self.sock is not None:
+            # the handler was closed while this was still sending, so the
+            # socket was left for this thread to close
+            self.sock.close()
+            self.sock = None
+
+    def flush(self, timeout=5.0):
+        """
+        Waits (up to timeout seconds) for all queued documents to be sent (or dropped).
+        (This is bounded by default b/c logging.shutdown calls it at exit.)
+        """
+        if self.blocking or self.sender_thread is None:
+            return super().flush()
+        end_time = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = end_time - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.queue.all_tasks_done.wait(remaining)
+
+    def close(self, timeout=5.0):
+        """
+        Stops the background sender, giving it (up to timeout seconds)
+        to send any queued documents.  If it stops in time, anything left is
+        counted as dropped; otherwise it carries on sending what is queued
+        (& closes the socket) in the background.  Once closed, nothing else
+        is emitted.
+        """
+        self.closed = True
+        if self.sender_thread is not None and self.sender_thread.is_alive():
+            self.sender_stopping.set()
+            self.sender_thread.join(timeout)
+            if self.sender_thread.is_alive():
+                # the sender is still using the socket, so don't close it
+                logging.Handler.close(self)
+                return
+            self.sender_thread = None
+        n_unsent = self.queue.qsize()
+        if n_unsent:
+            self.n_dropped += n_unsent
+        super().close()
+
+
+#############
+# exporting #
+#############
+
+LOG_RECORD_EXPORT_FIELDS = [
+    "id", "level", "created", "tags", "message", "occurrences"
+]
+LOG_RECORD_EXPORT_CHUNK_SIZE = 2000
+
+
+def flatten_log_record_message(message, separator=" | "):
+    """
+    Returns the flattened content of a JSON log record message,
+    or an empty dictionary if the message is not a JSON object.
+    """
+    try:
+        json_message = json_loads(message)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(json_message, dict):
+        return {}
+    return flatten_dictionary(json_message, separator=separator)
+
+
+def get_log_record_message_types(
+    queryset, chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE, separator=" | "
+):
+    """
+    Does a lightweight pass over the messages of some DatabaseLogRecords and returns
+    a (sorted) dictionary of the columns that their flattened JSON content produces
+    along w/ the set of python types found in each column.
+    Only the "message" column is fetched, and it is fetched in chunks.
+    """
+    message_types = defaultdict(set)
+    messages = queryset.prefetch_related(None).values_list(
+        "message", flat=True
+    )
+    for message in messages.iterator(chunk_size=chunk_size):
+        for column, value in flatten_log_record_message(message,
+                                                        separator).items():
+            message_types[column].add(type(value))
+    return dict(sorted(message_types.items()))
+
+
+def get_log_record_message_columns(
+    queryset, chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE, separator=" | "
+):
+    """
+    Returns the (sorted) columns that the flattened JSON content of
+    some DatabaseLogRecords' messages produces.
+    """
+    return list(
+        get_log_record_message_types(
+            queryset, chunk_size=chunk_size, separator=separator
+        ).keys()
+    )
+
+
+def iterate_log_record_chunks(
+    queryset, chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE
+):
+    """
+    Yields lists of (at most chunk_size) DatabaseLogRecords w/ their tags prefetched.
+    Uses a server-side cursor (where supported) so that the whole queryset
+    is never held in memory at once.
+    """
+    # (prefetch_related is ignored by QuerySet.iterator, hence doing it per chunk)
+    records = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    for chunk in grouper(records, chunk_size):
+        chunk = [record for record in chunk if record is not None]
+        prefetch_related_objects(chunk, "tags")
+        yield chunk
+
+
+def iterate_log_record_rows(
+    queryset, chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE, separator=" | "
+):
+    """
+    Yields serialized DatabaseLogRecords as flat dictionaries suitable for exporting;
+    standard fields are prefixed w/ "record." and the content of JSON messages is
+    flattened into additional keys.
+    """
+    from astrosat.serializers import DatabaseLogRecordSerializer
+
+    for chunk in iterate_log_record_chunks(queryset, chunk_size=chunk_size):
+        for data in DatabaseLogRecordSerializer(chunk, many=True).data:
+            row = {
+                f"record.{field}": data[field]
+                for field in LOG_RECORD_EXPORT_FIELDS
+            }
+            row.update(flatten_log_record_message(data["message"], separator))
+            yield row
+
+
+def iterate_log_record_csv_rows(
+    queryset,
+    chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE,
+    message_columns=None,
+    separator=" | ",
+):
+    """
+    Yields the headers and then the rows of a CSV representation of some DatabaseLogRecords.
+    If message_columns is not provided, it is discovered by a lightweight pass over the records.
+    """
+    if message_columns is None:
+        message_columns = get_log_record_message_columns(
+            queryset, chunk_size=chunk_size, separator=separator
+        )
+
+    headers = [f"record.{field}" for field in LOG_RECORD_EXPORT_FIELDS]
+    headers = headers + list(message_columns)
+    yield headers
+
+    for row in iterate_log_record_rows(
+        queryset, chunk_size=chunk_size, separator=separator
+    ):
+        # add the row to the CSV; if a column doesn't exist just add None
+        yield [row.get(column, None) for column in headers]
+
+
+def get_arrow_type(python_types):
+    """
+    Returns the most specific arrow type that can store values of all python_types;
+    anything that isn't a bool or a number is stored as a string.
+    """
+    import pyarrow as pa
+
+    python_types = set(python_types) - {type(None)}
+    if python_types and python_types <= {bool}:
+        return pa.bool_()
+    elif python_types and python_types <= {int}:
+        return pa.int64()
+    elif python_types and python_types <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def write_log_records_parquet(
+    queryset,
+    where,
+    chunk_size=LOG_RECORD_EXPORT_CHUNK_SIZE,
+    message_types=None,
+    separator=" | ",
+):
+    """
+    Writes some DatabaseLogRecords to a Parquet file (or file-like object) at "where".
+    The content of JSON messages is flattened into typed columns.  Each chunk of records
+    is written as a separate row group, so memory use is bounded by chunk_size.
+    message_types is a dictionary of column names to the python type (or set of types)
+    of their values; if it is not provided, it is discovered by a lightweight pass over
+    the records.  Returns the number of records written.
+    Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if message_types is None:
+        message_types = get_log_record_message_types(
+            queryset, chunk_size=chunk_size, separator=separator
+        )
+
+    record_fields = [
+        ("record.id", pa.int64()),
+        ("record.level", pa.string()),
+        ("record.created", pa.timestamp("us", tz="UTC")),
+        ("record.tags", pa.list_(pa.string())),
+        ("record.message", pa.string()),
+        ("record.occurrences", pa.int64()),
+    ]
+    message_fields = [(
+        column,
+        get_arrow_type(
+            python_types if isinstance(python_types, (set, list, tuple)) else
+            [python_types]
+        )
+    ) for column, python_types in message_types.items()]
+    schema = pa.schema(record_fields + message_fields)
+
+    n_records = 0
+    with pq.ParquetWriter(where, schema) as writer:
+        for chunk in iterate_log_record_chunks(queryset, chunk_size=chunk_size):
+            data = {column: [] for column in schema.names}
+            for record in chunk:
+                data["record.id"].append(record.id)
+                data["record.level"].append(logging.getLevelName(record.level))
+                data["record.created"].append(record.created)
+                data["record.tags"].append([
+                    tag.name for tag in record.tags.all()
+                ])
+                data["record.message"].append(record.message)
+                data["record.occurrences"].append(record.occurrences)
+                flattened_message = flatten_log_record_message(
+                    record.message, separator
+                )
+                for column, column_type in message_fields:
+                    value = flattened_message.get(column, None)
+                    if column_type == pa.string() and not (
+                        value is None or isinstance(value, str)
+                    ):
+                        # non-string values (like lists) are stored as JSON
+                        value = json_dumps(value)
+                    data[column].append(value)
+            # each chunk is written as its own row group...
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            n_records += len(chunk)
+
+    return n_records
@@ -0,0 +1,264 @@
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# (the registry is used throughout astrosat, including by DynamicSettings,
+# so this module must not import astrosat.conf at the top level)
+
+DEFAULT_HISTOGRAM_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    math.inf
+)
+
+
+def format_metric_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def format_metric_labels(labels):
+    if not labels:
+        return ""
+    escaped_labels = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        ) for name, value in labels.items()
+    )
+    return f"{{{escaped_labels}}}"
+
+
+class Metric:
+    """
+    The base class of all metrics.  Values are stored per unique set of label
+    values.  Alternatively, a `callback` can provide the current value(s) when
+    the metric is collected; it should return a number, or - if the metric has
+    labels - a list of (labels dict, value) tuples.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, label_names=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.registry = None
+        self.lock = threading.Lock()
+        self.values = {}
+
+    @property
+    def enabled(self):
+        return self.registry is None or self.registry.enabled
+
+    def get_label_values(self, labels):
+        assert set(labels.keys()) == set(self.label_names), \
+            f"Invalid labels for {self.name}: {list(labels.keys())}."
+        return tuple(str(labels[label_name]) for label_name in self.label_names)
+
+    def get_labels(self, label_values):
+        return OrderedDict(zip(self.label_names, label_values))
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+    def collect(self):
+        """
+        yields (name, labels, value) samples
+        """
+        if self.callback is not None:
+            value = self.callback()
+            if self.label_names:
+                for labels, labels_value in value:
+                    yield (self.name, labels, labels_value)
+            else:
+                yield (self.name, {}, value)
+        else:
+            with self.lock:
+                values = list(self.values.items())
+            for label_values, value in values:
+                yield (self.name, self.get_labels(label_values), value)
+
+
+class Counter(Metric):
+    """
+    A value that only ever goes up (by convention its name ends in "_total").
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        label_values = self.get_label_values(labels)
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up & down.
+    """
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        if not self.enabled:
+            return
+        label_values = self.get_label_values(labels)
+        with self.lock:
+            self.values[label_values] = value
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        label_values = self.get_label_values(labels)
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Counts observations (usually durations in seconds) in cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        label_names=(),
+        buckets=DEFAULT_HISTOGRAM_BUCKETS
+    ):
+        super().__init__(name, documentation, label_names=label_names)
+        buckets = sorted(buckets)
+        if buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not self.enabled:
+            return
+        label_values = self.get_label_values(labels)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            bucket_counts, total = self.values.get(
+                label_values, ([0] * len(self.buckets), 0)
+            )
+            bucket_counts[bucket_index] += 1
+            self.values[label_values] = (bucket_counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        observes the duration of a block of code
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self.lock:
+            values = [(label_values, (list(bucket_counts), total))
+                      for label_values, (bucket_counts, total) in
+                      self.values.items()]
+        for label_values, (bucket_counts, total) in values:
+            labels = self.get_labels(label_values)
+            count = 0
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                count += bucket_count
+                yield (
+                    f"{self.name}_bucket",
+                    OrderedDict(**labels, le=format_metric_value(bucket)),
+                    count,
+                )
+            yield (f"{self.name}_sum", labels, total)
+            yield (f"{self.name}_count", labels, count)
+
+
+class MetricsRegistry:
+    """
+    Holds a set of metrics and renders them in the Prometheus text exposition format.
+    Metrics only record values if ASTROSAT_ENABLE_METRICS is set.  Usage is:
+    >>> from astrosat.utils import metrics_registry
+    >>> MY_COUNTER = metrics_registry.counter("my_things_total", "The number of things.", ["kind"])
+    >>> MY_COUNTER.inc(kind="good")
+    """
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        from astrosat.conf import app_settings
+        return app_settings.ASTROSAT_ENABLE_METRICS
+
+    def register(self, metric):
+        """
+        adds a metric to this registry; if a metric w/ the same name has already
+        been registered, that metric is returned instead
+        """
+        with self.lock:
+            existing_metric = self.metrics.get(metric.name)
+            if existing_metric is not None:
+                assert type(existing_metric) == type(metric), \
+                    f"A different type of metric named '{metric.name}' is already registered."
+                return existing_metric
+            metric.registry = self
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, label_names=(), callback=None):
+        return self.register(
+            Counter(name, documentation, label_names, callback=callback)
+        )
+
+    def gauge(self, name, documentation, label_names=(), callback=None):
+        return self.register(
+            Gauge(name, documentation, label_names, callback=callback)
+        )
+
+    def histogram(
+        self,
+        name,
+        documentation,
+        label_names=(),
+        buckets=DEFAULT_HISTOGRAM_BUCKETS
+    ):
+        return self.register(
+            Histogram(name, documentation, label_names, buckets=buckets)
+        )
+
+    def reset(self):
+        for metric in list(self.metrics.values()):
+            metric.reset()
+
+    def render(self):
+        """
+        returns all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.collect():
+                lines.append(
+                    f"{name}{format_metric_labels(labels)} {format_metric_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
@@ -1,13 +1,21 @@
 import cProfile
 import functools
 import io
+import logging
 import operator
 import pstats
 import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
 
 from django.apps import apps
 from django.conf import settings
+from django.db import connections
 from django.template import Context, Template
+from django.utils import timezone
 
 from pympler.classtracker import ClassTracker
 from pympler.process import ProcessMemoryInfo
@@ -15,6 +23,8 @@ from pympler.util.stringutils import pp
 
 from astrosat.conf import app_settings
 
+from .utils_json import json_dumps
+
 #################
 # debug_toolbar #
 #################
@@ -29,13 +39,35 @@ def show_toolbar(request):
     return _show_toolbar(request) and app_settings.ASTROSAT_ENABLE_DEBUG_TOOLBAR
 
 
+def can_profile(request):
+    """
+    the default ASTROSAT_PROFILING_CALLBACK; like django-debug-toolbar's
+    SHOW_TOOLBAR_CALLBACK it allows profiling from INTERNAL_IPS in DEBUG mode,
+    but it also allows superusers to profile requests in production
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_superuser:
+        return True
+    return settings.DEBUG and request.META.get(
+        "REMOTE_ADDR"
+    ) in settings.INTERNAL_IPS
+
+
 #############
 # profiling #
 #############
 
 
-def profile(n_calls=100, sort_key="cumulative", path=""):
+def profile(
+    n_calls=100,
+    sort_key="cumulative",
+    path="",
+    json_path="",
+    log_to_db=False,
+):
     """A decorator that profiles a function
+    The structured results of the most recent call are available
+    as the `results` attribute of the decorated function.
     Parameters
     ----------
     n_calls : int
@@ -44,7 +76,11 @@ def profile(n_calls=100, sort_key="cumulative", path=""):
         the profiling statistic to order calls by.
         valid options can be found at: https://docs.python.org/3/library/profile.html#pstats.Stats.sort_stats
     path : str
-        A filename to output profiling statistics to (default is to print to stdout)
+        A filename to output profiling statistics to (default is to print to stdout; None outputs nothing)
+    json_path : str
+        A filename to append the structured results to as a line of JSON
+    log_to_db : bool
+        Whether to store the structured results as a DatabaseLogRecord tagged "profile"
     """
 
     # there are multiple values for each SortKey; this clever code reduces them into a single list
@@ -66,105 +102,623 @@ def profile(n_calls=100, sort_key="cumulative", path=""):
                 stream = io.StringIO()
                 stats = pstats.Stats(profiler,
                                      stream=stream).sort_stats(sort_key)
-                stats.print_stats(n_calls)
-                stats_value = stream.getvalue()
 
-                if not path:
-                    print(stats_value)  # print to stdout
-                else:
-                    with open(path, "w") as fp:
-                        fp.write(stats_value)  # print to path
+                profile_wrapper.results = get_profile_results(
+                    get_function_name(fn), stats, n_calls=n_calls
+                )
+                record_profile_results(
+                    profile_wrapper.results,
+                    json_path=json_path,
+                    log_to_db=log_to_db
+                )
+
+                if path is not None:
+                    stats.print_stats(n_calls)
+                    stats_value = stream.getvalue()
+                    if not path:
+                        print(stats_value)  # print to stdout
+                    else:
+                        with open(path, "w") as fp:
+                            fp.write(stats_value)  # print to path
 
+        profile_wrapper.results = None
         return profile_wrapper
 
     return profile_decorator
 
 
-def track_memory(path=""):
+class SamplingProfiler:
+    """
+    A statistical profiler; rather than tracing every call (like cProfile, which
+    adds a lot of overhead to ORM-heavy code) a background thread samples the
+    profiled thread's stack every `interval` seconds.  The result is a count of
+    each unique stack, which is written in the "collapsed" format used by
+    flamegraph.pl & speedscope.  Can be used as a decorator (in which case each call
+    is sampled by a new profiler; the most recent is the `profiler` attribute of the
+    decorated function) or a context manager:
+
+    >>> @SamplingProfiler(path="my_fn.collapsed")
+    ... def my_fn():
+    ...     pass
+
+    >>> with SamplingProfiler() as profiler:
+    ...     my_fn()
+    >>> profiler.stacks.most_common(10)
+
+    Parameters
+    ----------
+    interval : float
+        the number of seconds between samples.
+    path : str
+        A filename to output collapsed stacks to (default is to print to stdout)
+    """
+    def __init__(self, interval=0.005, path=""):
+        self.interval = interval
+        self.path = path
+        self.stacks = Counter()
+        self.n_samples = 0
+        self.frame_labels = {}
+        self.sampler_thread = None
+        self.stopping = threading.Event()
+        self.ignored_codes = {
+            fn.__code__
+            for fn in [
+                SamplingProfiler.__enter__,
+                SamplingProfiler.__exit__,
+                SamplingProfiler.start,
+                SamplingProfiler.stop,
+            ]
+        }
+
+    def __enter__(self):
+        # the stack is sampled up to (and including) the caller's frame
+        return self.start(sys._getframe(1), include_entry_frame=True)
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        self.output()
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def sampling_profile_wrapper(*args, **kwargs):
+            # each call gets its own profiler, so that concurrent (or recursive) calls
+            # don't share one; the most recent is available as the `profiler` attribute
+            profiler = SamplingProfiler(interval=self.interval, path=self.path)
+            sampling_profile_wrapper.profiler = profiler
+            # the stack is sampled up to (but not including) this wrapper
+            profiler.start(sys._getframe(), include_entry_frame=False)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+                profiler.output()
+
+        sampling_profile_wrapper.profiler = None
+        return sampling_profile_wrapper
+
+    def start(self, entry_frame, include_entry_frame=True):
+        assert self.sampler_thread is None, "SamplingProfiler is already running."
+        self.stacks.clear()
+        self.n_samples = 0
+        self.stopping.clear()
+        self.entry_frame = entry_frame
+        self.include_entry_frame = include_entry_frame
+        self.sampler_thread = threading.Thread(
+            target=self.sample,
+            args=(threading.get_ident(), ),
+            name="astrosat-sampling-profiler",
+            daemon=True,
+        )
+        self.sampler_thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.sampler_thread.join()
+        self.sampler_thread = None
+        self.entry_frame = None
+
+    def sample(self, thread_id):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                if frame.f_code in self.ignored_codes:
+                    # don't sample the profiler starting or stopping itself
+                    stack = None
+                    break
+                if frame is self.entry_frame:
+                    if self.include_entry_frame:
+                        stack.append(self.get_frame_label(frame.f_code, frame))
+                    break
+                stack.append(self.get_frame_label(frame.f_code, frame))
+                frame = frame.f_back
+            del frame
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.n_samples += 1
+
+    def get_frame_label(self, code, frame):
+        # labels are cached per code object to keep the cost of a sample low
+        label = self.frame_labels.get(code)
+        if label is None:
+            module_name = frame.f_globals.get("__name__", code.co_filename)
+            label = self.frame_labels[code] = f"{module_name}:{code.co_name}"
+        return label
+
+    @property
+    def collapsed_stacks(self):
+        return "\n".join(
+            f"{stack} {count}" for stack, count in sorted(self.stacks.items())
+        )
+
+    def output(self):
+        collapsed_stacks = self.collapsed_stacks
+        if not self.path:
+            print(collapsed_stacks)  # print to stdout
+        else:
+            with open(self.path, "w") as fp:
+                fp.write(collapsed_stacks)  # print to path
+
+
+TRACK_MEMORY_MODES = ["tracemalloc", "classes"]
+
+# tracemalloc is process-wide, so (possibly concurrent) calls to track_memory share
+# it; it is started by the 1st call & stopped by the last one to finish
+TRACEMALLOC_LOCK = threading.Lock()
+TRACEMALLOC_USERS = 0
+
+
+def start_tracemalloc(traceback_depth=1):
+    """
+    starts tracemalloc (unless it is already being traced); returns whether
+    `stop_tracemalloc` must be called once tracing is no longer needed
+    """
+    global TRACEMALLOC_USERS
+    with TRACEMALLOC_LOCK:
+        if not TRACEMALLOC_USERS:
+            if tracemalloc.is_tracing():
+                # don't interfere w/ tracing that was started elsewhere
+                return False
+            tracemalloc.start(traceback_depth)
+        TRACEMALLOC_USERS += 1
+        return True
+
+
+def stop_tracemalloc():
+    global TRACEMALLOC_USERS
+    with TRACEMALLOC_LOCK:
+        TRACEMALLOC_USERS -= 1
+        if not TRACEMALLOC_USERS:
+            tracemalloc.stop()
+
+
+def track_memory(
+    path="",
+    json_path="",
+    log_to_db=False,
+    mode="tracemalloc",
+    group_by="lineno",
+    n_allocations=25,
+    traceback_depth=1,
+):
     """
     A decorator that reports the memory usage of a function.
-    This simulates the django-debug-toolbar panel that pympler provides.
+    By default this compares tracemalloc snapshots taken before & after the fn
+    to find the top allocation sites.  Alternatively, the (much more expensive)
+    "classes" mode simulates the django-debug-toolbar panel that pympler provides
+    by tracking the instances of every model; this is best kept for deep dives.
     (note: b/c this decorator takes arguments, it must be called as a fn)
+    The structured results of the most recent call are available
+    as the `results` attribute of the decorated function.
     Parameters
     ----------
+    mode : str
+        "tracemalloc" or "classes"
+    group_by : str
+        how to group allocations in "tracemalloc" mode: "filename", "lineno" or "traceback"
+    n_allocations : int
+        the number of allocation sites to report in "tracemalloc" mode
+    traceback_depth : int
+        the number of frames to store per allocation in "tracemalloc" mode
+        (only applies if tracemalloc isn't already tracing; concurrent calls share tracing)
     path : str
-        A filename to output memory tracking statistics to (default is to print to stdout)
+        A filename to output memory tracking statistics to (default is to print to stdout; None outputs nothing)
+    json_path : str
+        A filename to append the structured results to as a line of JSON
+    log_to_db : bool
+        Whether to store the structured results as a DatabaseLogRecord tagged "profile"
     """
+    assert mode in TRACK_MEMORY_MODES, f"Invalid mode: '{mode}'."
+    assert group_by in ["filename", "lineno", "traceback"], f"Invalid group_by: '{group_by}'."
+
     def track_memory_decorator(fn):
         @functools.wraps(fn)
         def track_memory_wrapper(*args, **kwargs):
 
             memory_info = {}
-            tracker = ClassTracker()
-            for cls in apps.get_models() + [Context, Template]:
-                # track all models from registered apps, plus some standard Django ones
-                tracker.track_class(cls)
+            if mode == "classes":
+                tracker = ClassTracker()
+                for cls in apps.get_models() + [Context, Template]:
+                    # track all models from registered apps, plus some standard Django ones
+                    tracker.track_class(cls)
 
-            try:
-                tracker.create_snapshot("before")
-                memory_info["before"] = ProcessMemoryInfo()
-                result = fn(*args, **kwargs)
-                memory_info["after"] = ProcessMemoryInfo()
-                tracker.create_snapshot("after")
-                memory_info["stats"] = tracker.stats
-                memory_info["stats"].annotate()
-                return result
+                try:
+                    tracker.create_snapshot("before")
+                    memory_info["before"] = ProcessMemoryInfo()
+                    result = fn(*args, **kwargs)
+                    memory_info["after"] = ProcessMemoryInfo()
+                    tracker.create_snapshot("after")
+                    memory_info["stats"] = tracker.stats
+                    memory_info["stats"].annotate()
+                finally:
+                    tracker.detach_all_classes()
 
-            finally:
+            else:
+                must_stop_tracing = start_tracemalloc(traceback_depth)
+                try:
+                    snapshot_before = tracemalloc.take_snapshot()
+                    memory_info["before"] = ProcessMemoryInfo()
+                    result = fn(*args, **kwargs)
+                    memory_info["after"] = ProcessMemoryInfo()
+                    snapshot_after = tracemalloc.take_snapshot()
+                finally:
+                    if must_stop_tracing:
+                        stop_tracemalloc()
+
+                ignore_tracemalloc = tracemalloc.Filter(
+                    False, tracemalloc.__file__
+                )
+                memory_info["allocations"] = snapshot_after.filter_traces(
+                    [ignore_tracemalloc]
+                ).compare_to(
+                    snapshot_before.filter_traces([ignore_tracemalloc]),
+                    group_by
+                )[:n_allocations]
 
-                # record a whole bunch of memory statistics...
-                resources = [
-                    ("resident set size", memory_info["after"].rss),
-                    ("virtual size", memory_info["after"].vsz),
-                ]
-                resources.extend(memory_info["after"] - memory_info["before"])
-                resources = [(k, pp(v)) for k, v in resources]
-                resources.extend(memory_info["after"].os_specific)
-
-                # record each tracked class as of the final snapshot...
-                classes_stats = []
-                snapshot = memory_info["stats"].snapshots[-1]
-                for class_name in memory_info["stats"].tracked_classes:
-                    # history is a list of tuples that is updated on every creation/deletions: (timestamp, n_instances)
-                    history = [
-                        n for _, n in memory_info["stats"].history[class_name]
-                    ]
-                    if history:
-                        classes_stats.append({
-                            "name":
-                                class_name,
-                            "n_instances":
-                                len(history),
-                            "min_instances":
-                                min(history),
-                            "max_instances":
-                                max(history),
-                            "size":
-                                pp(
-                                    snapshot.classes.get(class_name,
-                                                         {}).get("sum", 0)
-                                ),
-                        })
+            track_memory_wrapper.results = get_memory_results(
+                get_function_name(fn), memory_info
+            )
+            record_profile_results(
+                track_memory_wrapper.results,
+                json_path=json_path,
+                log_to_db=log_to_db
+            )
 
+            if path is not None:
                 if not path:
-                    stream = sys.stdout
-                else:
-                    stream = open(path, "w")
-
-                print("\nRESOURCES", file=stream)
-                for k, v in resources:
-                    print(f"{k:<26}: {v:>10}", file=stream)
-                print("\nCLASSES", file=stream)
-                for class_stats in classes_stats:
-                    print(
-                        "{name}: created/deleted {n_instances} times for a min/max of {min_instances}/{max_instances} instances: {size:>10}"
-                        .format(**class_stats),
-                        file=stream,
+                    print_memory_results(
+                        track_memory_wrapper.results, sys.stdout
                     )
+                else:
+                    with open(path, "w") as fp:
+                        print_memory_results(track_memory_wrapper.results, fp)
 
-                stream.closed
-                tracker.detach_all_classes()
+            return result
 
+        track_memory_wrapper.results = None
         return track_memory_wrapper
 
     return track_memory_decorator
+
+
+class QueryTracker:
+    """
+    Records the SQL queries run (in the current thread) via `connection.execute_wrapper`
+    and reports the number of queries, the total time spent in the db, duplicate
+    queries (the same SQL w/ the same params) and suspected N+1 patterns (the same
+    SQL run w/ at least `n_plus_one_threshold` different params).
+    Can be used as a decorator or a context manager:
+
+    >>> @QueryTracker(path="my_fn.txt")
+    ... def my_fn():
+    ...     pass
+
+    >>> with QueryTracker(path=None) as tracker:
+    ...     my_fn()
+    >>> tracker.n_queries
+
+    Parameters
+    ----------
+    using : str
+        the alias of the db to track (default is to track all dbs)
+    n_plus_one_threshold : int
+        the number of similar queries that suggest an N+1 pattern
+    path : str
+        A filename to output query statistics to (default is to print to stdout; None outputs nothing)
+    json_path : str
+        A filename to append the structured results to as a line of JSON
+    log_to_db : bool
+        Whether to store the structured results as a DatabaseLogRecord tagged "profile"
+    include_params : bool
+        Whether to include the params of duplicate queries in the results
+        (params can contain personal data, so leave them out of anything that is logged)
+    """
+    def __init__(
+        self,
+        using=None,
+        n_plus_one_threshold=None,
+        path="",
+        json_path="",
+        log_to_db=False,
+        name=None,
+        include_params=True,
+    ):
+        self.using = using
+        self.n_plus_one_threshold = (
+            n_plus_one_threshold or
+            app_settings.ASTROSAT_QUERY_N_PLUS_ONE_THRESHOLD
+        )
+        self.path = path
+        self.json_path = json_path
+        self.log_to_db = log_to_db
+        self.name = name
+        self.include_params = include_params
+        self.queries = []
+        self.results = None
+        self.exit_stack = None
+
+    def __enter__(self):
+        assert self.exit_stack is None, "QueryTracker is already running."
+        self.queries = []
+        self.results = None
+        self.exit_stack = ExitStack()
+        for connection in ([connections[self.using]]
+                           if self.using else connections.all()):
+            self.exit_stack.enter_context(
+                connection.execute_wrapper(self.execute_wrapper)
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        self.exit_stack.close()
+        self.exit_stack = None
+        self.results = self.get_results()
+        record_profile_results(
+            self.results, json_path=self.json_path, log_to_db=self.log_to_db
+        )
+        if self.path is not None:
+            if not self.path:
+                print_query_results(self.results, sys.stdout)
+            else:
+                with open(self.path, "w") as fp:
+                    print_query_results(self.results, fp)
+
+    def __call__(self, fn):
+        name = self.name or get_function_name(fn)
+
+        @functools.wraps(fn)
+        def query_tracker_wrapper(*args, **kwargs):
+            # each call gets its own tracker, so that concurrent (or recursive) calls
+            # don't share one; the most recent is available as the `tracker` attribute
+            tracker = QueryTracker(
+                using=self.using,
+                n_plus_one_threshold=self.n_plus_one_threshold,
+                path=self.path,
+                json_path=self.json_path,
+                log_to_db=self.log_to_db,
+                name=name,
+                include_params=self.include_params,
+            )
+            query_tracker_wrapper.tracker = tracker
+            with tracker:
+                return fn(*args, **kwargs)
+
+        query_tracker_wrapper.tracker = None
+        return query_tracker_wrapper
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "alias": context["connection"].alias,
+                "sql": sql,
+                "params": params,
+                "many": many,
+                "duration": time.perf_counter() - start,
+            })
+
+    @property
+    def n_queries(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query["duration"] for query in self.queries)
+
+    def get_duplicate_queries(self):
+        counts = Counter(
+            (query["sql"], repr(query["params"])) for query in self.queries
+        )
+        return [
+            {
+                "sql": sql, "params": params, "count": count
+            } if self.include_params else {
+                "sql": sql, "count": count
+            } for (sql, params), count in counts.most_common() if count > 1
+        ]
+
+    def get_n_plus_one_queries(self):
+        counts = Counter(query["sql"] for query in self.queries)
+        distinct_params = {}
+        for query in self.queries:
+            distinct_params.setdefault(query["sql"],
+                                       set()).add(repr(query["params"]))
+        return [{
+            "sql": sql, "count": count, "n_params": len(distinct_params[sql])
+        } for sql, count in counts.most_common()
+                if len(distinct_params[sql]) >= self.n_plus_one_threshold]
+
+    def get_results(self):
+        return {
+            "type": "queries",
+            "name": self.name,
+            "timestamp": timezone.now().isoformat(),
+            "n_queries": self.n_queries,
+            "total_time": self.total_time,
+            "duplicate_queries": self.get_duplicate_queries(),
+            "n_plus_one_queries": self.get_n_plus_one_queries(),
+        }
+
+
+###########
+# results #
+###########
+
+PROFILE_LOG_TAG = "profile"
+
+
+def get_function_name(fn):
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def get_profile_results(name, stats, n_calls=None):
+    """
+    returns (sorted) pstats.Stats as a JSON-serializable dict
+    """
+    functions = []
+    for function_key in stats.fcn_list[:n_calls]:
+        filename, lineno, function_name = function_key
+        n_primitive_calls, n_function_calls, total_time, cumulative_time, _ = stats.stats[
+            function_key]
+        functions.append({
+            "function": pstats.func_std_string(function_key),
+            "filename": filename,
+            "lineno": lineno,
+            "name": function_name,
+            "n_calls": n_function_calls,
+            "n_primitive_calls": n_primitive_calls,
+            "total_time": total_time,
+            "cumulative_time": cumulative_time,
+        })
+
+    return {
+        "type": "profile",
+        "name": name,
+        "timestamp": timezone.now().isoformat(),
+        "n_calls": stats.total_calls,
+        "n_primitive_calls": stats.prim_calls,
+        "total_time": stats.total_tt,
+        "functions": functions,
+    }
+
+
+def get_memory_results(name, memory_info):
+    """
+    returns the memory statistics gathered by track_memory as a JSON-serializable dict
+    """
+    before = memory_info["before"]
+    after = memory_info["after"]
+
+    results = {
+        "type": "memory",
+        "name": name,
+        "timestamp": timezone.now().isoformat(),
+        "resources": {
+            "resident set size": after.rss,
+            "virtual size": after.vsz,
+        },
+        "memory_deltas": dict(after - before),
+        "os_specific": dict(after.os_specific),
+    }
+
+    if "stats" in memory_info:
+        # record each tracked class as of the final snapshot...
+        stats = memory_info["stats"]
+        classes = []
+        snapshot = stats.snapshots[-1]
+        for class_name in stats.tracked_classes:
+            # history is a list of tuples that is updated on every creation/deletions: (timestamp, n_instances)
+            history = [n for _, n in stats.history[class_name]]
+            if history:
+                classes.append({
+                    "name": class_name,
+                    "n_instances": len(history),
+                    "min_instances": min(history),
+                    "max_instances": max(history),
+                    "size": snapshot.classes.get(class_name, {}).get("sum", 0),
+                })
+        results["classes"] = classes
+
+    if "allocations" in memory_info:
+        # record the top allocation sites (tracemalloc.StatisticDiffs)
+        # w/ their tracebacks ordered from the most recent frame...
+        results["allocations"] = [{
+            "traceback": [
+                f"{frame.filename}:{frame.lineno}"
+                for frame in reversed(allocation.traceback)
+            ],
+            "size": allocation.size,
+            "size_diff": allocation.size_diff,
+            "count": allocation.count,
+            "count_diff": allocation.count_diff,
+        } for allocation in memory_info["allocations"]]
+
+    return results
+
+
+def print_memory_results(results, stream):
+    resources = [
+        (k, pp(v))
+        for k, v in {**results["resources"], **results["memory_deltas"]}.items()
+    ]
+    resources.extend(results["os_specific"].items())
+
+    print("\nRESOURCES", file=stream)
+    for k, v in resources:
+        print(f"{k:<26}: {v:>10}", file=stream)
+    if "classes" in results:
+        print("\nCLASSES", file=stream)
+        for class_stats in results["classes"]:
+            print(
+                "{name}: created/deleted {n_instances} times for a min/max of {min_instances}/{max_instances} instances: {size:>10}"
+                .format(**{
+                    **class_stats, "size": pp(class_stats["size"])
+                }),
+                file=stream,
+            )
+    if "allocations" in results:
+        print("\nALLOCATIONS", file=stream)
+        for allocation in results["allocations"]:
+            print(
+                f"{allocation['traceback'][0]}: {pp(allocation['size']):>10} ({pp(allocation['size_diff'])} in {allocation['count_diff']:+} blocks)",
+                file=stream,
+            )
+            for frame in allocation["traceback"][1:]:
+                print(f"    {frame}", file=stream)
+
+
+def print_query_results(results, stream):
+    print(
+        f"\nQUERIES: {results['n_queries']} in {results['total_time']:.3f}s",
+        file=stream
+    )
+    print("\nDUPLICATES", file=stream)
+    for query in results["duplicate_queries"]:
+        print(f"{query['count']:>5} x {query['sql']}", file=stream)
+    print("\nSUSPECTED N+1", file=stream)
+    for query in results["n_plus_one_queries"]:
+        print(f"{query['count']:>5} x {query['sql']}", file=stream)
+
+
+def record_profile_results(results, json_path="", log_to_db=False):
+    """
+    persists structured profiling results so that runs can be compared over time
+    """
+    if json_path:
+        with open(json_path, "a") as fp:
+            fp.write(json_dumps(results, default=str) + "\n")
+
+    if log_to_db:
+        from astrosat.models import DatabaseLogRecord, DatabaseLogTag
+        tag, _ = DatabaseLogTag.objects.get_or_create(name=PROFILE_LOG_TAG)
+        db_record = DatabaseLogRecord.objects.create(
+            logger_name=__name__,
+            level=logging.INFO,
+            message=json_dumps(results, default=str),
+        )
+        db_record.tags.add(tag)
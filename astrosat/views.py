@@ -1,5 +1,5 @@
+import hmac
 import logging
-import json
 import uuid
 from collections import defaultdict
 from itertools import chain, filterfalse, groupby
@@ -9,17 +9,20 @@ from django import forms
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.http.response import StreamingHttpResponse
 from django.urls import re_path
 from django.urls.resolvers import URLPattern, URLResolver
 from django.views import defaults as default_views
 
 from rest_framework import status, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from rest_framework.serializers import CurrentUserDefault
+from rest_framework.settings import api_settings as drf_settings
 from rest_framework.views import APIView
 
 from django_filters import Filter, rest_framework as filters
@@ -30,8 +33,10 @@ from drf_yasg2.utils import swagger_auto_schema
 from drf_yasg2.views import get_schema_view
 
 from .models import DatabaseLogRecord, DatabaseLogTag
+from .parsers import JSONCodecParser
 from .serializers import DatabaseLogRecordSerializer
-from .utils import DataClient
+from .conf import app_settings
+from .utils import DataClient, json_dumps, metrics_registry
 
 logger = logging.getLogger("db")
 
@@ -169,6 +174,26 @@ class BetterBooleanFilter(Filter):
 ###########
 
 
+PROXY_S3_SECONDS_METRIC = metrics_registry.histogram(
+    "astrosat_proxy_s3_seconds",
+    "The time taken by ProxyS3View to retrieve an object from S3 (before streaming it).",
+)
+PROXY_S3_BYTES_METRIC = metrics_registry.counter(
+    "astrosat_proxy_s3_bytes_total",
+    "The number of bytes streamed by ProxyS3View.",
+)
+
+
+def count_streamed_bytes(stream):
+    n_bytes = 0
+    try:
+        for chunk in stream:
+            n_bytes += len(chunk)
+            yield chunk
+    finally:
+        PROXY_S3_BYTES_METRIC.inc(n_bytes)
+
+
 class ProxyS3View(APIView):
     """
     View to retrieve object contents from S3 w/out exposing credentials to the client
@@ -189,12 +214,13 @@ class ProxyS3View(APIView):
     )
     def get(self, request):
         key = request.query_params.get("key")
-        client = DataClient()
-        obj = client.get_object(key)
+        with PROXY_S3_SECONDS_METRIC.time():
+            client = DataClient()
+            obj = client.get_object(key)
         if obj:
             # client returns an instance of `botocore.response.StreamingBody`
             # (in case the data is very big); so I wrap it in a StreamingHttpResponse here
-            return StreamingHttpResponse(obj)
+            return StreamingHttpResponse(count_streamed_bytes(obj))
         else:
             msg = f"Unable to retrieve object at '{key}'"
             raise APIException(msg)
@@ -256,6 +282,13 @@ class DatabaseLogRecordViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 @api_view(['POST'])
+@parser_classes(
+    # use the (faster) JSONCodecParser in place of the default JSONParser
+    [JSONCodecParser] + [
+        parser_class for parser_class in drf_settings.DEFAULT_PARSER_CLASSES
+        if not issubclass(parser_class, JSONParser)
+    ]
+)
 @permission_classes([IsAuthenticated])
 def create_log_records(request):
     """
@@ -280,7 +313,7 @@ def create_log_records(request):
             else:
                 fn = logger.info
             fn(
-                json.dumps(record['content']),
+                json_dumps(record['content']),
                 extra={
                     "tags": record.get('tags'), "uuid": uuids[i]
                 }
@@ -323,3 +356,36 @@ def remove_urlpatterns(urlpatterns, pattern_names_to_remove):
     )
 
     return list(chain(resolvers_to_keep, patterns_to_keep))
+
+
+###########
+# metrics #
+###########
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics_view(request):
+    """
+    Renders astrosat's metrics in the Prometheus text format.  Only available
+    if ASTROSAT_ENABLE_METRICS is set; accessible by superusers, anybody in DEBUG
+    mode, or requests w/ an "Authorization: Bearer <ASTROSAT_METRICS_TOKEN>" header.
+    """
+    if not app_settings.ASTROSAT_ENABLE_METRICS:
+        raise Http404()
+
+    metrics_token = app_settings.ASTROSAT_METRICS_TOKEN
+    is_allowed = (
+        settings.DEBUG or request.user.is_superuser or (
+            metrics_token and hmac.compare_digest(
+                request.META.get("HTTP_AUTHORIZATION", "").encode(),
+                f"Bearer {metrics_token}".encode(),
+            )
+        )
+    )
+    if not is_allowed:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
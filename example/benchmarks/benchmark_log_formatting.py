@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Measures the per-record cost of formatting a JSON log record w/
+ElasticsearchDocumentLogFormatter using each available JSON codec.
+
+usage (from the "example" directory):
+  python benchmarks/benchmark_log_formatting.py [--n-records N] [--n-repeats N]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "example.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from astrosat.utils import ElasticsearchDocumentLogFormatter  # noqa: E402
+from astrosat.utils.utils_json import JSON_CODECS, get_json_codec  # noqa: E402
+
+# a typical "tracking" message, as sent to `create_log_records`...
+MESSAGE = {
+    "user": {"id": "8e1ae5c4-b3c1-4b59-9a0d-6d9b1e0e0c53", "name": "someone"},
+    "action": "dataset_viewed",
+    "dataset": {"name": "some dataset", "layers": ["a", "b", "c"]},
+    "bbox": [-3.2, 55.9, -3.1, 56.0],
+    "count": 42,
+    "enabled": True,
+}
+
+
+def benchmark_codec(codec_name, n_records, n_repeats):
+
+    codec = get_json_codec(codec_name)
+    formatter = ElasticsearchDocumentLogFormatter(
+        constant_fields={
+            "app": "example",
+            "instance": "benchmark",
+            "environment": "local",
+            "stream": "default",
+        },
+        json_codec=codec,
+    )
+    record = logging.LogRecord(
+        "benchmark", logging.INFO, __file__, 0, json.dumps(MESSAGE), None,
+        None
+    )
+
+    timings = timeit.repeat(
+        lambda: formatter.format(record), number=n_records, repeat=n_repeats
+    )
+    # use the best run, as per the `timeit` documentation
+    return min(timings) / n_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-records", type=int, default=10000)
+    parser.add_argument("--n-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    for codec_name in JSON_CODECS.keys():
+        try:
+            seconds_per_record = benchmark_codec(
+                codec_name, args.n_records, args.n_repeats
+            )
+        except django.core.exceptions.ImproperlyConfigured as e:
+            print(f"{codec_name:<8}: skipped ({e})")
+            continue
+        print(f"{codec_name:<8}: {seconds_per_record * 1e6:8.2f} µs/record")
+
+
+if __name__ == "__main__":
+    main()
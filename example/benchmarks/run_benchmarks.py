@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+"""
+Runs benchmarks of astrosat's hot paths against a temporary test database and
+(optionally) saves the results as JSON, so that they can be compared between
+versions.  See benchmarks/settings.py for how to choose the database.
+
+usage (from the "example" directory):
+  python benchmarks/run_benchmarks.py [--benchmarks NAME [NAME ...]] [--output results.json] [--compare baseline.json]
+
+by default bulk_update_or_create is run w/ 1K & 10K rows; larger sizes (which
+need an on-disk or server database, see benchmarks/settings.py) are opt-in:
+  python benchmarks/run_benchmarks.py --bulk-sizes 1000 100000 1000000
+"""
+
+import argparse
+import copy
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+import astrosat  # noqa: E402
+from astrosat.conf import app_settings  # noqa: E402
+from astrosat.models import AstrosatSettings  # noqa: E402
+from astrosat.tests.factories import UserFactory  # noqa: E402
+from astrosat.utils import (  # noqa: E402
+    DatabaseLogHandler,
+    ExcludableJSONSerializer,
+    adapt_geojson_to_django,
+    bulk_update_or_create,
+)
+
+from example.models import (  # noqa: E402
+    ExampleBulkModel,
+    ExampleMediaModel,
+    ExampleUnloadableParentModel,
+)
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__.replace("benchmark_", "", 1)] = fn
+    return fn
+
+
+def measure(name, fn, n_items, n_repeats, setup=None, **params):
+    """
+    Times `fn` `n_repeats` times; each repeat runs in a transaction that is
+    rolled back afterwards so that every repeat starts from the same state.
+    If provided, `setup` is run (untimed) inside that transaction and its
+    return value is passed to `fn`.
+    """
+    timings = []
+    for _ in range(n_repeats):
+        with transaction.atomic():
+            args = setup() if setup is not None else ()
+            gc.collect()
+            start = time.perf_counter()
+            fn(*args)
+            timings.append(time.perf_counter() - start)
+            transaction.set_rollback(True)
+
+    best = min(timings)
+    result = {
+        "name": name,
+        "params": params,
+        "n_items": n_items,
+        "n_repeats": n_repeats,
+        "timings": timings,
+        "best": best,
+        "median": statistics.median(timings),
+        "best_per_item": best / n_items,
+    }
+    print(
+        f"{name:<24} {json.dumps(params):<32} {best:10.4f}s {best / n_items * 1e6:12.2f} µs/item",
+        flush=True,
+    )
+    return result
+
+
+##############
+# benchmarks #
+##############
+
+
+@benchmark
+def benchmark_bulk_update_or_create(options):
+    for size in options.bulk_sizes:
+
+        def _setup():
+            # half of the rows already exist (and will be updated)...
+            ExampleBulkModel.objects.bulk_create([
+                ExampleBulkModel(
+                    something_unique=str(i), something_non_unique="old"
+                ) for i in range(0, size, 2)
+            ])
+            return ([{
+                "something_unique": str(i), "something_non_unique": "new"
+            } for i in range(size)], )
+
+        yield measure(
+            "bulk_update_or_create",
+            lambda model_data: bulk_update_or_create(
+                ExampleBulkModel, model_data
+            ),
+            n_items=size,
+            n_repeats=options.repeats,
+            setup=_setup,
+            n_rows=size,
+        )
+
+
+@benchmark
+def benchmark_db_log_handler(options):
+    for n_records in [1000]:
+
+        handler = DatabaseLogHandler(logging.INFO)
+
+        def _setup():
+            return ([
+                logging.LogRecord(
+                    "db", logging.INFO, __file__, 0,
+                    json.dumps({"i": i, "value": random.random()}), None, None
+                ) for i in range(n_records)
+            ], )
+
+        def _emit(records):
+            for record in records:
+                handler.emit(record)
+
+        yield measure(
+            "DatabaseLogHandler.emit",
+            _emit,
+            n_items=n_records,
+            n_repeats=options.repeats,
+            setup=_setup,
+            n_records=n_records,
+        )
+
+
+@benchmark
+def benchmark_create_log_records(options):
+    url = reverse("log-tracking")
+    for batch_size in [10, 100, 1000]:
+
+        def _setup():
+            client = APIClient()
+            client.force_authenticate(UserFactory())
+            log_data = [{
+                "content": {"i": i, "action": "benchmark"},
+                "tags": ["benchmark"],
+            } for i in range(batch_size)]
+            return (client, log_data)
+
+        def _post(client, log_data):
+            response = client.post(url, log_data, format="json")
+            assert response.status_code == 201, response.content
+
+        yield measure(
+            "create_log_records",
+            _post,
+            n_items=batch_size,
+            n_repeats=options.repeats,
+            setup=_setup,
+            batch_size=batch_size,
+        )
+
+
+@benchmark
+def benchmark_dynamic_setting(options):
+    n_reads = 1000
+
+    def _read():
+        for _ in range(n_reads):
+            app_settings.ASTROSAT_ENABLE_DB_LOGGING
+
+    yield measure(
+        "DynamicSetting.value",
+        _read,
+        n_items=n_reads,
+        n_repeats=options.repeats,
+    )
+
+
+@benchmark
+def benchmark_excludable_json_serializer(options):
+    for n_objects in [1000, 10000]:
+
+        def _setup():
+            ExampleBulkModel.objects.bulk_create([
+                ExampleBulkModel(
+                    something_unique=str(i), something_non_unique="value"
+                ) for i in range(n_objects)
+            ])
+            return (ExampleBulkModel.objects.all(), )
+
+        yield measure(
+            "ExcludableJSONSerializer",
+            lambda queryset: ExcludableJSONSerializer().serialize(
+                queryset, excludes=["something_non_unique"]
+            ),
+            n_items=n_objects,
+            n_repeats=options.repeats,
+            setup=_setup,
+            n_objects=n_objects,
+        )
+
+
+def write_media_fixture(directory, n_objects):
+    """
+    writes a fixture of ExampleMediaModels (& their media files) to directory
+    """
+    app_label = ExampleMediaModel._meta.app_label
+    media_path = os.path.join(directory, "media")
+    os.makedirs(os.path.join(media_path, app_label, "example_media_models"))
+
+    fixture = []
+    for i in range(n_objects):
+        media_name = f"example_media_models/{i}.txt"
+        with open(os.path.join(media_path, app_label, media_name), "w") as fp:
+            fp.write(f"media file {i}\n" * 100)
+        fixture.append({
+            "model": f"{app_label}.examplemediamodel",
+            "fields": {"name": str(i), "media": media_name},
+        })
+
+    fixture_path = os.path.join(directory, "media_fixture.json")
+    with open(fixture_path, "w") as fp:
+        json.dump(fixture, fp)
+
+    return fixture_path, media_path
+
+
+@benchmark
+def benchmark_loaddata(options):
+    for n_objects in [100, 1000]:
+        with tempfile.TemporaryDirectory() as directory:
+            fixture_path, media_path = write_media_fixture(directory, n_objects)
+            yield measure(
+                "loaddata --media",
+                lambda: call_command(
+                    "loaddata",
+                    fixture_path,
+                    "--media",
+                    "--media-path",
+                    media_path,
+                    verbosity=0,
+                ),
+                n_items=n_objects,
+                n_repeats=options.repeats,
+                n_objects=n_objects,
+            )
+
+
+def write_unloadable_fixture(directory, n_objects):
+    """
+    writes a fixture of ExampleUnloadableParentModels (w/ 2 children each),
+    which use natural keys, to directory
+    """
+    app_label = ExampleUnloadableParentModel._meta.app_label
+
+    fixture = []
+    for i in range(n_objects):
+        fixture.append({
+            "model": f"{app_label}.exampleunloadableparentmodel",
+            "fields": {"name": str(i)},
+        })
+        for j in range(2):
+            fixture.append({
+                "model": f"{app_label}.exampleunloadablechildmodel",
+                "fields": {"name": f"{i}.{j}", "parent": [str(i)]},
+            })
+
+    fixture_path = os.path.join(directory, "unloadable_fixture.json")
+    with open(fixture_path, "w") as fp:
+        json.dump(fixture, fp)
+
+    return fixture_path
+
+
+@benchmark
+def benchmark_unloaddata(options):
+    for n_objects in [100, 1000]:
+        with tempfile.TemporaryDirectory() as directory:
+            fixture_path = write_unloadable_fixture(directory, n_objects)
+
+            def _setup():
+                call_command("loaddata", fixture_path, verbosity=0)
+                return ()
+
+            yield measure(
+                "unloaddata",
+                lambda: call_command("unloaddata", fixture_path, verbosity=0),
+                n_items=n_objects * 3,
+                n_repeats=options.repeats,
+                setup=_setup,
+                n_objects=n_objects * 3,
+            )
+
+
+@benchmark
+def benchmark_adapt_geojson_to_django(options):
+    for n_features in [1000, 10000]:
+        geojson = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {"name": str(i)},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[
+                        [x, y] for x, y in [(0, 0), (0, i), (i, i), (i, 0), (0, 0)]
+                    ]],
+                },
+            } for i in range(n_features)],
+        }
+
+        yield measure(
+            "adapt_geojson_to_django",
+            lambda geojson: list(adapt_geojson_to_django(geojson)),
+            n_items=n_features,
+            n_repeats=options.repeats,
+            # (adapt_geojson_to_django modifies geojson in-place)
+            setup=lambda: (copy.deepcopy(geojson), ),
+            n_features=n_features,
+        )
+
+
+###########
+# running #
+###########
+
+
+def get_metadata():
+    try:
+        git_commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        git_commit = None
+
+    return {
+        "astrosat_version": astrosat.__version__,
+        "django_version": django.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "database_vendor": connection.vendor,
+        "git_commit": git_commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare_results(results, baseline_path):
+    with open(baseline_path) as fp:
+        baseline = json.load(fp)
+    baseline_results = {
+        (result["name"], json.dumps(result["params"], sort_keys=True)): result
+        for result in baseline["results"]
+    }
+
+    print(f"\ncompared to {baseline_path} ({baseline['metadata']['git_commit']}):")
+    for result in results:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        if key in baseline_results:
+            ratio = result["best"] / baseline_results[key]["best"]
+            print(f"{key[0]:<24} {key[1]:<32} {ratio:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=BENCHMARKS.keys(),
+        default=list(BENCHMARKS.keys()),
+    )
+    parser.add_argument(
+        "--bulk-sizes",
+        nargs="+",
+        type=int,
+        default=[1000, 10000],
+        help="numbers of rows to run bulk_update_or_create w/",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="location to save results to")
+    parser.add_argument("--compare", help="location of results to compare to")
+    args = parser.parse_args()
+
+    old_database_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        # make sure db logging is enabled...
+        astrosat_settings = AstrosatSettings.load()
+        astrosat_settings.enable_db_logging = True
+        astrosat_settings.save()
+
+        results = []
+        for benchmark_name in args.benchmarks:
+            results.extend(BENCHMARKS[benchmark_name](args))
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({
+                "metadata": get_metadata(), "results": results
+            }, fp, indent=2)
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
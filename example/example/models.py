@@ -65,6 +65,10 @@ class ExampleEpochModel(models.Model):
 
 
 class ExampleUnloadableModelManager(models.Manager):
+
+    # (lets unloaddata look up natural keys in bulk)
+    natural_key_fields = ("name", )
+
     def get_by_natural_key(self, name):
         return self.get(name=name)
 
@@ -4,10 +4,19 @@ import io
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
+from astrosat.mixins import clear_singleton_caches
 from astrosat.models import AstrosatSettings
 from astrosat.tests.factories import UserFactory
 
 
+@pytest.fixture(autouse=True)
+def clear_singletons():
+    # (cached singletons would outlive the test's db transaction)
+    clear_singleton_caches()
+    yield
+    clear_singleton_caches()
+
+
 @pytest.fixture
 def api_client():
     user = UserFactory()
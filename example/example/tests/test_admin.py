@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import logging
+import pytest
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+
+from astrosat.models import DatabaseLogRecord
+
+
+@pytest.fixture
+def log_records(astrosat_settings):
+    # make sure logging is enabled...
+    astrosat_settings.enable_db_logging = True
+    astrosat_settings.save()
+    logger = logging.getLogger("db")
+
+    logger.info("not json", extra={"tags": ["tag1"]})
+    logger.info(
+        json.dumps({"a": 1, "b": {"c": 2}}),
+        extra={"tags": ["tag1", "tag2"]},
+    )
+    logger.error(json.dumps({"a": 3, "d": "x"}))
+
+    return DatabaseLogRecord.objects.all()
+
+
+def read_streaming_csv(response):
+    content = b"".join(response.streaming_content).decode()
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+@pytest.mark.django_db
+class TestDatabaseLogRecordAdmin:
+    def test_export_as_csv(self, log_records):
+
+        model_admin = site._registry[DatabaseLogRecord]
+        request = RequestFactory().get("/")
+
+        response = model_admin.export_as_csv(request, log_records)
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+
+        rows = read_streaming_csv(response)
+        assert len(rows) == 3
+        assert list(rows[0].keys()) == [
+            "record.id",
+            "record.level",
+            "record.created",
+            "record.tags",
+            "record.message",
+            "record.occurrences",
+            "a",
+            "b | c",
+            "d",
+        ]
+
+        rows_by_id = {int(row["record.id"]): row for row in rows}
+        for record in log_records:
+            row = rows_by_id[record.id]
+            assert row["record.message"] == record.message
+            assert row["record.level"] == logging.getLevelName(record.level)
+            for tag in record.tags.all():
+                assert tag.name in row["record.tags"]
+
+        json_row = next(row for row in rows if row["a"] == "1")
+        assert json_row["b | c"] == "2"
+        assert json_row["d"] == ""
+
+    def test_export_as_csv_with_schema(self, log_records, monkeypatch):
+
+        model_admin = site._registry[DatabaseLogRecord]
+        request = RequestFactory().get("/")
+
+        # providing the columns upfront skips the discovery pass...
+        monkeypatch.setattr(model_admin, "export_message_columns", ["d"])
+        monkeypatch.setattr(model_admin, "export_chunk_size", 2)
+
+        response = model_admin.export_as_csv(request, log_records)
+        rows = read_streaming_csv(response)
+        assert len(rows) == 3
+        assert list(rows[0].keys())[-1] == "d"
+        assert "a" not in rows[0]
+        assert sorted(row["d"] for row in rows) == ["", "", "x"]
+
+    def test_export_as_parquet(self, log_records, monkeypatch):
+
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        model_admin = site._registry[DatabaseLogRecord]
+        request = RequestFactory().get("/")
+
+        # each chunk of records is written as a separate row group...
+        monkeypatch.setattr(model_admin, "export_chunk_size", 2)
+
+        response = model_admin.export_as_parquet(request, log_records)
+        content = b"".join(response.streaming_content)
+
+        parquet_file = pq.ParquetFile(io.BytesIO(content))
+        assert parquet_file.metadata.num_rows == 3
+        assert parquet_file.metadata.num_row_groups == 2
+
+        table = parquet_file.read()
+        assert str(table.schema.field("a").type) == "int64"
+        assert str(table.schema.field("b | c").type) == "int64"
+        assert str(table.schema.field("d").type) == "string"
+        assert str(table.schema.field("record.created").type
+                  ).startswith("timestamp")
+
+        rows = table.to_pylist()
+        json_row = next(row for row in rows if row["a"] == 1)
+        assert json_row["b | c"] == 2
+        assert json_row["d"] is None
+        assert sorted(json_row["record.tags"]) == ["tag1", "tag2"]
@@ -1,14 +1,43 @@
 import pytest
+import csv
 import environ
+import json
+import io
+import logging
 import os
+import shutil
+import tarfile
+from types import SimpleNamespace
 
 from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.geos import Point
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.sites.models import Site
 from django.core.management import CommandError, call_command
-
+from django.db import connection, models
+from django.db.models.signals import pre_save
+from django.test.utils import isolate_apps
+
+from astrosat.management.commands.import_geojson import (
+    COPY_NULL,
+    get_copy_fields,
+    get_copy_row,
+    get_model_data,
+)
+from astrosat.management.commands.loaddata import TarMediaSource
 from astrosat.management.commands.update_site import SITE_ENVIRONMENT_VARIABLE
+from astrosat.utils import adapt_geojson_to_django
+
+from astrosat.models import DatabaseLogRecord
 
-from example.models import ExampleUnloadableParentModel, ExampleUnloadableChildModel
+from example.models import (
+    ExampleBulkModel,
+    ExampleMediaModel,
+    ExampleUnloadableParentModel,
+    ExampleUnloadableChildModel,
+    ExampleUnloadableModelManager,
+)
 
 
 @pytest.mark.django_db
@@ -85,6 +114,194 @@ class TestUpdateSite:
         assert site.name == test_domain
 
 
+@pytest.fixture
+def media_fixture(tmp_path, settings):
+    """
+    Writes a fixture of ExampleMediaModels & a directory of their media files,
+    and stores media in a temporary MEDIA_ROOT.
+    """
+    settings.MEDIA_ROOT = str(tmp_path / "storage")
+
+    media_path = tmp_path / "media"
+    (media_path / "example" / "example_media_models").mkdir(parents=True)
+
+    fixture = []
+    for pk, name in enumerate(["one", "two", "three"], start=1):
+        media_name = f"example_media_models/{name}.txt"
+        (media_path / "example" / media_name).write_text(f"{name} content")
+        fixture.append({
+            "model": "example.examplemediamodel",
+            "pk": pk,
+            "fields": {"name": name, "media": media_name},
+        })
+
+    fixture_path = tmp_path / "media_fixture.json"
+    fixture_path.write_text(json.dumps(fixture))
+
+    return str(fixture_path), str(media_path)
+
+
+def read_stored_media(name):
+    with ExampleMediaModel.objects.get(name=name).media.open("r") as fp:
+        return fp.read()
+
+
+@pytest.mark.django_db
+class TestLoadData:
+
+    command_name = "loaddata"
+
+    @pytest.mark.parametrize("archive_format", [None, "zip", "gztar"])
+    def test_load_media(self, media_fixture, archive_format):
+        fixture_path, media_path = media_fixture
+
+        if archive_format:
+            # media archives may (or may not) contain a top-level directory named after the archive...
+            archive_root = "media" if archive_format == "zip" else None
+            media_path = shutil.make_archive(
+                os.path.join(os.path.dirname(media_path), "media"),
+                archive_format,
+                root_dir=os.path.dirname(media_path) if archive_root else media_path,
+                base_dir=archive_root or ".",
+            )
+            shutil.rmtree(os.path.join(os.path.dirname(media_path), "media"))
+
+        call_command(
+            self.command_name,
+            fixture_path,
+            "--media",
+            "--media-path",
+            media_path,
+            "--media-workers",
+            "2",
+        )
+
+        assert ExampleMediaModel.objects.count() == 3
+        for name in ["one", "two", "three"]:
+            assert read_stored_media(name) == f"{name} content"
+
+    def test_tar_media_source_prepare(self, media_fixture, tmp_path):
+        _, media_path = media_fixture
+        archive_path = shutil.make_archive(
+            str(tmp_path / "archive"), "gztar", root_dir=media_path
+        )
+        contents = {
+            f"example/example_media_models/{name}.txt": f"{name} content"
+            for name in ["three", "one", "two"]
+        }
+
+        media_source = TarMediaSource(archive_path)
+        try:
+            # prepared files are read in a single pass, not from the archive...
+            media_source.prepare(contents.keys())
+            media_source.archive.extractfile = None
+            for name, content in contents.items():
+                with media_source.open(name) as fp:
+                    assert fp.read().decode() == content
+        finally:
+            media_source.close()
+        assert not os.path.exists(media_source.extracted_dir.name)
+
+    def test_load_media_errors(self, media_fixture):
+        fixture_path, media_path = media_fixture
+        os.remove(
+            os.path.join(media_path, "example/example_media_models/two.txt")
+        )
+
+        stderr = io.StringIO()
+        call_command(
+            self.command_name,
+            fixture_path,
+            "--media",
+            "--media-path",
+            media_path,
+            stderr=stderr,
+        )
+
+        # a missing file is reported but doesn't stop other files being stored...
+        assert "Error storing 'two.media'" in stderr.getvalue()
+        assert read_stored_media("one") == "one content"
+        assert read_stored_media("three") == "three content"
+
+    @pytest.mark.parametrize(
+        "media_compare, expected_content",
+        [(None, "one content"), ("size", "ONE CONTENT"),
+         ("hash", "one content")],
+    )
+    def test_load_media_compare(
+        self, media_fixture, media_compare, expected_content
+    ):
+        fixture_path, media_path = media_fixture
+
+        options = ["--media", "--media-path", media_path]
+        call_command(self.command_name, fixture_path, *options)
+
+        # change a stored file w/out changing its size...
+        media_file = ExampleMediaModel.objects.get(name="one").media
+        with open(media_file.path, "w") as fp:
+            fp.write("ONE CONTENT")
+
+        if media_compare:
+            options += ["--media-compare", media_compare]
+        stdout = io.StringIO()
+        call_command(self.command_name, fixture_path, *options, stdout=stdout)
+
+        assert read_stored_media("one") == expected_content
+        if media_compare == "size":
+            assert "skipped 3 unchanged" in stdout.getvalue()
+        elif media_compare == "hash":
+            assert "skipped 2 unchanged" in stdout.getvalue()
+
+    def test_load_media_disconnects(self, media_fixture):
+        fixture_path, media_path = media_fixture
+        os.remove(fixture_path)
+
+        receivers = list(pre_save.receivers)
+        with pytest.raises(CommandError):
+            call_command(
+                self.command_name,
+                fixture_path,
+                "--media",
+                "--media-path",
+                media_path,
+            )
+
+        # the media receiver is removed even if loading fails...
+        assert pre_save.receivers == receivers
+
+    def test_load_media_receiver(self, media_fixture, monkeypatch):
+        fixture_path, media_path = media_fixture
+
+        connected_senders = []
+        connect = pre_save.connect
+        monkeypatch.setattr(
+            pre_save,
+            "connect",
+            lambda receiver, sender=None, **kwargs: (
+                connected_senders.append(sender),
+                connect(receiver, sender=sender, **kwargs),
+            ),
+        )
+
+        # a single media receiver handles every model in the fixtures
+        # (w/out reading the fixtures an extra time to work out which)...
+        unloadable_fixture_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "fixtures/unloadable_objects.json"
+        )
+        call_command(
+            self.command_name,
+            unloadable_fixture_path,
+            fixture_path,
+            "--media",
+            "--media-path",
+            media_path,
+        )
+        assert connected_senders == [None]
+        assert ExampleUnloadableParentModel.objects.count() == 2
+        assert read_stored_media("one") == "one content"
+
+
 @pytest.mark.django_db
 class TestUnloadData:
 
@@ -122,3 +339,491 @@ class TestUnloadData:
         )
         assert ExampleUnloadableParentModel.objects.count() == 0
         assert ExampleUnloadableChildModel.objects.count() == 0
+
+    def test_unload_data_in_bulk(
+        self, tmp_path, django_assert_max_num_queries
+    ):
+        fixture = []
+        for i in range(100):
+            fixture.append({
+                "model": "example.exampleunloadableparentmodel",
+                "fields": {"name": str(i)},
+            })
+            fixture.append({
+                "model": "example.exampleunloadablechildmodel",
+                "fields": {"name": f"{i}.child", "parent": [str(i)]},
+            })
+        fixture_path = tmp_path / "bulk_unloadable_objects.json"
+        fixture_path.write_text(json.dumps(fixture))
+        call_command("loaddata", str(fixture_path), verbosity=0)
+
+        # the number of queries doesn't depend on the number of objects...
+        stdout = io.StringIO()
+        with django_assert_max_num_queries(20):
+            call_command(self.command_name, str(fixture_path), stdout=stdout)
+
+        assert ExampleUnloadableParentModel.objects.count() == 0
+        assert ExampleUnloadableChildModel.objects.count() == 0
+        assert "Unloaded 200 object(s) (of 200)" in stdout.getvalue()
+
+    def test_unload_data_already_unloaded(self, tmp_path):
+
+        # explicit pks that no longer exist have already been unloaded...
+        fixture = [{
+            "model": "example.exampleunloadableparentmodel",
+            "pk": pk,
+            "fields": {"name": str(pk)},
+        } for pk in range(1, 4)]
+        fixture_path = tmp_path / "explicit_unloadable_objects.json"
+        fixture_path.write_text(json.dumps(fixture))
+        call_command("loaddata", str(fixture_path), verbosity=0)
+        ExampleUnloadableParentModel.objects.filter(pk=1).delete()
+
+        stdout = io.StringIO()
+        call_command(self.command_name, str(fixture_path), stdout=stdout)
+        assert ExampleUnloadableParentModel.objects.count() == 0
+        assert "Unloaded 2 object(s) (of 3)" in stdout.getvalue()
+
+        # ...so unloading them again is fine
+        call_command(self.command_name, str(fixture_path), verbosity=0)
+
+    def test_unload_data_get_by_natural_key(self, monkeypatch):
+        self.load_data()
+
+        # w/out "natural_key_fields", natural keys are resolved w/ the
+        # manager's "get_by_natural_key"
+        monkeypatch.delattr(ExampleUnloadableModelManager, "natural_key_fields")
+        call_command(self.command_name, self.test_fixture)
+
+        assert ExampleUnloadableParentModel.objects.count() == 0
+        assert ExampleUnloadableChildModel.objects.count() == 0
+
+        with pytest.raises(AssertionError):
+            call_command(self.command_name, self.test_fixture)
+
+    def test_unload_data_dry_run(self, tmp_path):
+        self.load_data()
+
+        # only the parents are unloaded explicitly; the children cascade...
+        with open(self.test_fixture) as fp:
+            parents_fixture = [
+                record for record in json.load(fp)
+                if record["model"] == "example.exampleunloadableparentmodel"
+            ]
+        parents_fixture_path = tmp_path / "unloadable_parents.json"
+        parents_fixture_path.write_text(json.dumps(parents_fixture))
+
+        stdout = io.StringIO()
+        call_command(
+            self.command_name,
+            str(parents_fixture_path),
+            "--dry-run",
+            stdout=stdout
+        )
+
+        assert stdout.getvalue().splitlines() == [
+            "  example.ExampleUnloadableChildModel: 4",
+            "  example.ExampleUnloadableParentModel: 2",
+            "Would unload 6 object(s) (of 2) from 1 fixture(s)",
+        ]
+        assert ExampleUnloadableParentModel.objects.count() == 2
+        assert ExampleUnloadableChildModel.objects.count() == 4
+
+        # children in the fixture that also cascade from their parents are
+        # only counted once...
+        stdout = io.StringIO()
+        call_command(
+            self.command_name, self.test_fixture, "--dry-run", stdout=stdout
+        )
+        assert stdout.getvalue().splitlines() == [
+            "  example.ExampleUnloadableChildModel: 4",
+            "  example.ExampleUnloadableParentModel: 2",
+            "Would unload 6 object(s) (of 6) from 1 fixture(s)",
+        ]
+        assert ExampleUnloadableChildModel.objects.count() == 4
+
+
+@pytest.mark.django_db
+class TestExportLogRecords:
+
+    command_name = "export_log_records"
+
+    @pytest.fixture(autouse=True)
+    def log_records(self, astrosat_settings):
+        astrosat_settings.enable_db_logging = True
+        astrosat_settings.save()
+        logger = logging.getLogger("db")
+        logger.info(json.dumps({"a": 1}), extra={"tags": ["tag1"]})
+        logger.info(json.dumps({"a": 2.5, "b": True}), extra={"tags": ["tag2"]})
+        logger.info("not json")
+
+    def test_export_log_records_csv(self, tmpdir):
+
+        output_path = os.path.join(tmpdir, "logs.csv")
+        call_command(self.command_name, output_path=output_path, chunk_size=2)
+
+        with open(output_path, "r") as fp:
+            rows = list(csv.DictReader(fp))
+        assert len(rows) == DatabaseLogRecord.objects.count()
+        assert sorted(row["a"] for row in rows) == ["", "1", "2.5"]
+
+        call_command(
+            self.command_name,
+            output_path=output_path,
+            tags=["tag1"],
+            chunk_size=2,
+        )
+        with open(output_path, "r") as fp:
+            rows = list(csv.DictReader(fp))
+        assert len(rows) == 1
+        assert "b" not in rows[0]
+
+    def test_export_log_records_parquet(self, tmpdir):
+
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        output_path = os.path.join(tmpdir, "logs.parquet")
+        call_command(self.command_name, output_path=output_path, chunk_size=2)
+
+        table = pq.read_table(output_path)
+        assert table.num_rows == DatabaseLogRecord.objects.count()
+        assert str(table.schema.field("a").type) == "double"
+        assert str(table.schema.field("b").type) == "bool"
+
+    def test_export_log_records_unknown_format(self, tmpdir):
+
+        with pytest.raises(CommandError):
+            call_command(
+                self.command_name, output_path=os.path.join(tmpdir, "logs.txt")
+            )
+
+
+@pytest.fixture
+def geojson_path(tmp_path):
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "properties": {"name": "one", "value": 1.5},
+            "geometry": {"type": "Point", "coordinates": [0, 0]},
+        }, {
+            "type": "Feature",
+            "properties": {"name": "two", "other": {"a": [1, 2]}},
+            "geometry": {"type": "Point", "coordinates": [1, 1]},
+        }],
+    }
+    path = tmp_path / "features.geojson"
+    path.write_text(json.dumps(geojson))
+    return str(path)
+
+
+class TestGeoJSONToCSV:
+
+    command_name = "geojson_to_csv"
+
+    def test_stream(self, geojson_path, tmp_path):
+
+        pytest.importorskip("ijson")
+
+        output_path = str(tmp_path / "features.csv")
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--output",
+            output_path,
+            "--stream",
+        )
+
+        with open(output_path, "r") as fp:
+            rows = list(csv.reader(fp))
+        assert rows == [
+            ["name", "value", "other"],
+            ["one", "1.5", ""],
+            ["two", "", '{"a": [1, 2]}'],
+        ]
+
+    def test_stream_columns(self, geojson_path, tmp_path):
+
+        pytest.importorskip("ijson")
+
+        output_path = str(tmp_path / "features.csv")
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--output",
+            output_path,
+            "--stream",
+            "--index",
+            "--columns",
+            "value",
+            "name",
+        )
+
+        with open(output_path, "r") as fp:
+            rows = list(csv.reader(fp))
+        assert rows == [["", "value", "name"], ["0", "1.5", "one"],
+                        ["1", "", "two"]]
+
+    def test_columns(self, geojson_path, tmp_path):
+
+        pytest.importorskip("geopandas")
+
+        output_path = str(tmp_path / "features.csv")
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--output",
+            output_path,
+            "--columns",
+            "value",
+            "name",
+        )
+
+        with open(output_path, "r") as fp:
+            rows = list(csv.reader(fp))
+        assert rows == [["value", "name"], ["1.5", "one"], ["", "two"]]
+
+    def test_multiple_files(self, geojson_path, tmp_path):
+
+        pytest.importorskip("ijson")
+        pq = pytest.importorskip("pyarrow.parquet")
+        shapely_wkb = pytest.importorskip("shapely.wkb")
+
+        input_dir = os.path.dirname(geojson_path)
+        shutil.copy(geojson_path, os.path.join(input_dir, "more.geojson"))
+        output_dir = str(tmp_path / "output")
+
+        stdout = io.StringIO()
+        call_command(
+            self.command_name,
+            "--input",
+            input_dir,
+            "--output",
+            output_dir,
+            "--format",
+            "parquet",
+            "--geometry",
+            "wkb",
+            "--stream",
+            "--workers",
+            "2",
+            stdout=stdout,
+        )
+
+        # each file's conversion is timed...
+        assert stdout.getvalue().count("Converted 2 feature(s) from") == 2
+        assert "Converted 2 file(s)" in stdout.getvalue()
+
+        for name in ["features", "more"]:
+            table = pq.read_table(os.path.join(output_dir, f"{name}.parquet"))
+            assert table.column_names == ["name", "value", "other", "geometry"]
+            assert str(table.schema.field("value").type) == "double"
+            assert json.loads(table.schema.metadata[b"geo"]
+                             )["primary_column"] == "geometry"
+            assert shapely_wkb.loads(
+                table.column("geometry")[1].as_py()
+            ).wkt == "POINT (1 1)"
+
+    def test_duplicate_output_paths(self, geojson_path, tmp_path):
+
+        other_dir = tmp_path / "other"
+        other_dir.mkdir()
+        shutil.copy(geojson_path, str(other_dir / "features.geojson"))
+        output_dir = tmp_path / "output"
+
+        # files w/ the same name in different directories can't be converted
+        # to the same output directory...
+        with pytest.raises(CommandError, match="same output file"):
+            call_command(
+                self.command_name,
+                "--input",
+                geojson_path,
+                str(other_dir),
+                "--output",
+                str(output_dir),
+            )
+        assert not output_dir.exists()
+
+    def test_geometry_wkt(self, geojson_path, tmp_path):
+
+        pytest.importorskip("ijson")
+        pytest.importorskip("shapely")
+
+        output_path = str(tmp_path / "features.csv")
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--output",
+            output_path,
+            "--stream",
+            "--columns",
+            "name",
+            "--geometry",
+            "wkt",
+        )
+
+        with open(output_path, "r") as fp:
+            rows = list(csv.reader(fp))
+        assert rows == [["name", "geometry"], ["one", "POINT (0 0)"],
+                        ["two", "POINT (1 1)"]]
+
+
+@pytest.mark.django_db
+class TestImportGeoJSON:
+
+    command_name = "import_geojson"
+
+    def test_import(self, geojson_path):
+
+        pytest.importorskip("ijson")
+
+        stdout = io.StringIO()
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--model",
+            "example.ExampleBulkModel",
+            "--map",
+            "name=something_unique",
+            "value=something_non_unique",
+            "--batch-size",
+            "1",
+            stdout=stdout,
+        )
+
+        assert "Imported 2 feature(s) into example.ExampleBulkModel" in \
+            stdout.getvalue()
+        assert sorted(
+            ExampleBulkModel.objects.values_list(
+                "something_unique", "something_non_unique"
+            )
+        ) == [("one", "1.5"), ("two", "")]
+
+    def test_import_update_or_create(self, geojson_path):
+
+        pytest.importorskip("ijson")
+
+        ExampleBulkModel.objects.create(
+            something_unique="one", something_non_unique="old"
+        )
+        call_command(
+            self.command_name,
+            "--input",
+            geojson_path,
+            "--model",
+            "example.ExampleBulkModel",
+            "--map",
+            "name=something_unique",
+            "value=something_non_unique",
+            "--method",
+            "update_or_create",
+        )
+
+        assert ExampleBulkModel.objects.get(
+            something_unique="one"
+        ).something_non_unique == "1.5"
+        assert ExampleBulkModel.objects.count() == 2
+
+    def test_import_errors(self, geojson_path):
+
+        with pytest.raises(CommandError, match="no field named 'invalid'"):
+            call_command(
+                self.command_name,
+                "--input",
+                geojson_path,
+                "--model",
+                "example.ExampleBulkModel",
+                "--map",
+                "name=invalid",
+            )
+
+        # (the test database isn't PostgreSQL)
+        with pytest.raises(CommandError, match="requires PostgreSQL"):
+            call_command(
+                self.command_name,
+                "--input",
+                geojson_path,
+                "--model",
+                "example.ExampleBulkModel",
+                "--method",
+                "copy",
+            )
+
+    def test_get_model_data(self):
+
+        (fields, ) = adapt_geojson_to_django({
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {"name": "one", "ignored": True},
+                "geometry": {"type": "Point", "coordinates": [0, 0]},
+            }]
+        }, geometry_field_name="shape")
+
+        # properties are renamed & geometries are transformed...
+        model_data = get_model_data(
+            fields,
+            {"name": "something_unique"},
+            geometry_field_name="shape",
+            srid=3857,
+        )
+        assert model_data["something_unique"] == "one"
+        assert "ignored" not in model_data
+        assert model_data["shape"].srid == 3857
+        assert model_data["shape"].coords == pytest.approx((0, 0))
+
+    @isolate_apps("example")
+    def test_get_copy_fields(self):
+        class ImplicitPkModel(models.Model):
+            name = models.CharField(max_length=255)
+
+        class ExplicitPkModel(models.Model):
+            id = models.BigAutoField(primary_key=True)
+            name = models.CharField(max_length=255)
+
+        class NonAutoPkModel(models.Model):
+            code = models.CharField(max_length=255, primary_key=True)
+            name = models.CharField(max_length=255)
+
+        # auto-incrementing pks are left for the db to generate...
+        assert [field.name for field in get_copy_fields(ImplicitPkModel)
+               ] == ["name"]
+        assert [field.name for field in get_copy_fields(ExplicitPkModel)
+               ] == ["name"]
+        # ...but other pks are copied
+        assert [field.name for field in get_copy_fields(NonAutoPkModel)
+               ] == ["code", "name"]
+
+    def test_get_copy_row(self):
+
+        fields = {
+            "shape": PointField(srid=3857, null=True),
+            "name": models.CharField(max_length=255),
+            "tags": ArrayField(models.CharField(max_length=255, null=True)),
+            "blob": models.BinaryField(null=True),
+            "missing": models.CharField(max_length=255, null=True),
+        }
+        for field_name, field in fields.items():
+            field.set_attributes_from_name(field_name)
+        shape = Point(1, 2, srid=3857)
+        obj = SimpleNamespace(
+            shape=shape,
+            name="one",
+            tags=["a", 'b "c"', None],
+            blob=b"\x01\x02",
+            missing=None,
+        )
+
+        # geometries are EWKB, lists are PostgreSQL arrays, & bytes are hex...
+        assert get_copy_row(obj, fields.values(), connection) == [
+            shape.hexewkb.decode(),
+            "one",
+            '{"a","b \\"c\\"",NULL}',
+            "\\x0102",
+            COPY_NULL,
+        ]
@@ -0,0 +1,164 @@
+import logging
+import os
+import pstats
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from astrosat.middleware import ProfilingMiddleware, QueryTrackingMiddleware
+from astrosat.tests.factories import UserFactory
+
+
+def example_view(request):
+    return HttpResponse(sum(range(1000)))
+
+
+@pytest.fixture
+def profiling_middleware(tmp_path):
+    def _get_response(request):
+        request.resolver_match = resolve("/api/logs/")
+        return example_view(request)
+
+    middleware = ProfilingMiddleware(_get_response)
+    middleware.profile_dir = str(tmp_path)
+    return middleware
+
+
+def make_request(path="/api/logs/", user=None):
+    request = RequestFactory().get(path)
+    request.user = user or AnonymousUser()
+    return request
+
+
+def get_profile_paths(directory):
+    return sorted(
+        path for path in os.listdir(directory) if path.endswith(".prof") and
+        not path.endswith(ProfilingMiddleware.AGGREGATE_SUFFIX)
+    )
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+    def test_query_parameter(self, profiling_middleware, settings):
+
+        settings.DEBUG = False
+        profile_dir = profiling_middleware.profile_dir
+
+        profiling_middleware(make_request())
+        profiling_middleware(make_request("/api/logs/?profile"))
+        assert get_profile_paths(profile_dir) == []
+
+        superuser = UserFactory(is_superuser=True)
+        response = profiling_middleware(
+            make_request("/api/logs/?profile", user=superuser)
+        )
+        assert response.status_code == 200
+        assert len(get_profile_paths(profile_dir)) == 1
+
+    def test_sample_rate(self, profiling_middleware):
+
+        profiling_middleware.sample_rate = 2
+        for _ in range(6):
+            profiling_middleware(make_request())
+
+        assert len(get_profile_paths(profiling_middleware.profile_dir)) == 3
+
+    def test_rotation(self, profiling_middleware):
+
+        profiling_middleware.sample_rate = 1
+        profiling_middleware.max_files = 2
+        for _ in range(5):
+            profiling_middleware(make_request())
+
+        assert len(get_profile_paths(profiling_middleware.profile_dir)) == 2
+
+    def test_aggregation(self, profiling_middleware):
+
+        profiling_middleware.sample_rate = 1
+        for _ in range(3):
+            profiling_middleware(make_request())
+
+        url_name = resolve("/api/logs/").view_name
+        aggregate_path = os.path.join(
+            profiling_middleware.profile_dir,
+            url_name + ProfilingMiddleware.AGGREGATE_SUFFIX
+        )
+        assert os.path.exists(aggregate_path)
+
+        stats = pstats.Stats(aggregate_path)
+        (n_calls, *_) = next(
+            value for key, value in stats.stats.items()
+            if key[2] == "example_view"
+        )
+        assert n_calls == 3
+
+    def test_save_profile_errors(self, profiling_middleware, caplog):
+
+        profiling_middleware.sample_rate = 1
+        # (a file where the profile dir should be means profiles can't be saved)
+        with open(os.path.join(profiling_middleware.profile_dir, "file"), "w"):
+            pass
+        profiling_middleware.profile_dir = os.path.join(
+            profiling_middleware.profile_dir, "file"
+        )
+
+        # the response is still returned (& the error is logged)...
+        with caplog.at_level(logging.ERROR, logger="astrosat.middleware"):
+            response = profiling_middleware(make_request())
+        assert response.status_code == 200
+        assert "Error saving the profile of /api/logs/" in caplog.text
+
+        # ...and the view's own exceptions aren't replaced
+        def _get_response(request):
+            raise ValueError("view error")
+
+        profiling_middleware.get_response = _get_response
+        with pytest.raises(ValueError, match="view error"):
+            profiling_middleware(make_request())
+
+
+@pytest.mark.django_db
+class TestQueryTrackingMiddleware:
+    def test_n_plus_one_warning(self, caplog, settings):
+
+        settings.DEBUG = False
+        users = UserFactory.create_batch(5)
+
+        def _get_response(request):
+            for user in users + users[:1]:
+                get_user_model().objects.get(pk=user.pk)
+            return HttpResponse()
+
+        middleware = QueryTrackingMiddleware(_get_response)
+        with caplog.at_level(logging.WARNING, logger="astrosat.middleware"):
+            response = middleware(make_request())
+
+        (log_record, ) = caplog.records
+        assert log_record.query_results["n_queries"] == 6
+        assert len(log_record.query_results["n_plus_one_queries"]) == 1
+
+        # query params aren't logged...
+        (duplicate_query, ) = log_record.query_results["duplicate_queries"]
+        assert "params" not in duplicate_query
+
+        # only allowed requests get query headers...
+        assert QueryTrackingMiddleware.QUERY_COUNT_HEADER not in response
+
+    def test_headers(self, caplog):
+
+        superuser = UserFactory(is_superuser=True)
+
+        def _get_response(request):
+            get_user_model().objects.count()
+            return HttpResponse()
+
+        middleware = QueryTrackingMiddleware(_get_response)
+        response = middleware(make_request(user=superuser))
+
+        assert caplog.records == []
+        assert response[QueryTrackingMiddleware.QUERY_COUNT_HEADER] == "1"
+        assert float(response[QueryTrackingMiddleware.QUERY_TIME_HEADER]) > 0
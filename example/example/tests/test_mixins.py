@@ -1,6 +1,15 @@
+import io
 import pytest
-from django.db import models
-from example.models import ExampleSingletonModel
+import threading
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, models
+from django.db.models.deletion import Collector
+from django.test.utils import CaptureQueriesContext
+
+from astrosat.conf import app_settings
+from example.models import ExampleHashableModel, ExampleSingletonModel
 from . import factories
 
 
@@ -34,6 +43,119 @@ class TestHashable:
         assert test_model.has_hash_source_changed(old_name.encode()) is False
         assert test_model.has_hash_source_changed(new_name.encode()) is True
 
+        # computed hashes can be compared w/ stored hashes...
+        assert test_model.hash == test_model.compute_hash(old_name.encode())
+        assert test_model._hash == test_model.compute_hash_uuid(
+            old_name.encode()
+        )
+
+    @pytest.mark.parametrize("hash_algorithm", ["md5", "blake2b", "xxhash"])
+    def test_hash_streaming(self, hash_algorithm, monkeypatch):
+
+        if hash_algorithm == "xxhash":
+            pytest.importorskip("xxhash")
+        monkeypatch.setattr(
+            ExampleHashableModel, "hash_algorithm", hash_algorithm
+        )
+
+        # bytes, file-like objects & iterables of chunks have the same hash...
+        data = b"some data" * 1000
+        hash_value = ExampleHashableModel.compute_hash(data)
+        assert ExampleHashableModel.compute_hash(io.BytesIO(data)) == hash_value
+        assert ExampleHashableModel.compute_hash(
+            data[i:i + 100] for i in range(0, len(data), 100)
+        ) == hash_value
+
+        test_model = factories.ExampleHashableModelFactory(name="name")
+        assert test_model.has_hash_source_changed(b"name") is False
+        assert test_model.has_hash_source_changed([b"na", b"me"]) is False
+        assert test_model.has_hash_source_changed(b"other name") is True
+
+    def test_get_changed_hash_sources(self, django_assert_num_queries):
+
+        test_models = [
+            factories.ExampleHashableModelFactory(name=name)
+            for name in ["one", "two", "three"]
+        ]
+        hash_sources = {
+            test_models[0].pk: b"one",
+            test_models[1].pk: b"changed",
+            test_models[2].pk: b"three",
+            -1: b"new",
+        }
+        with django_assert_num_queries(1):
+            changed_pks = ExampleHashableModel.objects.get_changed_hash_sources(
+                hash_sources
+            )
+        assert changed_pks == [test_models[1].pk, -1]
+
+        assert ExampleHashableModel.objects.get_changed_hash_sources(
+            {"two": b"two", "three": b"changed"}, field_name="name"
+        ) == ["three"]
+
+    @pytest.mark.parametrize("hash_workers", [None, 4])
+    def test_bulk_hashes(self, hash_workers):
+
+        ExampleHashableModel.objects.bulk_create(
+            [ExampleHashableModel(name=str(i)) for i in range(10)],
+            hash_workers=hash_workers,
+        )
+        test_models = list(ExampleHashableModel.objects.all())
+        for test_model in test_models:
+            assert test_model.has_hash_source_changed(
+                test_model.name.encode()
+            ) is False
+
+        for test_model in test_models:
+            test_model.name += " changed"
+        ExampleHashableModel.objects.bulk_update(
+            test_models, ["name"], hash_workers=hash_workers
+        )
+        for test_model in ExampleHashableModel.objects.all():
+            assert test_model.name.endswith(" changed")
+            assert test_model.has_hash_source_changed(
+                test_model.name.encode()
+            ) is False
+
+    def test_bulk_hashes_close_connections(self, monkeypatch):
+
+        # db connections opened by pool threads are closed...
+        closing_threads = set()
+        monkeypatch.setattr(
+            "astrosat.mixins.connections.close_all",
+            lambda: closing_threads.add(threading.get_ident()),
+        )
+        ExampleHashableModel.objects.compute_hashes(
+            [ExampleHashableModel(name=str(i)) for i in range(10)], workers=4
+        )
+        assert closing_threads
+        assert threading.get_ident() not in closing_threads
+
+    def test_recompute_hashes(self):
+
+        factories.ExampleHashableModelFactory.create_batch(5)
+        # (update doesn't call save, so hashes become stale)
+        ExampleHashableModel.objects.filter(
+            pk__in=ExampleHashableModel.objects.order_by("pk")[:2].values("pk")
+        ).update(name="changed")
+
+        stdout = io.StringIO()
+        call_command(
+            "recompute_hashes",
+            "--model",
+            "example.ExampleHashableModel",
+            "--chunk-size",
+            "2",
+            stdout=stdout,
+        )
+
+        assert "5 example.ExampleHashableModel object(s); 2 changed" in \
+            stdout.getvalue()
+        for test_model in ExampleHashableModel.objects.all():
+            assert test_model.has_hash_source_changed(
+                test_model.name.encode()
+            ) is False
+
 
 @pytest.mark.django_db
 class TestSingleton:
@@ -49,3 +171,97 @@ class TestSingleton:
         assert number_of_singletons == 1
         assert singleton2.id == None
         assert singleton.id != None
+
+    def test_save_does_not_count(self):
+
+        singleton = ExampleSingletonModel(name="valeria")
+        with CaptureQueriesContext(connection) as queries:
+            singleton.save()
+            ExampleSingletonModel(name="test2").save()
+        assert not any("COUNT" in query["sql"] for query in queries)
+        assert singleton.pk == 1
+
+        with pytest.raises(ValidationError):
+            ExampleSingletonModel(name="test3").clean()
+
+    def test_load_is_cached(self, django_assert_num_queries):
+
+        singleton = ExampleSingletonModel.load()
+        with django_assert_num_queries(0):
+            assert ExampleSingletonModel.load() == singleton
+
+        # changes to a loaded instance don't affect the cache...
+        singleton.name = "changed"
+        assert ExampleSingletonModel.load().name == ""
+
+        # ...until it is saved
+        singleton.save()
+        with django_assert_num_queries(1):
+            assert ExampleSingletonModel.load().name == "changed"
+
+        singleton.delete()
+        assert ExampleSingletonModel.load().name == ""
+
+    def test_load_not_cached(self, monkeypatch, django_assert_num_queries):
+
+        monkeypatch.setattr(app_settings, "ASTROSAT_SINGLETON_CACHE_TIMEOUT", 0)
+
+        ExampleSingletonModel.load()
+        with django_assert_num_queries(1):
+            ExampleSingletonModel.load()
+
+    def test_load_shared_cache(
+        self, monkeypatch, settings, django_assert_num_queries
+    ):
+
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            },
+            "singletons": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "singletons",
+            },
+        }
+        monkeypatch.setattr(
+            app_settings, "ASTROSAT_SINGLETON_CACHE", "singletons"
+        )
+
+        try:
+            singleton = ExampleSingletonModel.load()
+            with django_assert_num_queries(0):
+                assert ExampleSingletonModel.load() == singleton
+
+            singleton.name = "changed"
+            singleton.save()
+            assert ExampleSingletonModel.load().name == "changed"
+        finally:
+            # (locmem caches outlive the settings, so clear it for other tests)
+            caches["singletons"].clear()
+
+    def test_other_models_fast_delete(self):
+
+        # clearing singleton caches doesn't stop other models being "fast deleted"...
+        collector = Collector(using="default")
+        assert collector.can_fast_delete(ExampleHashableModel.objects.all())
+        assert not collector.can_fast_delete(ExampleSingletonModel.objects.all())
+
+    def test_save_raises_other_errors(self):
+
+        # only an existing instance is silently ignored...
+        singleton = ExampleSingletonModel(name=None)
+        with pytest.raises(IntegrityError):
+            singleton.save()
+        assert singleton.pk is None
+        assert not ExampleSingletonModel.objects.exists()
+
+    def test_save_existing_instance_w_other_pk(self):
+
+        # ...including one that doesn't have pk=1
+        ExampleSingletonModel.objects.bulk_create([
+            ExampleSingletonModel(pk=5, name="old")
+        ])
+        singleton = ExampleSingletonModel(name="new")
+        singleton.save()
+        assert singleton.pk is None
+        assert list(ExampleSingletonModel.objects.values_list("pk", flat=True)) == [5]
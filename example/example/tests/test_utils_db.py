@@ -2,6 +2,9 @@ import factory
 import pytest
 from time import time
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from astrosat.tests.factories import UserFactory
 from astrosat.utils import bulk_update_or_create
 
@@ -201,6 +204,37 @@ class TestBulkUpdateOrCreate:
             ).something_non_unique != "passes"
         )
 
+    def test_many_objects(self):
+
+        # more objects than can be looked up in a single query
+        n_objects = connection.features.max_query_params + 1
+        test_data = [{
+            "something_unique": f"thing {i}",
+            "something_non_unique": "created"
+        } for i in range(n_objects)]
+        bulk_update_or_create(ExampleBulkModel, test_data[:-1])
+
+        for data in test_data:
+            data["something_non_unique"] = "updated"
+
+        with CaptureQueriesContext(connection) as context:
+            created, updated = bulk_update_or_create(
+                ExampleBulkModel, test_data
+            )
+            assert len(created) == 1
+            assert len(updated) == n_objects - 1
+
+        lookup_queries = [
+            query for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        assert len(lookup_queries) > 1
+
+        assert ExampleBulkModel.objects.count() == n_objects
+        assert ExampleBulkModel.objects.filter(
+            something_non_unique="updated"
+        ).count() == n_objects
+
     def test_invalid_data(self):
 
         # this is invalid data b/c it is missing the unique fields
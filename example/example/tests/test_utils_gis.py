@@ -0,0 +1,87 @@
+import json
+import pytest
+
+from django.contrib.gis.geos import GEOSGeometry
+
+from astrosat.utils import adapt_geojson_to_django, build_geos_geometry
+
+GEOMETRIES = [
+    {"type": "Point", "coordinates": [1.5, 2]},
+    {"type": "Point", "coordinates": [1, 2, 3]},
+    {"type": "LineString", "coordinates": [[0, 0], [1, 1], [2, 0]]},
+    {
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [0, 10], [10, 10], [10, 0], [0, 0]],
+            [[1, 1], [1, 2], [2, 2], [1, 1]],
+        ],
+    },
+    {"type": "MultiPoint", "coordinates": [[0, 0], [1, 1]]},
+    {"type": "MultiLineString", "coordinates": [[[0, 0], [1, 1]], [[2, 2], [3, 3]]]},
+    {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[[0, 0], [0, 1], [1, 1], [0, 0]]],
+            [[[5, 5], [5, 6], [6, 6], [5, 5]]],
+        ],
+    },
+    {
+        "type": "GeometryCollection",
+        "geometries": [
+            {"type": "Point", "coordinates": [0, 0]},
+            {"type": "LineString", "coordinates": [[0, 0], [1, 1]]},
+        ],
+    },
+    # (geometries w/ mixed dimensions are parsed as JSON)
+    {"type": "MultiPoint", "coordinates": [[0, 0], [1, 1, 5]]},
+    {"type": "LineString", "coordinates": [[0, 0, 0], [1, 1, 1, 1], [2, 2]]},
+    {
+        "type": "GeometryCollection",
+        "geometries": [
+            {"type": "Point", "coordinates": [0, 0]},
+            {"type": "LineString", "coordinates": [[0, 0, 1], [1, 1, 2]]},
+        ],
+    },
+]  # yapf: disable
+
+
+@pytest.mark.parametrize(
+    "geometry", GEOMETRIES, ids=lambda geometry: geometry["type"]
+)
+def test_build_geos_geometry(geometry):
+
+    # building geometries from coordinates is the same as parsing them...
+    expected_geometry = GEOSGeometry(json.dumps(geometry))
+    geos_geometry = build_geos_geometry(geometry)
+    assert geos_geometry.srid == expected_geometry.srid == 4326
+    assert geos_geometry.wkt == expected_geometry.wkt
+
+
+def test_adapt_geojson_to_django():
+
+    features = [{
+        "type": "Feature",
+        "properties": {"name": str(i)},
+        "geometry": geometry,
+    } for i, geometry in enumerate(GEOMETRIES)]
+
+    # a FeatureCollection...
+    adapted_features = list(
+        adapt_geojson_to_django({
+            "type": "FeatureCollection", "features": features
+        })
+    )
+    assert [feature["name"] for feature in adapted_features] == [
+        str(i) for i in range(len(GEOMETRIES))
+    ]
+    assert all(
+        isinstance(feature["geometry"], GEOSGeometry)
+        for feature in adapted_features
+    )
+
+    # ...or a stream of features can be adapted
+    adapted_features = list(
+        adapt_geojson_to_django(iter(features), geometry_field_name="shape")
+    )
+    assert len(adapted_features) == len(GEOMETRIES)
+    assert all("shape" in feature for feature in adapted_features)
@@ -1,12 +1,30 @@
 import datetime
+import json
 import logging
 import pytest
+import random
+import socket
+import threading
+import time
+from types import SimpleNamespace
 
 from django.urls import resolve, reverse
 
 from rest_framework import status
 
+from astrosat.conf import app_settings
 from astrosat.models import DatabaseLogRecord, DatabaseLogTag
+from astrosat.tests.utils import mock_logstash_server
+from astrosat.utils import (
+    AstrosatAppTCPLogstashLogHandler,
+    DatabaseLogHandler,
+    ElasticsearchDocumentLogFormatter,
+    RestrictLogsByNameFilter,
+    get_json_codec,
+    metrics_registry,
+)
+from astrosat.utils.utils_json import StdlibJSONCodec
+from astrosat.utils.utils_logging import DB_LOG_RECORDS_METRIC
 from .factories import *
 
 
@@ -50,3 +68,324 @@ def test_logging(astrosat_settings):
     assert log_record.level == logging.DEBUG
     assert log_record.message == "test3"
     assert len(tags) == 2
+
+
+@pytest.mark.parametrize("codec_name", ["json", "orjson"])
+def test_elasticsearch_formatter_codecs(codec_name):
+
+    if codec_name == "orjson":
+        pytest.importorskip("orjson")
+
+    codec = get_json_codec(codec_name)
+    assert codec.loads(codec.dumps({"a": [1, 2]})) == {"a": [1, 2]}
+    assert codec.loads(codec.dumpb({"a": [1, 2]})) == {"a": [1, 2]}
+
+    formatter = ElasticsearchDocumentLogFormatter(
+        constant_fields={"app": "test"}, json_codec=codec
+    )
+    record = logging.LogRecord(
+        "test", logging.INFO, __file__, 0, json.dumps({"key": "value"}), None,
+        None
+    )
+    formatted_record = formatter.format(record)
+
+    assert isinstance(formatted_record, bytes)
+    document = json.loads(formatted_record)
+    assert document["key"] == "value"
+    assert document["app"] == "test"
+    assert document["@version"] == 1
+    assert "@timestamp" in document
+
+
+def test_json_codec_setting(monkeypatch):
+
+    # changes to the setting take effect...
+    monkeypatch.setattr(app_settings, "ASTROSAT_JSON_CODEC", "json")
+    assert isinstance(get_json_codec(), StdlibJSONCodec)
+    monkeypatch.setattr(
+        app_settings, "ASTROSAT_JSON_CODEC", f"{__name__}.CustomJSONCodec"
+    )
+    assert isinstance(get_json_codec(), CustomJSONCodec)
+
+    # ...but codecs are only created once
+    assert get_json_codec() is get_json_codec()
+
+
+class CustomJSONCodec(StdlibJSONCodec):
+    name = "custom"
+
+
+def make_log_record(name, level_name, msg="test"):
+    return logging.LogRecord(
+        name, logging.getLevelName(level_name), __file__, 0, msg, None, None
+    )
+
+
+def make_json_log_record(**content):
+    return make_log_record("test", "INFO", msg=json.dumps(content))
+
+
+class TestAstrosatAppTCPLogstashLogHandler:
+
+    handler_kwargs = {
+        "app": "test_app",
+        "instance": "test_instance",
+        "environment": "test_environment",
+    }
+
+    def test_send_batches(self, mock_logstash_server):
+
+        handler = AstrosatAppTCPLogstashLogHandler(
+            mock_logstash_server.host,
+            mock_logstash_server.port,
+            batch_size=10,
+            flush_interval=0.01,
+            **self.handler_kwargs,
+        )
+        try:
+            for i in range(25):
+                handler.handle(make_json_log_record(i=i))
+            handler.flush(timeout=5)
+            documents = mock_logstash_server.wait_for_documents(25)
+        finally:
+            handler.close()
+
+        assert sorted(document["i"] for document in documents
+                     ) == list(range(25))
+        assert all(document["app"] == "test_app" for document in documents)
+        assert handler.stats == {
+            "queued": 0, "sent": 25, "dropped": 0, "overflowed": 0
+        }
+
+    def test_blocking(self, mock_logstash_server):
+
+        handler = AstrosatAppTCPLogstashLogHandler(
+            mock_logstash_server.host,
+            mock_logstash_server.port,
+            blocking=True,
+            **self.handler_kwargs,
+        )
+        try:
+            handler.handle(make_json_log_record(i=0))
+            documents = mock_logstash_server.wait_for_documents(1)
+        finally:
+            handler.close()
+
+        assert handler.sender_thread is None
+        assert len(documents) == 1
+
+    def test_close(self, mock_logstash_server):
+
+        handler = AstrosatAppTCPLogstashLogHandler(
+            mock_logstash_server.host,
+            mock_logstash_server.port,
+            flush_interval=0.01,
+            **self.handler_kwargs,
+        )
+
+        # make sending a batch take a while...
+        sending = threading.Event()
+        may_finish_sending = threading.Event()
+
+        def _send_batch(batch):
+            sending.set()
+            return may_finish_sending.wait(5)
+
+        handler.send_batch = _send_batch
+        closed_sockets = []
+        handler.sock = SimpleNamespace(
+            close=lambda: closed_sockets.append(True)
+        )
+
+        handler.handle(make_json_log_record(i=0))
+        assert sending.wait(5)
+        sender_thread = handler.sender_thread
+
+        # the socket isn't closed while the sender is still using it...
+        handler.close(timeout=0.01)
+        assert sender_thread.is_alive()
+        assert closed_sockets == []
+
+        # ...but it is once the sender stops
+        may_finish_sending.set()
+        sender_thread.join(5)
+        assert closed_sockets == [True]
+        assert handler.stats["sent"] == 1
+
+        # nothing is emitted (& the sender isn't restarted) after closing...
+        handler.handle(make_json_log_record(i=1))
+        assert handler.stats["queued"] == 0
+        assert handler.sender_thread is sender_thread
+
+    def test_unreachable(self):
+
+        # find a port that nothing is listening on...
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            host, port = sock.getsockname()
+
+        handler = AstrosatAppTCPLogstashLogHandler(
+            host,
+            port,
+            queue_size=5,
+            batch_size=5,
+            flush_interval=0.01,
+            max_retries=1,
+            **self.handler_kwargs,
+        )
+        handler.retryStart = 0.01
+        try:
+            t = time.monotonic()
+            for i in range(100):
+                handler.handle(make_json_log_record(i=i))
+            # logging doesn't block even though logstash is unreachable...
+            assert time.monotonic() - t < 1
+            handler.flush(timeout=5)
+        finally:
+            handler.close()
+
+        stats = handler.stats
+        assert stats["sent"] == 0
+        assert stats["overflowed"] > 0
+        assert stats["dropped"] > 0
+        assert stats["overflowed"] + stats["dropped"] == 100
+
+
+class TestRestrictLogsByNameFilter:
+    def test_requires_restrictions(self):
+
+        with pytest.raises(NotImplementedError):
+            RestrictLogsByNameFilter()
+
+    def test_restrict_logs(self):
+        class TestFilter(RestrictLogsByNameFilter):
+            names_to_restrict = "geopandas|fiona"
+            level_to_allow = logging.ERROR
+
+        log_filter = TestFilter()
+        assert not log_filter.filter(make_log_record("fiona.ogrext", "INFO"))
+        assert log_filter.filter(make_log_record("fiona.ogrext", "ERROR"))
+        assert log_filter.filter(make_log_record("example", "INFO"))
+        assert set(log_filter.cache.keys()) == {"fiona.ogrext", "example"}
+
+    def test_multiple_restrictions(self):
+
+        log_filter = RestrictLogsByNameFilter(
+            restrictions=[
+                ("boto|botocore", "WARNING"),
+                ("geopandas", logging.ERROR),
+            ]
+        )
+        assert not log_filter.filter(make_log_record("botocore.hooks", "INFO"))
+        assert log_filter.filter(make_log_record("botocore.hooks", "WARNING"))
+        assert not log_filter.filter(make_log_record("geopandas", "WARNING"))
+        assert log_filter.filter(make_log_record("geopandas", "ERROR"))
+        assert log_filter.filter(make_log_record("example", "DEBUG"))
+
+        # reconfiguring the filter clears the cache...
+        log_filter.configure(restrictions=[("example", logging.INFO)])
+        assert log_filter.cache == {}
+        assert not log_filter.filter(make_log_record("example", "DEBUG"))
+        assert log_filter.filter(make_log_record("geopandas", "WARNING"))
+
+    def test_cache_is_bounded(self, monkeypatch):
+
+        log_filter = RestrictLogsByNameFilter(
+            names_to_restrict="geopandas", level_to_allow=logging.ERROR
+        )
+        monkeypatch.setattr(log_filter, "max_cache_size", 10)
+        for i in range(25):
+            log_filter.filter(make_log_record(f"logger{i}", "INFO"))
+            assert len(log_filter.cache) <= 10
+
+
+@pytest.fixture
+def db_logger(astrosat_settings):
+    """
+    Returns a fn that creates a logger w/ its own DatabaseLogHandler
+    """
+    astrosat_settings.enable_db_logging = True
+    astrosat_settings.save()
+
+    loggers = []
+
+    def _db_logger(**handler_kwargs):
+        logger = logging.getLogger(f"test_db_logger_{len(loggers)}")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(DatabaseLogHandler(**handler_kwargs))
+        loggers.append(logger)
+        return logger
+
+    yield _db_logger
+
+    for logger in loggers:
+        logger.handlers.clear()
+
+
+@pytest.mark.django_db
+class TestDatabaseLogHandler:
+    def test_deduplication(self, db_logger):
+
+        logger = db_logger(deduplication_window=60)
+
+        for i in range(10):
+            logger.error("error %s", i)
+        logger.error("different error")
+        logger.warning("error %s", 0)
+        logger.error("error %s", 0, extra={"tags": ["tag1"]})
+
+        assert DatabaseLogRecord.objects.count() == 4
+        log_record = DatabaseLogRecord.objects.get(
+            message="error 0", level=logging.ERROR, tags__isnull=True
+        )
+        assert log_record.occurrences == 10
+        assert DatabaseLogRecord.objects.filter(occurrences=1).count() == 3
+
+    def test_metrics(self, db_logger, monkeypatch):
+
+        monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", True)
+        metrics_registry.reset()
+
+        logger = db_logger(deduplication_window=60)
+        for _ in range(3):
+            logger.error("error")
+
+        assert DB_LOG_RECORDS_METRIC.values == {
+            ("created", ): 1, ("deduplicated", ): 2
+        }
+        metrics_registry.reset()
+
+    def test_deduplication_window(self, db_logger, monkeypatch):
+
+        logger = db_logger(deduplication_window=60)
+
+        t = time.time()
+        monkeypatch.setattr(time, "time", lambda: t)
+        logger.error("error")
+        monkeypatch.setattr(time, "time", lambda: t + 30)
+        logger.error("error")
+        monkeypatch.setattr(time, "time", lambda: t + 90)
+        logger.error("error")
+
+        assert sorted(
+            DatabaseLogRecord.objects.values_list("occurrences", flat=True)
+        ) == [1, 2]
+
+    def test_sampling(self, db_logger, monkeypatch):
+
+        logger = db_logger(
+            sampling_rates={"noisy": 0.25, "important": 1},
+            default_sampling_rate=0.5,
+        )
+        monkeypatch.setattr(random, "random", lambda: 0.4)
+
+        logger.info("noisy", extra={"tags": ["noisy"]})
+        logger.info(
+            "noisy and important", extra={"tags": ["noisy", "important"]}
+        )
+        logger.info("default")
+
+        assert list(
+            DatabaseLogRecord.objects.values_list("message", flat=True)
+        ) == ["default", "noisy and important"]
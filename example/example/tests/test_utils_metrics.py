@@ -0,0 +1,86 @@
+import pytest
+
+from astrosat.conf import app_settings
+from astrosat.utils import MetricsRegistry, bulk_update_or_create, metrics_registry
+
+from example.models import ExampleBulkModel
+
+
+@pytest.fixture
+def enable_metrics(monkeypatch):
+    monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", True)
+    metrics_registry.reset()
+    yield
+    metrics_registry.reset()
+
+
+class TestMetricsRegistry:
+    def test_render(self, enable_metrics):
+
+        registry = MetricsRegistry()
+        counter = registry.counter("things_total", "Some things.", ["kind"])
+        gauge = registry.gauge("depth", "A depth.", callback=lambda: 3)
+        histogram = registry.histogram(
+            "duration_seconds", "A duration.", buckets=[0.1, 1.0]
+        )
+
+        counter.inc(kind="good")
+        counter.inc(2, kind='"bad"')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        assert registry.render().splitlines() == [
+            "# HELP things_total Some things.",
+            "# TYPE things_total counter",
+            'things_total{kind="good"} 1.0',
+            'things_total{kind="\\"bad\\""} 2.0',
+            "# HELP depth A depth.",
+            "# TYPE depth gauge",
+            "depth 3.0",
+            "# HELP duration_seconds A duration.",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{le="0.1"} 1.0',
+            'duration_seconds_bucket{le="1.0"} 2.0',
+            'duration_seconds_bucket{le="+Inf"} 3.0',
+            "duration_seconds_sum 5.55",
+            "duration_seconds_count 3.0",
+        ]
+
+        # registering a metric w/ the same name returns the existing one...
+        assert registry.counter("things_total", "Some things.") is counter
+        with pytest.raises(AssertionError):
+            registry.gauge("things_total", "Some things.")
+
+    def test_disabled(self, monkeypatch):
+
+        monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", False)
+
+        registry = MetricsRegistry()
+        counter = registry.counter("things_total", "Some things.")
+        counter.inc()
+
+        assert counter.values == {}
+
+
+@pytest.mark.django_db
+def test_bulk_update_or_create_metrics(enable_metrics):
+
+    ExampleBulkModel.objects.create(
+        something_unique="a", something_non_unique="old"
+    )
+    bulk_update_or_create(
+        ExampleBulkModel,
+        [
+            {"something_unique": "a", "something_non_unique": "new"},
+            {"something_unique": "b", "something_non_unique": "new"},
+            {"something_unique": "c", "something_non_unique": "new"},
+        ],
+    )
+
+    rendered_metrics = metrics_registry.render().splitlines()
+    for operation, n_rows in [("created", 2), ("updated", 1)]:
+        assert (
+            "astrosat_bulk_upsert_rows_total"
+            f'{{model="example.ExampleBulkModel",operation="{operation}"}} {float(n_rows)}'
+        ) in rendered_metrics
@@ -0,0 +1,273 @@
+import json
+import pytest
+import threading
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+
+from astrosat.models import DatabaseLogRecord
+from astrosat.tests.factories import UserFactory
+from astrosat.tests.utils import query_budget
+from astrosat.utils import QueryTracker, SamplingProfiler, profile, track_memory
+
+
+def busy_wait(seconds):
+    t = time.perf_counter()
+    while time.perf_counter() - t < seconds:
+        pass
+
+
+class TestSamplingProfiler:
+    def test_context_manager(self, capsys):
+
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_wait(0.1)
+
+        assert profiler.n_samples > 0
+        assert sum(profiler.stacks.values()) == profiler.n_samples
+
+        # stacks start at the frame that entered the context manager...
+        stack, _ = profiler.stacks.most_common(1)[0]
+        assert stack.split(";")[:2] == [
+            f"{__name__}:test_context_manager",
+            f"{__name__}:busy_wait",
+        ]
+
+        # by default output is printed to stdout...
+        assert capsys.readouterr().out.strip() == profiler.collapsed_stacks
+
+    def test_decorator(self, tmp_path):
+
+        path = tmp_path / "profile.collapsed"
+        profiler = SamplingProfiler(interval=0.001, path=str(path))
+
+        @profiler
+        def decorated_fn():
+            busy_wait(0.1)
+
+        decorated_fn()
+        decorated_fn()  # (can be called repeatedly)
+
+        collapsed_stacks = path.read_text().splitlines()
+        assert len(collapsed_stacks) > 0
+        for collapsed_stack in collapsed_stacks:
+            # stacks start at the decorated fn...
+            stack, count = collapsed_stack.rsplit(" ", 1)
+            assert stack.startswith(f"{__name__}:decorated_fn")
+            assert int(count) > 0
+        assert decorated_fn.profiler.n_samples > 0
+
+    def test_decorator_concurrent(self):
+
+        @SamplingProfiler(interval=0.001, path=None)
+        def decorated_fn(depth=0):
+            busy_wait(0.01)
+            if depth < 1:
+                decorated_fn(depth + 1)  # (calls can be nested)
+
+        # ...or run concurrently
+        threads = [threading.Thread(target=decorated_fn) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        decorated_fn()
+
+
+class TestProfile:
+    def test_results(self, tmp_path):
+
+        json_path = tmp_path / "profile.jsonl"
+
+        @profile(n_calls=10, path=None, json_path=str(json_path))
+        def profiled_fn():
+            return busy_wait(0.01)
+
+        assert profiled_fn.results is None
+        profiled_fn()
+        profiled_fn()
+
+        results = profiled_fn.results
+        assert results["type"] == "profile"
+        assert results["name"] == f"{__name__}.{profiled_fn.__qualname__}"
+        assert 0 < len(results["functions"]) <= 10
+        assert any(
+            function["name"] == "busy_wait" and function["n_calls"] == 1
+            for function in results["functions"]
+        )
+
+        # each call appends a line to json_path...
+        lines = json_path.read_text().splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[-1]) == json.loads(json.dumps(results))
+
+    @pytest.mark.django_db
+    def test_log_to_db(self):
+        @profile(path=None, log_to_db=True)
+        def profiled_fn():
+            pass
+
+        profiled_fn()
+
+        db_record = DatabaseLogRecord.objects.get()
+        assert list(db_record.tags.values_list("name", flat=True)) == ["profile"]
+        assert json.loads(db_record.message)["name"] == profiled_fn.results["name"]
+
+
+@pytest.mark.django_db
+class TestTrackMemory:
+    def test_tracemalloc(self, capsys):
+        @track_memory(
+            n_allocations=5, group_by="traceback", traceback_depth=2
+        )
+        def tracked_fn():
+            return [bytearray(1024) for _ in range(1000)]
+
+        tracked_fn()
+
+        results = tracked_fn.results
+        assert "classes" not in results
+        assert 0 < len(results["allocations"]) <= 5
+
+        # the biggest allocation is the list comprehension above...
+        (allocation, *_) = results["allocations"]
+        assert allocation["size_diff"] >= 1024 * 1000
+        assert len(allocation["traceback"]) == 2
+        assert allocation["traceback"][0].startswith(__file__)
+
+        assert "ALLOCATIONS" in capsys.readouterr().out
+        assert not tracemalloc.is_tracing()
+
+    def test_tracemalloc_concurrent(self):
+
+        first_started = threading.Event()
+        first_may_finish = threading.Event()
+
+        @track_memory(path=None)
+        def first_fn():
+            first_started.set()
+            first_may_finish.wait(5)
+
+        @track_memory(path=None)
+        def second_fn():
+            # the 1st call finishes while this one is still running...
+            first_may_finish.set()
+            first_thread.join()
+            # ...but tracing must continue until this one finishes too
+            return [bytearray(1024) for _ in range(100)]
+
+        first_thread = threading.Thread(target=first_fn)
+        first_thread.start()
+        first_started.wait(5)
+        second_fn()
+
+        assert second_fn.results["allocations"]
+        assert not tracemalloc.is_tracing()
+
+    def test_tracemalloc_group_by_filename(self):
+        @track_memory(path=None, group_by="filename")
+        def tracked_fn():
+            return [bytearray(1024) for _ in range(1000)]
+
+        tracked_fn()
+
+        filenames = [
+            allocation["traceback"][0].rsplit(":", 1)[0]
+            for allocation in tracked_fn.results["allocations"]
+        ]
+        assert len(filenames) == len(set(filenames))
+        assert __file__ in filenames
+
+    def test_classes(self, capsys):
+        @track_memory(mode="classes")
+        def tracked_fn():
+            return UserFactory.create_batch(3)
+
+        users = tracked_fn()
+        assert len(users) == 3
+
+        results = tracked_fn.results
+        assert results["type"] == "memory"
+        assert results["resources"]["resident set size"] > 0
+        assert set(results["memory_deltas"].keys()) == {
+            "Resident set size (delta)", "Virtual size (delta)"
+        }
+        user_stats = next(
+            class_stats for class_stats in results["classes"]
+            if class_stats["name"].endswith(".User")
+        )
+        assert user_stats["max_instances"] >= 3
+
+        # text output is still printed by default...
+        assert "RESOURCES" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+class TestQueryTracker:
+    def test_context_manager(self):
+
+        users = UserFactory.create_batch(6)
+        user_model = get_user_model()
+
+        with QueryTracker(path=None, n_plus_one_threshold=5) as tracker:
+            list(user_model.objects.all())
+            list(user_model.objects.all())
+            for user in users:
+                user_model.objects.get(pk=user.pk)
+
+        assert tracker.n_queries == 8
+        assert tracker.total_time > 0
+
+        results = tracker.results
+        assert results["type"] == "queries"
+        assert results["n_queries"] == 8
+        assert [query["count"] for query in results["duplicate_queries"]] == [2]
+        assert [query["count"] for query in results["n_plus_one_queries"]] == [6]
+
+    def test_n_plus_one_needs_different_params(self):
+
+        user = UserFactory()
+        user_model = get_user_model()
+
+        # the same query w/ the same params is a duplicate, not an N+1...
+        with QueryTracker(
+            path=None, n_plus_one_threshold=5, include_params=False
+        ) as tracker:
+            for _ in range(6):
+                user_model.objects.get(pk=user.pk)
+
+        results = tracker.results
+        assert [query["count"] for query in results["duplicate_queries"]] == [6]
+        assert "params" not in results["duplicate_queries"][0]
+        assert results["n_plus_one_queries"] == []
+
+    def test_decorator(self, capsys):
+        @QueryTracker()
+        def tracked_fn():
+            return get_user_model().objects.count()
+
+        assert tracked_fn.tracker is None
+        tracked_fn()
+
+        assert tracked_fn.tracker.n_queries == 1
+        assert tracked_fn.tracker.results["name"].endswith("tracked_fn")
+        assert "QUERIES: 1" in capsys.readouterr().out
+
+    def test_query_budget(self, query_budget):
+
+        users = UserFactory.create_batch(5)
+        user_model = get_user_model()
+
+        with query_budget(1):
+            user_model.objects.count()
+
+        with pytest.raises(AssertionError, match="at most 1 queries"):
+            with query_budget(1):
+                user_model.objects.count()
+                user_model.objects.count()
+
+        with pytest.raises(AssertionError, match="N\\+1"):
+            with query_budget(10):
+                for user in users:
+                    user_model.objects.get(pk=user.pk)
@@ -8,7 +8,10 @@ import urllib
 from django.urls import reverse
 from rest_framework import status
 
+from astrosat.conf import app_settings
+from astrosat.tests.factories import UserFactory
 from astrosat.tests.utils import mock_data_client
+from astrosat.utils import metrics_registry
 
 from astrosat.models import DatabaseLogRecord, DatabaseLogTag
 
@@ -125,7 +128,8 @@ class TestUserTracking:
         for input_data, output_data in zip(
             log_data, sorted(content, key=lambda x: x["id"])
         ):
-            assert json.dumps(input_data['content']) == output_data['message']
+            # (the exact formatting of the message depends on the JSON codec)
+            assert input_data['content'] == json.loads(output_data['message'])
 
     def test_tracking_features_level(self, api_client, astrosat_settings):
         """
@@ -165,3 +169,45 @@ class TestUserTracking:
         log_records = DatabaseLogRecord.objects.all()
         assert log_records.count() == 4
         assert log_records.filter(level=logging.INFO).count() == 2
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+    def test_disabled(self, client, monkeypatch):
+        monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", False)
+        response = client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_permissions(self, client, monkeypatch, settings):
+        settings.DEBUG = False
+        monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", True)
+        monkeypatch.setattr(app_settings, "ASTROSAT_METRICS_TOKEN", "secret")
+        url = reverse("metrics")
+
+        response = client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.get(url, HTTP_AUTHORIZATION="Bearer wrong")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+
+        client.force_login(UserFactory(is_superuser=True))
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_content(self, api_client, mock_data_client, monkeypatch, settings):
+        settings.DEBUG = True
+        monkeypatch.setattr(app_settings, "ASTROSAT_ENABLE_METRICS", True)
+        metrics_registry.reset()
+
+        mock_data_client(TEST_DATA_PATHS)
+        url = f"{reverse('proxy-s3')}?{urllib.parse.urlencode({'key': 'one.json'})}"
+        content = api_client.get(url).getvalue()
+
+        response = api_client.get(reverse("metrics"))
+        metrics = response.content.decode()
+        assert "# TYPE astrosat_proxy_s3_seconds histogram" in metrics
+        assert f"astrosat_proxy_s3_bytes_total {float(len(content))}" in metrics